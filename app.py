@@ -3,6 +3,7 @@ import json
 from pathlib import Path
 from rag_pipeline import RAGPipeline
 from session_manager import SessionManager, check_and_setup
+import snapshots
 from config import *
 
 # Page configuration
@@ -58,6 +59,15 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def load_pipeline():
+    """One pipeline per process, shared by every browser session (models, indexes, answer cache)"""
+    rag_pipeline = RAGPipeline()
+    if PREWARM_ON_STARTUP:
+        # Frequent and example questions are answered in the background
+        rag_pipeline.prewarm()
+    return rag_pipeline
+
 # Initialize session state
 if 'rag_pipeline' not in st.session_state:
     st.session_state.rag_pipeline = None
@@ -81,7 +91,7 @@ with st.sidebar:
         st.markdown(f"""
         <div class="warning-box">
             <strong>⚠️ Cleanup Required!</strong><br>
-            Maximum sessions reached. Data will be cleaned and re-downloaded.
+            Maximum sessions reached. Least-recently-used papers will be evicted.
         </div>
         """, unsafe_allow_html=True)
     else:
@@ -119,12 +129,13 @@ with st.sidebar:
                 st.session_state.session_manager.force_cleanup()
                 st.session_state.setup_complete = False
                 st.session_state.rag_pipeline = None
+                load_pipeline.clear()
             st.success("✅ Cleanup complete!")
             st.info("Please restart the app to re-download data.")
             st.stop()
     
     st.markdown("---")
-    st.info("💡 **Note:** Data automatically cleans after 10 sessions.")
+    st.info("💡 **Note:** After 10 sessions, least-recently-used papers over the disk budget are evicted.")
 
 # Main content
 def initialize_system():
@@ -149,7 +160,7 @@ def initialize_system():
         # Load RAG pipeline
         if st.session_state.rag_pipeline is None:
             try:
-                st.session_state.rag_pipeline = RAGPipeline()
+                st.session_state.rag_pipeline = load_pipeline()
                 st.session_state.setup_complete = True
             except Exception as e:
                 st.error(f"❌ Error loading system: {e}")
@@ -166,23 +177,40 @@ if mode == "💬 Q&A Mode":
     
     # Example questions
     with st.expander("💡 Example Questions"):
-        example_questions = [
-            "What are the most effective treatments for lung cancer?",
-            "What are the side effects of chemotherapy for lung cancer?",
-            "How is lung cancer diagnosed?",
-            "What is the survival rate for lung cancer?",
-            "What are the risk factors for lung cancer?",
-            "Compare immunotherapy and chemotherapy for lung cancer",
-            "What are early warning signs of lung cancer?",
-            "What is the role of targeted therapy in lung cancer treatment?"
-        ]
-        
         cols = st.columns(2)
-        for idx, question in enumerate(example_questions):
+        for idx, question in enumerate(EXAMPLE_QUESTIONS):
             with cols[idx % 2]:
                 if st.button(f"📌 {question}", key=f"ex_{idx}"):
                     st.session_state.current_question = question
     
+    # Metadata filters (applied inside the vector search)
+    filters = {}
+    with st.expander("🔎 Filter Papers"):
+        rag = st.session_state.rag_pipeline
+        corpora = snapshots.built_corpora()
+        if len(corpora) > 1:
+            # Other corpora are loaded on first use and searched together (merged top-k)
+            filters['corpora'] = st.multiselect("Corpora:", corpora, default=[rag.corpus])
+        
+        names = rag.source_names()
+        filters['sources'] = st.multiselect(
+            "Papers:", sorted(names, key=names.get), format_func=names.get
+        )
+        
+        author = st.text_input("Author contains:", "")
+        if author.strip():
+            filters['authors'] = [author.strip()]
+        
+        year_range = rag.filter_index.year_range()
+        if year_range and year_range[0] < year_range[1]:
+            filters['year_min'], filters['year_max'] = st.slider(
+                "Publication year:", year_range[0], year_range[1], year_range
+            )
+            if (filters['year_min'], filters['year_max']) == year_range:
+                # Full range selected: don't filter (keeps papers with unknown dates)
+                filters.pop('year_min')
+                filters.pop('year_max')
+    
     # Question input
     question = st.text_input(
         "Your Question:",
@@ -195,25 +223,51 @@ if mode == "💬 Q&A Mode":
         if question:
             with st.spinner("🔍 Searching research papers..."):
                 try:
-                    result = st.session_state.rag_pipeline.answer_question(question)
+                    rag = st.session_state.rag_pipeline
+                    if TWO_PHASE_ANSWERS:
+                        # Extractive answer now, LLM answer swapped in below
+                        result = rag.answer_question_fast(question, filters=filters)
+                    else:
+                        result = rag.answer_question(question, filters=filters)
                     
                     # Display answer
                     st.markdown("### 💡 Answer")
-                    st.markdown(f'<div class="answer-box">{result["answer"]}</div>', 
-                              unsafe_allow_html=True)
+                    answer_box = st.empty()
+                    answer_box.markdown(f'<div class="answer-box">{result["answer"]}</div>', 
+                                        unsafe_allow_html=True)
+                    answer_note = st.empty()
+                    if result.get('pending') is not None:
+                        answer_note.caption("⏳ Quick extractive answer, refining with the LLM...")
                     
                     # Display sources
                     st.markdown("### 📚 Sources")
                     with st.expander("📖 View Sources", expanded=True):
+                        names = st.session_state.rag_pipeline.source_names()
                         for idx, source in enumerate(result['sources'], 1):
+                            also_in = ", ".join(
+                                names.get(ref['source'], ref['source'])
+                                for ref in source.get('duplicate_sources', [])
+                            )
+                            also_in = f"<strong>Also in:</strong> {also_in}<br>" if also_in else ""
                             st.markdown(f"""
                             <div class="source-box">
-                                <strong>Source {idx}:</strong> {source['source']}<br>
+                                <strong>Source {idx}:</strong> {RAGPipeline.format_citation(source)}<br>
+                                {also_in}
                                 <strong>Similarity:</strong> {source['similarity_score']:.2%}<br>
                                 <strong>Text:</strong> {source['text'][:300]}...
                             </div>
                             """, unsafe_allow_html=True)
                     
+                    # Phase two: replace the answer in place if the LLM beats the deadline
+                    if result.get('pending') is not None:
+                        result = rag.upgrade_answer(result)
+                        answer_box.markdown(f'<div class="answer-box">{result["answer"]}</div>', 
+                                            unsafe_allow_html=True)
+                        if result.get('timed_out'):
+                            answer_note.caption("⏱️ The LLM answer took too long; showing the extractive answer.")
+                        else:
+                            answer_note.empty()
+                    
                 except Exception as e:
                     st.error(f"❌ Error: {e}")
         else:
@@ -225,13 +279,14 @@ elif mode == "📄 Summarization Mode":
     
     # Get list of documents
     try:
-        chunks = st.session_state.rag_pipeline.chunks
-        unique_sources = sorted(set(chunk['source'] for chunk in chunks))
+        names = st.session_state.rag_pipeline.source_names()
+        unique_sources = sorted(names, key=names.get)
         
         # Document selector
         selected_doc = st.selectbox(
             "Select a research paper to summarize:",
-            unique_sources
+            unique_sources,
+            format_func=names.get
         )
         
         # Summarize button
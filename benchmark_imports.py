@@ -0,0 +1,154 @@
+"""
+Import-time benchmark per entry point
+Runs `python -X importtime` in a fresh interpreter for each entry point's
+imports, reports the total and the heaviest modules, and appends the result to
+IMPORT_TIMES_FILE so regressions show up as a delta against the previous run.
+Also checks that importing config leaves the file system untouched.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from config import *
+
+# What each entry point imports before it can do any work
+ENTRY_POINTS = {
+    "config": "import config",
+    "setup_all": "import setup_all",
+    "app": "import streamlit, rag_pipeline, session_manager, snapshots",
+    "serve": "import serve",
+    "rag_pipeline": "import rag_pipeline",
+    "download_papers_arxiv": "import download_papers_arxiv",
+    "extract_text": "import extract_text",
+    "chunk_documents": "import chunk_documents",
+    "create_vectorstore": "import create_vectorstore",
+    "pipelined_ingest": "import pipelined_ingest",
+    "distributed_ingest": "import distributed_ingest",
+    "evaluate_retrieval": "import evaluate_retrieval",
+    "load_test": "import load_test",
+}
+
+
+def parse_importtime(stderr):
+    """[(module, cumulative ms, depth)] from -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # Two spaces of indent per level
+        modules.append((name.strip(), int(cumulative_us) / 1000, depth))
+    return modules
+
+
+def importtime(statement):
+    """Imports of a statement run in a fresh interpreter (raises on import errors)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=Path(__file__).parent, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def measure(statement, repeats=3):
+    """Best-of-repeats import time of a statement: (total ms, heaviest imports first)
+
+    Modules the interpreter imports at startup anyway are left out. The
+    heaviest imports are the entry modules' direct dependencies.
+    """
+    startup = {name for name, _, _ in importtime("pass")}
+    entry_modules = set(statement.replace("import", "").replace(",", " ").split())
+    best = None
+    for _ in range(repeats):
+        modules = [m for m in importtime(statement) if m[0] not in startup]
+        total_ms = sum(ms for _, ms, depth in modules if depth == 0)
+        direct = [(name, ms) for name, ms, depth in modules
+                  if depth <= 1 and name not in entry_modules]
+        if best is None or total_ms < best[0]:
+            best = (total_ms, sorted(direct, key=lambda m: m[1], reverse=True))
+    return best
+
+
+def config_is_side_effect_free():
+    """Import a copy of config in an empty directory and check nothing else appears there"""
+    with tempfile.TemporaryDirectory() as root:
+        shutil.copy(Path(__file__).parent / "config.py", root)
+        env = {key: value for key, value in os.environ.items() if key != "SPACE_ID"}
+        subprocess.run([sys.executable, "-B", "-c", "import config"], cwd=root, env=env,
+                       capture_output=True, check=True)
+        return sorted(path.name for path in Path(root).iterdir()) == ["config.py"]
+
+
+def load_history(path=IMPORT_TIMES_FILE):
+    if not path.exists():
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_history(history, path=IMPORT_TIMES_FILE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=2)
+
+
+def git_revision():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                            capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time per entry point (python -X importtime)")
+    parser.add_argument("--entry", default="", help="Comma-separated entry points (default: all)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=3, help="Heaviest imports shown per entry point")
+    parser.add_argument("--no-save", action="store_true", help="Don't append to the history file")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  IMPORT-TIME BENCHMARK")
+    print("=" * 60)
+
+    names = [name for name in args.entry.split(",") if name] or list(ENTRY_POINTS)
+    history = load_history()
+    previous = history[-1]["entry_points"] if history else {}
+    results = {}
+
+    print(f"\n{'entry point':<24}{'ms':>9}{'Δ ms':>9}   heaviest imports")
+    for name in names:
+        try:
+            total_ms, detail = measure(ENTRY_POINTS[name], args.repeats)
+        except ImportError as e:
+            print(f"{name:<24}{'—':>9}{'':>9}   ❌ {e}")
+            continue
+        results[name] = {"ms": round(total_ms, 1), "top": [[m, round(ms, 1)] for m, ms in detail[:10]]}
+        delta = f"{total_ms - previous[name]['ms']:+.0f}" if name in previous else ""
+        heaviest = ", ".join(f"{module} {ms:.0f}" for module, ms in detail[:args.top])
+        print(f"{name:<24}{total_ms:>9.0f}{delta:>9}   {heaviest}")
+
+    side_effect_free = config_is_side_effect_free()
+    print(f"\n{'✅' if side_effect_free else '❌'} Importing config "
+          f"{'creates no directories' if side_effect_free else 'creates directories'}")
+
+    if not args.no_save and results:
+        history.append({
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "entry_points": results,
+        })
+        save_history(history)
+        print(f"💾 History: {IMPORT_TIMES_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Chunk adjacency index for small-to-big retrieval
+Small chunks are embedded and searched for precise matches; each hit is then
+widened to its neighbouring chunks in the same paper (ordered by source and
+position), so the LLM reads a parent-sized passage without the index paying
+for large chunks.
+"""
+
+import numpy as np
+
+
+def document_order(chunk):
+    return (chunk.get('char_start', 0), chunk['chunk_id'])
+
+
+def stitch(chunks):
+    """One passage from chunks in document order, dropping the overlap between neighbours"""
+    text = chunks[0]['text']
+    end = chunks[0].get('char_end')
+    for chunk in chunks[1:]:
+        start = chunk.get('char_start')
+        if start is None or end is None or start > end:
+            text += " … " + chunk['text']  # A near-duplicate neighbour was collapsed at ingest
+        elif start == end:
+            text += " " + chunk['text']
+        else:
+            text += chunk['text'][end - start:]
+        end = chunk.get('char_end')
+    return text
+
+
+class ChunkAdjacency:
+    """Previous and next chunk of every chunk within its source (-1 at either end)"""
+
+    def __init__(self, chunks):
+        self.prev = np.full(len(chunks), -1, dtype='int64')
+        self.next = np.full(len(chunks), -1, dtype='int64')
+
+        by_source = {}
+        for position, chunk in enumerate(chunks):
+            by_source.setdefault(chunk['source'], []).append(position)
+        for positions in by_source.values():
+            positions.sort(key=lambda p: document_order(chunks[p]))
+            for before, after in zip(positions, positions[1:]):
+                self.next[before] = after
+                self.prev[after] = before
+
+    def window(self, position, size):
+        """Positions of a chunk and up to size neighbours on each side, in document order"""
+        before, after = [], []
+        previous, following = position, position
+        for _ in range(size):
+            previous = self.prev[previous] if previous >= 0 else -1
+            following = self.next[following] if following >= 0 else -1
+            if previous >= 0:
+                before.append(int(previous))
+            if following >= 0:
+                after.append(int(following))
+        return before[::-1] + [int(position)] + after
+
+    def expand(self, hits, chunks, size):
+        """Scored chunk dicts for (position, score) hits, best first, widened to their windows
+
+        A window that overlaps or touches a better hit's passage is merged into
+        it, so the same text is never returned twice.
+        """
+        passages = []  # [best hit position, score, window positions]
+        owner = {}
+        for position, score in hits:
+            window = set(self.window(position, size))
+            touching = {owner[p] for p in window if p in owner}
+            touching |= {owner[int(n)] for p in window for n in (self.prev[p], self.next[p])
+                         if int(n) in owner}
+            if not touching:
+                passages.append([position, score, window])
+                target = len(passages) - 1
+            else:
+                target = min(touching)
+                for other in sorted(touching - {target}):
+                    passages[target][2] |= passages[other][2]
+                    passages[other] = None
+                passages[target][2] |= window
+            for p in passages[target][2]:
+                owner[p] = target
+
+        results = []
+        for passage in passages:
+            if passage is None:
+                continue
+            position, score, window = passage
+            members = sorted((chunks[p] for p in window), key=document_order)
+            chunk = dict(chunks[position])
+            chunk['text'] = stitch(members)
+            chunk['chunk_ids'] = [member['chunk_id'] for member in members]
+            if 'char_start' in chunk:
+                chunk['char_start'] = members[0]['char_start']
+                chunk['char_end'] = members[-1]['char_end']
+            if 'page_start' in chunk:
+                chunk['page_start'] = min(m.get('page_start', chunk['page_start']) for m in members)
+                chunk['page_end'] = max(m.get('page_end', chunk['page_end']) for m in members)
+            chunk['similarity_score'] = score
+            results.append(chunk)
+        return results
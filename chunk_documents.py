@@ -1,64 +1,282 @@
+import sys
 import json
+import bisect
 from pathlib import Path
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from paper_store import parse_year
+import dedup
+import frame_store
+from extract_text import load_page_offsets, read_text, list_text_paths, text_timestamp
 from config import *
 
-def chunk_text(text, source_file):
-    """Split text into chunks with metadata"""
+LEGACY_CHUNKS_FILE = CHUNKS_DIR / "all_chunks.json"
+CHUNKING_FILE = CHUNKS_DIR / "chunking.json"  # Chunk size the saved chunks were cut at
+_chunk_store = None
+
+def load_paper_metadata():
+    """Paper metadata from the downloader, keyed by file stem"""
+    metadata_file = METADATA_DIR / "papers_metadata.json"
+    if not metadata_file.exists():
+        return {}
+    
+    with open(metadata_file, 'r') as f:
+        return {Path(m['filename']).stem: m for m in json.load(f)}
+
+def paper_fields(paper_metadata):
+    """Metadata fields copied onto every chunk of a paper (used for filtered search)"""
+    if not paper_metadata:
+        return {}
+    
+    return {
+        "title": paper_metadata.get("title", ""),
+        "authors": paper_metadata.get("authors", []),
+        "published": paper_metadata.get("published", ""),
+        "year": parse_year(paper_metadata.get("published")),
+        "arxiv_id": paper_metadata.get("arxiv_id", ""),
+        "paper_id": paper_metadata.get("paper_id", ""),
+        "display_name": paper_metadata.get("display_name", "")
+    }
+
+def page_range(page_offsets, start, end):
+    """1-based (first, last) page a character span falls on"""
+    starts = [page_start for page_start, _ in page_offsets]
+    first = bisect.bisect_right(starts, start)
+    last = bisect.bisect_right(starts, max(start, end - 1))
+    return max(first, 1), max(last, 1)
+
+def chunk_text(text, source_file, paper_metadata=None, page_offsets=None, base_offset=0,
+               chunk_size=INGEST_CHUNK_SIZE, chunk_overlap=INGEST_CHUNK_OVERLAP):
+    """Split text into chunks with metadata
+
+    base_offset is where text starts inside the full document, so chunks cut
+    from a page range still carry document-level character offsets.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
         length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
+        separators=["\n\n", "\n", ". ", " ", ""],
+        add_start_index=True
     )
     
-    chunks = text_splitter.split_text(text)
+    documents = text_splitter.create_documents([text])
     
     # Add metadata to each chunk
+    fields = paper_fields(paper_metadata)
     chunks_with_metadata = []
-    for idx, chunk in enumerate(chunks):
-        chunks_with_metadata.append({
-            "text": chunk,
+    for idx, document in enumerate(documents):
+        start = base_offset + max(document.metadata.get("start_index", 0), 0)
+        end = start + len(document.page_content)
+        chunk = {
+            "text": document.page_content,
             "source": source_file,
-            "chunk_id": idx
-        })
+            "chunk_id": idx,
+            "char_start": start,
+            "char_end": end,
+            **fields
+        }
+        if page_offsets:
+            chunk["page_start"], chunk["page_end"] = page_range(page_offsets, start, end)
+        chunks_with_metadata.append(chunk)
     
     return chunks_with_metadata
 
-def process_all_texts():
-    """Process all extracted text files"""
+def chunk_text_file(text_path, metadata_by_stem=None, chunk_size=INGEST_CHUNK_SIZE,
+                    chunk_overlap=INGEST_CHUNK_OVERLAP):
+    """Read one extracted text and split it into chunks"""
+    text = read_text(text_path)
+    
+    paper_metadata = (metadata_by_stem or {}).get(text_path.stem)
+    return chunk_text(text, text_path.name, paper_metadata, load_page_offsets(text_path),
+                      chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+def chunk_page_range(text_path, first_page, last_page, metadata_by_stem=None):
+    """Chunk only the text of pages first_page..last_page (1-based, inclusive)"""
+    page_offsets = load_page_offsets(text_path)
+    if not page_offsets:
+        raise ValueError(f"No page offsets for {text_path.name}; re-run extract_text.py")
+    
+    text = read_text(text_path)
+    start = page_offsets[first_page - 1][0]
+    end = page_offsets[last_page - 1][1]
+    paper_metadata = (metadata_by_stem or {}).get(text_path.stem)
+    return chunk_text(text[start:end], text_path.name, paper_metadata, page_offsets, start)
+
+def replace_page_chunks(all_chunks, source_file, first_page, last_page, new_chunks):
+    """Swap a source's chunks overlapping a page range for new ones, renumbering chunk_ids"""
+    def overlaps(chunk):
+        return (
+            chunk["source"] == source_file
+            and chunk.get("page_start", 0) <= last_page
+            and chunk.get("page_end", 0) >= first_page
+        )
+    
+    kept = [c for c in all_chunks if not overlaps(c)]
+    source_chunks = sorted(
+        [c for c in kept if c["source"] == source_file] + list(new_chunks),
+        key=lambda c: c.get("char_start", 0)
+    )
+    for idx, chunk in enumerate(source_chunks):
+        chunk["chunk_id"] = idx
+    
+    return [c for c in kept if c["source"] != source_file] + source_chunks
+
+def chunk_store():
+    """Container of the saved chunks, one frame per source file
+
+    Frames are not cached: chunk lists are read in bulk and then edited by
+    their callers.
+    """
+    global _chunk_store
+    if _chunk_store is None:
+        _chunk_store = frame_store.FrameStore(CHUNK_STORE_FILE, cache_size=0)
+    return _chunk_store
+
+def chunks_saved():
+    return CHUNK_STORE_FILE.exists() or LEGACY_CHUNKS_FILE.exists()
+
+def load_saved_chunks():
+    """Every saved chunk, grouped by source in the order they were saved"""
+    if not CHUNK_STORE_FILE.exists() and LEGACY_CHUNKS_FILE.exists():
+        with open(LEGACY_CHUNKS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    chunks = []
+    for _, source_chunks in chunk_store().items():
+        chunks.extend(source_chunks)
+    return chunks
+
+def load_source_chunks(source_file):
+    """Saved chunks of one source file (only that source's frame is read)"""
+    return chunk_store().get(source_file, [])
+
+def load_chunk(source_file, chunk_id):
+    """One saved chunk by source file and chunk id (None if it isn't there)"""
+    for chunk in load_source_chunks(source_file):
+        if chunk["chunk_id"] == chunk_id:
+            return chunk
+    return None
+
+def chunking_params():
+    return {"chunk_size": INGEST_CHUNK_SIZE, "chunk_overlap": INGEST_CHUNK_OVERLAP}
+
+def load_previous_chunks():
+    """Chunks from the last run grouped by source, plus when they were written"""
+    if not chunks_saved():
+        return {}, 0
+    
+    if CHUNKING_FILE.exists():
+        with open(CHUNKING_FILE, 'r') as f:
+            if json.load(f) != chunking_params():
+                print("✂️  Chunk size changed since the last run, re-chunking every paper\n")
+                return {}, 0
+    
+    by_source = {}
+    for chunk in load_saved_chunks():
+        by_source.setdefault(chunk["source"], []).append(chunk)
+    saved_file = CHUNK_STORE_FILE if CHUNK_STORE_FILE.exists() else LEGACY_CHUNKS_FILE
+    return by_source, saved_file.stat().st_mtime
+
+def reusable_sources(previous, unchanged):
+    """Sources whose saved chunks can be reused, with their duplicate_sources pruned
+
+    Collapsed copies are not saved, only referenced from their representative's
+    duplicate_sources. When a representative's paper is re-chunked, the papers
+    its copies came from are re-chunked too so dedup records them again; entries
+    pointing at re-chunked or removed papers are dropped from reused chunks.
+    """
+    reused = set(unchanged)
+    changed = True
+    while changed:
+        changed = False
+        for source, chunks in previous.items():
+            if source in reused:
+                continue
+            for chunk in chunks:
+                for reference in chunk.get("duplicate_sources", []):
+                    if reference["source"] in reused:
+                        reused.discard(reference["source"])
+                        changed = True
+    
+    for source in reused:
+        for chunk in previous[source]:
+            if "duplicate_sources" not in chunk:
+                continue
+            kept = [r for r in chunk["duplicate_sources"] if r["source"] in reused]
+            if kept:
+                chunk["duplicate_sources"] = kept
+            else:
+                del chunk["duplicate_sources"]
+    return reused
+
+def save_chunks(all_chunks):
+    """Save all chunks to the chunk container, one compressed frame per source"""
+    ensure_directories()
+    by_source = {}
+    for chunk in all_chunks:
+        by_source.setdefault(chunk["source"], []).append(chunk)
+    frame_store.write_frames(CHUNK_STORE_FILE, by_source.items())
+    with open(CHUNKING_FILE, 'w') as f:
+        json.dump(chunking_params(), f)
+    
+    if LEGACY_CHUNKS_FILE.exists():
+        LEGACY_CHUNKS_FILE.unlink()
+    return CHUNK_STORE_FILE
+
+def pack_legacy_chunks():
+    """Move a legacy all_chunks.json into the container; returns how many chunks"""
+    if not LEGACY_CHUNKS_FILE.exists():
+        return 0
+    chunks = load_saved_chunks()
+    save_chunks(chunks)
+    return len(chunks)
+
+def process_all_texts(force=False):
+    """Process all extracted texts (reusing chunks of unchanged papers)"""
     print("=" * 60)
     print("✂️  TEXT CHUNKING")
     print("=" * 60)
     
-    text_files = list(TEXTS_DIR.glob("*.txt"))
+    text_files = list_text_paths()
     
     if not text_files:
-        print("❌ No text files found!")
+        print("❌ No extracted texts found!")
         print("   Please run extract_text.py first.")
         return
     
-    print(f"📚 Found {len(text_files)} text files\n")
+    print(f"📚 Found {len(text_files)} extracted texts\n")
     
     all_chunks = []
+    metadata_by_stem = load_paper_metadata()
+    previous, previous_mtime = ({}, 0) if force else load_previous_chunks()
+    
+    # Texts are keyed by paper id, so an unchanged text means unchanged chunks
+    reused = reusable_sources(previous, [
+        path.name for path in text_files
+        if path.name in previous and text_timestamp(path) <= previous_mtime
+    ])
     
     for idx, text_path in enumerate(text_files, 1):
         print(f"[{idx}/{len(text_files)}] Processing: {text_path.name}")
         
-        # Read text
-        with open(text_path, 'r', encoding='utf-8') as f:
-            text = f.read()
+        if text_path.name in reused:
+            all_chunks.extend(previous[text_path.name])
+            print(f"   ⏭️  Reused {len(previous[text_path.name])} chunks")
+            continue
         
-        # Create chunks
-        chunks = chunk_text(text, text_path.name)
+        # Read text and create chunks
+        chunks = chunk_text_file(text_path, metadata_by_stem)
         all_chunks.extend(chunks)
         
         print(f"   ✅ Created {len(chunks)} chunks")
     
+    # Collapse near-duplicates (e.g. the same paper under two filenames)
+    if DEDUP_ENABLED:
+        all_chunks, collapsed = dedup.deduplicate_chunks(all_chunks)
+        print(f"\n🧬 Collapsed {collapsed} near-duplicate chunks")
+    
     # Save all chunks
-    chunks_file = CHUNKS_DIR / "all_chunks.json"
-    with open(chunks_file, 'w', encoding='utf-8') as f:
-        json.dump(all_chunks, f, indent=2, ensure_ascii=False)
+    chunks_file = save_chunks(all_chunks)
     
     print("\n" + "=" * 60)
     print(f"✅ Total chunks created: {len(all_chunks)}")
@@ -69,7 +287,7 @@ def process_all_texts():
     avg_chunk_size = sum(len(c['text']) for c in all_chunks) / len(all_chunks)
     print(f"\n📊 Statistics:")
     print(f"   Average chunk size: {avg_chunk_size:.0f} characters")
-    print(f"   Chunk size range: {CHUNK_SIZE} ± {CHUNK_OVERLAP}")
+    print(f"   Chunk size range: {INGEST_CHUNK_SIZE} ± {INGEST_CHUNK_OVERLAP}")
 
 if __name__ == "__main__":
-    process_all_texts()
\ No newline at end of file
+    process_all_texts(force="--force" in sys.argv)
\ No newline at end of file
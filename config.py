@@ -9,50 +9,186 @@ IS_HUGGINGFACE = os.getenv("SPACE_ID") is not None
 
 if IS_HUGGINGFACE:
     WRITABLE_DIR = Path("/tmp/lung_cancer_rag")
-    WRITABLE_DIR.mkdir(parents=True, exist_ok=True)
-    PAPERS_DIR = WRITABLE_DIR / "research_papers"
-    PROCESSED_DIR = WRITABLE_DIR / "processed_data"
-    VECTORSTORE_DIR = WRITABLE_DIR / "vectorstore"
-    METADATA_DIR = WRITABLE_DIR / "metadata"
+    DATA_ROOT = WRITABLE_DIR
 else:
-    PAPERS_DIR = BASE_DIR / "research_papers"
-    PROCESSED_DIR = BASE_DIR / "processed_data"
-    VECTORSTORE_DIR = BASE_DIR / "vectorstore"
-    METADATA_DIR = BASE_DIR / "metadata"
+    DATA_ROOT = BASE_DIR
+
+# Corpora - separate paper collections, each ingested into its own namespace
+CORPORA = {
+    "default": {"query": "lung cancer treatment", "num_papers": 5},
+    "nsclc": {"query": "non-small cell lung cancer", "num_papers": 5},
+    "sclc": {"query": "small cell lung cancer", "num_papers": 5},
+    "immunotherapy": {"query": "lung cancer immunotherapy clinical trial", "num_papers": 5},
+}
+CORPUS = os.getenv("RAG_CORPUS", "default")  # Namespace the ingest scripts build into
+if CORPUS not in CORPORA:
+    raise ValueError(f"Unknown RAG_CORPUS '{CORPUS}' (choose from {', '.join(CORPORA)})")
+MAX_RESIDENT_CORPORA = 2  # Extra corpora RAGPipeline keeps loaded besides its own (LRU)
+
+def corpus_paths(name):
+    """Data directories of a corpus ("default" keeps the original top-level layout)"""
+    root = DATA_ROOT if name == "default" else DATA_ROOT / "corpora" / name
+    return {
+        "papers": root / "research_papers",
+        "processed": root / "processed_data",
+        "vectorstore": root / "vectorstore",
+        "metadata": root / "metadata",
+    }
+
+PAPERS_DIR = corpus_paths(CORPUS)["papers"]
+PROCESSED_DIR = corpus_paths(CORPUS)["processed"]
+VECTORSTORE_DIR = corpus_paths(CORPUS)["vectorstore"]
+METADATA_DIR = corpus_paths(CORPUS)["metadata"]
 
 TEXTS_DIR = PROCESSED_DIR / "extracted_texts"
 CHUNKS_DIR = PROCESSED_DIR / "chunks"
+TEXT_STORE_FILE = TEXTS_DIR / "texts.frames"  # Every paper's extracted text, one compressed frame each
+CHUNK_STORE_FILE = CHUNKS_DIR / "chunks.frames"  # Every source's chunk list, one compressed frame each
+FRAME_COMPRESSION_LEVEL = 6  # zlib level for text and chunk frames
+FRAME_CACHE_SIZE = 256  # Decompressed frames kept in memory per open container
 
-# Create directories
-for directory in [PAPERS_DIR, TEXTS_DIR, CHUNKS_DIR, VECTORSTORE_DIR, METADATA_DIR]:
-    directory.mkdir(parents=True, exist_ok=True)
+def ensure_directories():
+    """Create the data directories (importing config has no side effects; writers call this)"""
+    for directory in [PAPERS_DIR, TEXTS_DIR, CHUNKS_DIR, VECTORSTORE_DIR, METADATA_DIR]:
+        directory.mkdir(parents=True, exist_ok=True)
 
 # PubMed settings
 PUBMED_EMAIL = os.getenv("PUBMED_EMAIL", "research@example.com")
-PUBMED_QUERY = "lung cancer treatment"
-NUM_PAPERS = 5  # Reduced for faster HuggingFace deployment
+PUBMED_QUERY = CORPORA[CORPUS]["query"]
+NUM_PAPERS = CORPORA[CORPUS]["num_papers"]  # Reduced for faster HuggingFace deployment
+ARXIV_CACHE_DIR = METADATA_DIR / "arxiv_cache"
+ARXIV_CACHE_TTL_HOURS = 24  # Re-query arXiv for the same search after this long
+
+# Ingest settings (setup_all.py)
+INGEST_MODE = os.getenv("RAG_INGEST_MODE", "pipelined")  # "pipelined", "sequential" or "distributed"
+PIPELINE_QUEUE_SIZE = 4  # Papers buffered between pipelined ingest stages
+
+# Distributed ingest (distributed_ingest.py)
+WORK_QUEUE_DIR = Path(os.getenv("RAG_WORK_DIR", METADATA_DIR / "work_queue"))  # Must be shared by coordinator and workers
+WORK_LEASE_S = 300  # A work item not completed or renewed in this long goes back to the queue
+WORK_MAX_ATTEMPTS = 3  # Tries per work item before it is marked failed
+WORK_POLL_S = 2  # How often an idle worker checks the queue again
+DISTRIBUTED_WORKERS = 0  # Local worker processes for setup_all's distributed mode (0 = half the CPU cores)
 
 # Chunking settings - Larger chunks for better context
 CHUNK_SIZE = 1500  # Increased from 1000 for more context
 CHUNK_OVERLAP = 300  # Increased overlap
 
+# Small-to-big retrieval: embed small child chunks, answer from their neighbourhood
+SMALL_TO_BIG = False  # Widen each retrieved chunk to its neighbours in the same paper (re-run chunking after changing)
+CHILD_CHUNK_SIZE = 400  # Chunk size used at ingest when SMALL_TO_BIG is on
+CHILD_CHUNK_OVERLAP = 50
+PARENT_WINDOW = 2  # Neighbouring chunks added on each side of a hit (~1800-character parent)
+INGEST_CHUNK_SIZE = CHILD_CHUNK_SIZE if SMALL_TO_BIG else CHUNK_SIZE
+INGEST_CHUNK_OVERLAP = CHILD_CHUNK_OVERLAP if SMALL_TO_BIG else CHUNK_OVERLAP
+
+# Near-duplicate chunk detection (MinHash + LSH)
+DEDUP_ENABLED = True  # Collapse near-duplicate chunks to one vector at ingest
+DEDUP_THRESHOLD = 0.85  # Estimated Jaccard similarity of word shingles to count as a duplicate
+DEDUP_SHINGLE_SIZE = 5  # Words per shingle
+DEDUP_NUM_PERM = 64  # MinHash permutations
+DEDUP_BANDS = 16  # LSH bands (DEDUP_NUM_PERM / DEDUP_BANDS rows each)
+DIVERSIFY_RESULTS = True  # Skip retrieved chunks that mostly repeat a higher-ranked one
+DIVERSITY_MAX_OVERLAP = 0.6  # Max shingle Jaccard between two chunks returned together
+
 # Embedding model - Fast and efficient
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # 22MB, fast
 # Alternative for better medical: "dmis-lab/biobert-base-cased-v1.2" (420MB)
 
+# Embedding encode settings (create_vectorstore.py)
+EMBED_MODE = "parallel"  # "parallel" = length-bucketed multi-process encode, "single" = one model.encode call
+EMBED_WORKERS = 0  # Encoder processes (0 = half the CPU cores)
+EMBED_BATCH_SIZE = "auto"  # Encode batch size, or "auto" to benchmark a few sizes first
+EMBED_BATCHES_PER_TASK = 4  # Batches sent to a worker at a time
+EMBED_USE_MMAP = False  # Write embeddings into a memory-mapped .npy instead of RAM
+EMBEDDINGS_MMAP_PATH = VECTORSTORE_DIR / "embeddings_float32.npy"
+
 # LLM settings - Using better model for comprehensive answers
 LLM_MODEL = "google/flan-t5-base"  # 250MB - Better quality than small
 # Alternative: "google/flan-t5-large" (780MB) for even better answers
+TWO_PHASE_ANSWERS = True  # Show an extractive answer at once, then swap in the LLM answer
+LLM_ANSWER_DEADLINE_S = 8.0  # Keep the extractive answer if generation takes longer than this
+
+# CPU inference tuning (thread counts and batch sizes benchmarked once per host)
+RUNTIME_AUTOTUNE = True  # Benchmark on first start; False = split cores evenly without benchmarking
+RUNTIME_PROFILE_PATH = METADATA_DIR / "runtime_profile.json"
+EXPECTED_CONCURRENT_SESSIONS = int(os.environ.get("RAG_CONCURRENT_SESSIONS", 2))  # Cores are shared between this many sessions
 
 # FAISS settings
 FAISS_INDEX_PATH = VECTORSTORE_DIR / "faiss_index"
 TOP_K_RETRIEVAL = 5  # Increased from 3 for more context
+VECTOR_STORAGE = "float32"  # "float32", "float16" (2x smaller) or "sq8" (4x smaller, 8-bit scalar quantized)
+VECTOR_RESCORE = True  # For compressed storage, re-rank candidates with exact float32 vectors (memory-mapped)
+RESCORE_FACTOR = 4  # Candidates fetched per requested result when rescoring
+NUM_SHARDS = 1  # >1 splits the vector store into shards (by source file hash) built and searched independently
+SHARD_WORKERS = 0  # 0 = search shards on threads in-process, N = serve shards from N local worker processes
+SHARDS_DIR = VECTORSTORE_DIR / "shards"  # Pre-snapshot location; shards now live inside each snapshot
+SNAPSHOTS_DIR = VECTORSTORE_DIR / "snapshots"  # Versioned vector stores, CURRENT names the live one
+SNAPSHOT_KEEP = 2  # Published snapshots kept on disk (older ones are deleted)
+SNAPSHOT_POLL_INTERVAL_S = 5  # How often a running RAGPipeline checks for a new snapshot (0 = never)
+SNAPSHOT_GRACE_S = 30  # Keep a swapped-out sharded index open this long for in-flight queries
+HIERARCHICAL_RETRIEVAL = False  # Pick the top papers by centroid first, then search only their chunks
+HIERARCHICAL_TOP_PAPERS = 20  # Papers whose chunks are searched in the second stage
+HIERARCHICAL_MIN_PAPERS = 50  # Below this many papers the flat search is used (narrowing wouldn't pay)
+
+# Semantic answer cache (paraphrased questions reuse a recent answer)
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_THRESHOLD = 0.92  # Cosine similarity between query embeddings to count as a hit
+SEMANTIC_CACHE_SIZE = 256  # Recent queries kept (LRU)
+
+# Query log and startup prewarming
+QUERY_LOG_ENABLED = True  # Append answered questions to QUERY_LOG_PATH (written in the background)
+QUERY_LOG_PATH = METADATA_DIR / "query_log.jsonl"
+QUERY_LOG_MAX_MB = 20  # Rotated to query_log.jsonl.1 beyond this size
+PREWARM_ON_STARTUP = True  # Replay frequent questions and EXAMPLE_QUESTIONS after the pipeline loads
+PREWARM_TOP_QUERIES = 10  # Most frequent logged questions replayed
+PREWARM_WINDOW_DAYS = 7  # Only count questions logged this recently
+
+# Retrieval evaluation (evaluate_retrieval.py)
+EVAL_QUESTIONS_FILE = BASE_DIR / "eval_questions.json"  # Hand-curated question -> relevant text labels
+EVAL_SYNTHETIC_FILE = METADATA_DIR / "eval_synthetic.json"  # Generated once, reused so runs compare like for like
+EVAL_REPORTS_DIR = METADATA_DIR / "eval_reports"
+EVAL_K_VALUES = [1, 3, 5, 10]
+
+# Load testing (load_test.py)
+LOAD_TEST_USERS = [1, 2, 4, 8]  # Concurrent simulated users, one stage each
+LOAD_TEST_STAGE_S = 30  # Seconds each stage runs
+LOAD_TEST_REPORTS_DIR = METADATA_DIR / "load_reports"
+
+# Import-time benchmark (benchmark_imports.py)
+IMPORT_TIMES_FILE = METADATA_DIR / "import_times.json"  # One entry per run, compared with the previous one
 
 # Generation settings - For comprehensive answers
 MAX_ANSWER_LENGTH = 512  # Longer answers
 MIN_ANSWER_LENGTH = 100  # Ensure substantial responses
 TEMPERATURE = 0.7  # Balanced creativity/accuracy
 
+# HTTP serving settings (serve.py)
+SERVE_HOST = os.getenv("RAG_SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("RAG_SERVE_PORT", "8000"))
+SERVE_MAX_BATCH_SIZE = 8  # Max questions coalesced into one micro-batch
+SERVE_MAX_WAIT_MS = 25  # How long the first question waits for others to join
+SERVE_MAX_QUEUE_SIZE = 64  # Pending questions before requests are rejected (503)
+
+# Session tracking settings
+SESSION_CACHE_TTL = 5  # Seconds a cached tracker read is reused across reruns
+
+# Retention settings (what happens when the session limit is reached)
+RETENTION_POLICY = "evict"  # "evict" = drop least-recently-retrieved papers, "wipe" = delete everything
+RETENTION_DISK_BUDGET_MB = 200  # Evict papers until papers + texts + chunks + vectors fit
+RETENTION_MIN_PAPERS = 1  # Never evict below this many papers
+USAGE_FLUSH_EVERY = 20  # Retrieval hits buffered before writing usage stats
+
 # Streamlit settings
 APP_TITLE = "Lung Cancer Research RAG Chatbot"
-APP_ICON = "🫁"
\ No newline at end of file
+APP_ICON = "🫁"
+EXAMPLE_QUESTIONS = [
+    "What are the most effective treatments for lung cancer?",
+    "What are the side effects of chemotherapy for lung cancer?",
+    "How is lung cancer diagnosed?",
+    "What is the survival rate for lung cancer?",
+    "What are the risk factors for lung cancer?",
+    "Compare immunotherapy and chemotherapy for lung cancer",
+    "What are early warning signs of lung cancer?",
+    "What is the role of targeted therapy in lung cancer treatment?"
+]
\ No newline at end of file
@@ -1,29 +1,33 @@
-import json
-import pickle
+import sys
+import shutil
+import tempfile
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
+import vector_search
+import sharded_index
+import snapshots
+import document_index
+import dedup
+import chunk_documents
+import frame_store
 from config import *
 
 def load_chunks():
-    """Load all chunks from JSON file"""
-    chunks_file = CHUNKS_DIR / "all_chunks.json"
+    """Load all chunks from the chunk container"""
+    if not chunk_documents.chunks_saved():
+        raise FileNotFoundError(f"Chunks not found: {CHUNK_STORE_FILE}\nPlease run chunk_documents.py first.")
     
-    if not chunks_file.exists():
-        raise FileNotFoundError(f"Chunks file not found: {chunks_file}\nPlease run chunk_documents.py first.")
-    
-    with open(chunks_file, 'r', encoding='utf-8') as f:
-        chunks = json.load(f)
-    
-    return chunks
+    return chunk_documents.load_saved_chunks()
 
-def create_embeddings(chunks, model_name=EMBEDDING_MODEL):
+def create_embeddings(chunks, model_name=EMBEDDING_MODEL, model=None):
     """Create embeddings for all chunks using biomedical BERT"""
-    print(f"🤖 Loading embedding model: {model_name}")
-    print("   (This may take a few minutes on first run...)")
-    
-    # Load the biomedical BERT model
-    model = SentenceTransformer(model_name)
+    if model is None:
+        print(f"🤖 Loading embedding model: {model_name}")
+        print("   (This may take a few minutes on first run...)")
+        
+        # Load the biomedical BERT model
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
     
     print(f"\n🔄 Generating embeddings for {len(chunks)} chunks...")
     print("   This may take 5-10 minutes depending on your hardware...")
@@ -31,51 +35,182 @@ def create_embeddings(chunks, model_name=EMBEDDING_MODEL):
     # Extract text from chunks
     texts = [chunk['text'] for chunk in chunks]
     
-    # Generate embeddings in batches
-    embeddings = model.encode(
-        texts,
-        batch_size=32,
-        show_progress_bar=True,
-        convert_to_numpy=True
-    )
+    if EMBED_MODE == "parallel":
+        # Length-bucketed encode across worker processes
+        import parallel_embed
+        embeddings = parallel_embed.encode_parallel(
+            texts,
+            model_name=model_name,
+            output_path=EMBEDDINGS_MMAP_PATH if EMBED_USE_MMAP else None,
+            model=model
+        )
+    else:
+        # Generate embeddings in batches
+        embeddings = model.encode(
+            texts,
+            batch_size=32,
+            show_progress_bar=True,
+            convert_to_numpy=True
+        )
     
     print(f"✅ Generated embeddings with shape: {embeddings.shape}")
     
     return embeddings, model
 
-def create_faiss_index(embeddings):
+def create_faiss_index(embeddings, storage=VECTOR_STORAGE):
     """Create FAISS index for fast similarity search"""
-    print(f"\n🗄️  Creating FAISS index...")
+    print(f"\n🗄️  Creating FAISS index ({storage} storage)...")
     
-    # Get embedding dimension
-    dimension = embeddings.shape[1]
-    
-    # Create FAISS index (using L2 distance)
-    index = faiss.IndexFlatL2(dimension)
-    
-    # Add embeddings to index
-    index.add(embeddings.astype('float32'))
+    # Create FAISS index (using L2 distance), training the quantizer if needed
+    index = vector_search.build_index(embeddings, storage)
     
     print(f"✅ FAISS index created with {index.ntotal} vectors")
     
     return index
 
-def save_vectorstore(index, chunks):
-    """Save FAISS index and chunks metadata"""
-    print(f"\n💾 Saving vector store...")
-    
-    # Save FAISS index
-    index_file = FAISS_INDEX_PATH.with_suffix('.index')
-    faiss.write_index(index, str(index_file))
-    print(f"   ✅ FAISS index saved: {index_file}")
-    
-    # Save chunks metadata
-    metadata_file = FAISS_INDEX_PATH.with_suffix('.pkl')
-    with open(metadata_file, 'wb') as f:
-        pickle.dump(chunks, f)
-    print(f"   ✅ Metadata saved: {metadata_file}")
-    
-    return index_file, metadata_file
+def report_compression(index, embeddings, storage=VECTOR_STORAGE):
+    """Print memory saved and recall lost by compressed storage"""
+    if storage == "float32":
+        return
+    
+    vectors = embeddings if VECTOR_RESCORE else None
+    report = vector_search.compression_report(index, embeddings, vectors=vectors)
+    saved = 1 - report['index_bytes'] / report['float32_bytes']
+    
+    print(f"\n📉 Compression report ({storage}):")
+    print(f"   Index memory: {report['index_bytes'] / 1024 / 1024:.2f} MB "
+          f"vs {report['float32_bytes'] / 1024 / 1024:.2f} MB float32 ({saved:.0%} saved)")
+    print(f"   Recall@{report['k']}: {report['recall_at_k']:.3f} "
+          f"(recall lost: {1 - report['recall_at_k']:.3f})")
+    if 'rescored_recall_at_k' in report:
+        print(f"   Recall@{report['k']} with float32 rescoring: {report['rescored_recall_at_k']:.3f}")
+
+def save_vectorstore(index, chunks, embeddings=None, storage=VECTOR_STORAGE):
+    """Save FAISS index and chunks metadata as a new published snapshot"""
+    print("\n💾 Saving vector store...")
+    
+    # Readers keep seeing the previous snapshot until this one is complete
+    with snapshots.publish() as paths:
+        # Save FAISS index
+        faiss.write_index(index, str(paths["index"]))
+        print("   ✅ FAISS index saved")
+        
+        # Exact vectors for rescoring stay on disk and are memory-mapped at query time
+        if storage != "float32" and VECTOR_RESCORE and embeddings is not None:
+            np.save(paths["vectors"], np.asarray(embeddings, dtype='float32'))
+            print("   ✅ Rescoring vectors saved")
+        
+        # Save chunks metadata, with the chunk text compressed per source
+        frame_store.save_chunk_store(paths, chunks)
+        print("   ✅ Metadata saved")
+        
+        # Paper centroids for hierarchical retrieval
+        if embeddings is not None:
+            document_index.save_centroids(paths, document_index.compute_centroids(chunks, embeddings))
+            print("   ✅ Paper centroids saved")
+    
+    paths = snapshots.current_paths()
+    return paths["index"], paths["chunks"]
+
+def check_partial_rebuild(shards_dir, num_shards, fingerprint):
+    """Refuse to rebuild some shards of a store built from a different chunk list
+    
+    The other shards' id maps point into the chunk list they were built from;
+    after re-chunking they would return the wrong chunks or stale ids.
+    """
+    manifest = sharded_index.load_manifest(shards_dir)
+    if manifest is None:
+        return  # First build, shards may come from different nodes
+    if manifest["num_shards"] != num_shards or manifest.get("chunks_fingerprint") != fingerprint:
+        raise ValueError(
+            "The chunk list or shard count changed since the published shards were built; "
+            "rebuild every shard (run without --shard)"
+        )
+
+def build_sharded_vectorstore(chunks, shard_ids=None, num_shards=NUM_SHARDS, embeddings=None):
+    """Embed and save shards independently; shard_ids limits the build to some shards
+
+    Ingests that already embedded the chunks pass embeddings (one row per chunk).
+    """
+    assignment = sharded_index.assign_shards(chunks, num_shards)
+    shard_ids = list(range(num_shards)) if shard_ids is None else shard_ids
+    partial = len(shard_ids) < num_shards
+    fingerprint = sharded_index.chunks_fingerprint(chunks)
+    if partial:
+        check_partial_rebuild(snapshots.current_paths()["shards"], num_shards, fingerprint)
+    
+    if embeddings is None:
+        print(f"🤖 Loading embedding model: {EMBEDDING_MODEL}")
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(EMBEDDING_MODEL)
+        dimension = model.get_sentence_embedding_dimension()
+    else:
+        embeddings = np.asarray(embeddings, dtype='float32')
+        dimension = embeddings.shape[1]
+    all_embeddings = embeddings
+    
+    # Embed outside the publish lock, so nodes building other shards aren't held up
+    SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=f"{snapshots.STAGING_PREFIX}shards-",
+                                     dir=SNAPSHOTS_DIR) as build_dir:
+        build_dir = Path(build_dir)
+        centroids = {}
+        for shard_id in shard_ids:
+            ids = assignment[shard_id]
+            print(f"\n🧩 Shard {shard_id + 1}/{num_shards}: {len(ids)} chunks")
+            
+            if len(ids):
+                shard_chunks = [chunks[i] for i in ids]
+                if all_embeddings is None:
+                    embeddings, _ = create_embeddings(shard_chunks, model=model)
+                else:
+                    embeddings = all_embeddings[ids]
+                index = create_faiss_index(embeddings)
+                centroids.update(document_index.compute_centroids(shard_chunks, embeddings))
+            else:
+                embeddings, index = None, vector_search.create_empty_index(dimension)
+            
+            saved = sharded_index.save_shard(shard_id, index, ids, embeddings, shards_dir=build_dir)
+            print(f"   ✅ Built: {saved['index'].name}")
+        
+        # Rebuilding some shards starts from a copy of the store published by then
+        with snapshots.publish(base_on_current=partial) as paths:
+            if partial:
+                check_partial_rebuild(paths["shards"], num_shards, fingerprint)
+            for stale in [paths["index"], paths["vectors"]]:
+                if stale.exists():
+                    stale.unlink()  # Shards replace the single index
+            
+            paths["shards"].mkdir(parents=True, exist_ok=True)
+            for shard_id in shard_ids:
+                for key, path in sharded_index.shard_paths(shard_id, paths["shards"]).items():
+                    if path.exists():
+                        path.unlink()
+                    built = sharded_index.shard_paths(shard_id, build_dir)[key]
+                    if built.exists():
+                        shutil.move(built, path)
+            
+            # The manifest and chunk list are derived from the saved chunks, so any node can write them
+            sharded_index.write_manifest(
+                num_shards, dimension, [len(ids) for ids in assignment], shards_dir=paths["shards"],
+                fingerprint=fingerprint,
+            )
+            frame_store.save_chunk_store(paths, chunks)
+            
+            # Papers never span shards, so rebuilt shards just replace their papers' centroids
+            live_sources = {chunk['source'] for chunk in chunks}
+            if partial:
+                centroids = {**document_index.load_centroids(paths), **centroids}
+            document_index.save_centroids(
+                paths, {s: c for s, c in centroids.items() if s in live_sources}
+            )
+    
+    print(f"\n✅ Sharded vector store: {num_shards} shards in {snapshots.current_paths()['shards']}")
+
+def parse_shard_args(argv):
+    """Shard ids from '--shard 0 --shard 3' style arguments (None = all shards)"""
+    shard_ids = [int(argv[i + 1]) for i, arg in enumerate(argv[:-1]) if arg == "--shard"]
+    return shard_ids or None
 
 def main():
     """Main function to create vector store"""
@@ -84,30 +219,44 @@ def main():
     print("=" * 60)
     
     try:
+        ensure_directories()
+        
         # Load chunks
         print("\n📚 Loading chunks...")
         chunks = load_chunks()
         print(f"✅ Loaded {len(chunks)} chunks")
         
+        if DEDUP_ENABLED:
+            # Chunk files from older runs may still contain duplicates; don't embed them twice
+            chunks, collapsed = dedup.deduplicate_chunks(chunks)
+            if collapsed:
+                print(f"🧬 Collapsed {collapsed} near-duplicate chunks ({len(chunks)} to embed)")
+        
+        if NUM_SHARDS > 1:
+            build_sharded_vectorstore(chunks, parse_shard_args(sys.argv[1:]))
+            print("\n🚀 Ready to use! Run: streamlit run app.py")
+            return
+        
         # Create embeddings
         embeddings, model = create_embeddings(chunks)
         
         # Create FAISS index
         index = create_faiss_index(embeddings)
+        report_compression(index, embeddings)
         
         # Save everything
-        index_file, metadata_file = save_vectorstore(index, chunks)
+        index_file, metadata_file = save_vectorstore(index, chunks, embeddings)
         
         # Summary
         print("\n" + "=" * 60)
         print("✅ VECTOR STORE CREATED SUCCESSFULLY!")
         print("=" * 60)
-        print(f"📊 Summary:")
+        print("📊 Summary:")
         print(f"   Total chunks: {len(chunks)}")
         print(f"   Embedding dimension: {embeddings.shape[1]}")
         print(f"   Index size: {index.ntotal} vectors")
         print(f"   Model used: {EMBEDDING_MODEL}")
-        print(f"\n📁 Files created:")
+        print("\n📁 Files created:")
         print(f"   {index_file}")
         print(f"   {metadata_file}")
         print("\n🚀 Ready to use! Run: streamlit run app.py")
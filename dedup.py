@@ -0,0 +1,130 @@
+"""
+Near-duplicate chunk detection with MinHash + LSH
+Chunks whose word shingles overlap above DEDUP_THRESHOLD collapse into one
+record (one vector) that keeps references to every source it appeared in
+"""
+
+import zlib
+import numpy as np
+from config import *
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+
+def shingles(text, size=DEDUP_SHINGLE_SIZE):
+    """Set of lowercase word n-grams"""
+    words = text.lower().split()
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(shingles_a, shingles_b):
+    """Exact Jaccard similarity of two shingle sets"""
+    if not shingles_a or not shingles_b:
+        return 0.0
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+
+class MinHasher:
+    """Fixed family of hash permutations so signatures are comparable"""
+
+    def __init__(self, num_perm=DEDUP_NUM_PERM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+
+    def signature(self, text):
+        """MinHash signature of a text's shingles"""
+        hashes = np.array(
+            [zlib.crc32(s.encode('utf-8')) for s in shingles(text)], dtype=np.uint64
+        )
+        return ((np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME).min(axis=0)
+
+
+class NearDuplicateIndex:
+    """Incremental LSH index: add() tells you whether a chunk duplicates an earlier one"""
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.buckets = {}
+        self.signatures = []
+
+    def _band_keys(self, signature):
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def add(self, text):
+        """Return the position of an earlier near-duplicate, or register text and return None"""
+        signature = self.hasher.signature(text)
+        keys = self._band_keys(signature)
+
+        candidates = set()
+        for key in keys:
+            candidates.update(self.buckets.get(key, ()))
+
+        for position in sorted(candidates):
+            if np.mean(self.signatures[position] == signature) >= self.threshold:
+                return position
+
+        position = len(self.signatures)
+        self.signatures.append(signature)
+        for key in keys:
+            self.buckets.setdefault(key, []).append(position)
+        return None
+
+
+def source_reference(chunk):
+    """Compact pointer back to where a chunk came from"""
+    return {"source": chunk["source"], "chunk_id": chunk["chunk_id"]}
+
+
+class ChunkDeduplicator:
+    """Collapses near-duplicate chunks as they stream in"""
+
+    def __init__(self, threshold=DEDUP_THRESHOLD):
+        self.index = NearDuplicateIndex(threshold)
+        self.kept = []
+        self.collapsed = 0
+
+    def add(self, chunks):
+        """Add chunks; returns the ones that are new (duplicates are merged into earlier ones)"""
+        new_chunks = []
+        for chunk in chunks:
+            duplicate_of = self.index.add(chunk["text"])
+            if duplicate_of is None:
+                self.kept.append(chunk)
+                new_chunks.append(chunk)
+            else:
+                representative = self.kept[duplicate_of]
+                # A reused chunk may already stand for copies of its own
+                representative.setdefault("duplicate_sources", []).extend(
+                    [source_reference(chunk)] + chunk.get("duplicate_sources", [])
+                )
+                self.collapsed += 1
+        return new_chunks
+
+
+def deduplicate_chunks(chunks, threshold=DEDUP_THRESHOLD):
+    """Collapse near-duplicate chunks; returns (kept chunks, number collapsed)"""
+    deduplicator = ChunkDeduplicator(threshold)
+    deduplicator.add(chunks)
+    return deduplicator.kept, deduplicator.collapsed
+
+
+def diversify(chunks, top_k, max_overlap=DIVERSITY_MAX_OVERLAP):
+    """Greedy top-k that skips chunks too similar to ones already picked"""
+    selected, selected_shingles = [], []
+    for chunk in chunks:
+        chunk_shingles = shingles(chunk["text"])
+        if all(jaccard(chunk_shingles, other) <= max_overlap for other in selected_shingles):
+            selected.append(chunk)
+            selected_shingles.append(chunk_shingles)
+        if len(selected) == top_k:
+            break
+    return selected
@@ -0,0 +1,455 @@
+"""
+Distributed ingest over a shared work directory
+The coordinator turns every downloaded PDF into an "extract" work item in a
+SQLite queue under WORK_QUEUE_DIR; workers (on any host that mounts the data
+directories, or local processes) lease items, run the stage and enqueue the
+paper's next stage: extract → chunk → embed. A lease that isn't completed or
+renewed in WORK_LEASE_S is handed to another worker, so a crashed worker only
+delays its items. Every stage writes its output atomically under a name keyed
+by paper, which makes re-running an item harmless. The merge step assembles
+the per-paper chunk and embedding files into one published vector store.
+
+    python distributed_ingest.py enqueue [--download]   # coordinator
+    python distributed_ingest.py worker [--wait]        # on each node
+    python distributed_ingest.py merge                  # when the queue is done
+    python distributed_ingest.py local --workers 4      # all of the above on one host
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import extract_text
+import chunk_documents
+import dedup
+from config import *
+
+STAGES = ["extract", "chunk", "embed"]
+NEXT_STAGE = {"extract": "chunk", "chunk": "embed", "embed": None}
+
+
+class WorkQueue:
+    """Leased work items in a SQLite file on the shared directory
+
+    Each (paper, stage) pair is a row, so enqueueing is idempotent. Leasing
+    runs in an IMMEDIATE transaction so two workers never take the same item.
+    Rollback journaling (not WAL) keeps the file usable on network mounts.
+    """
+
+    def __init__(self, queue_dir=WORK_QUEUE_DIR, lease_s=WORK_LEASE_S, max_attempts=WORK_MAX_ATTEMPTS):
+        self.queue_dir = Path(queue_dir)
+        self.db_path = self.queue_dir / "queue.db"
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.queue_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS work_items (
+                    paper TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    error TEXT,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (paper, stage)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout = 30000")
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, papers, stage="extract"):
+        """Add work items (existing ones are left alone); returns how many were new"""
+        now = time.time()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO work_items (paper, stage, updated) VALUES (?, ?, ?)",
+                [(paper, stage, now) for paper in papers]
+            )
+            return conn.total_changes - before
+
+    def lease(self, owner):
+        """Take the oldest available item (pending, or leased but expired); None if there is none"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases that used up their attempts won't be retried
+                conn.execute("""
+                    UPDATE work_items SET state = 'failed', error = 'lease expired', updated = ?
+                    WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?
+                """, (now, now, self.max_attempts))
+                row = conn.execute("""
+                    SELECT paper, stage, attempts FROM work_items
+                    WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)
+                    ORDER BY updated LIMIT 1
+                """, (now,)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                paper, stage, attempts = row
+                conn.execute("""
+                    UPDATE work_items
+                    SET state = 'leased', attempts = ?, lease_owner = ?, lease_expires = ?, updated = ?
+                    WHERE paper = ? AND stage = ?
+                """, (attempts + 1, owner, now + self.lease_s, now, paper, stage))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return {"paper": paper, "stage": stage, "attempt": attempts + 1}
+
+    def renew(self, item, owner):
+        """Extend a lease; False if it has been taken over or finished"""
+        with self._connect() as conn:
+            cursor = conn.execute("""
+                UPDATE work_items SET lease_expires = ?
+                WHERE paper = ? AND stage = ? AND state = 'leased' AND lease_owner = ?
+            """, (time.time() + self.lease_s, item["paper"], item["stage"], owner))
+            return cursor.rowcount == 1
+
+    def complete(self, item, owner):
+        """Mark an item done and queue the paper's next stage
+
+        A worker whose lease was taken over may still finish; its output is
+        identical, so the item is completed by whoever gets there first.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                UPDATE work_items SET state = 'done', lease_owner = ?, error = NULL, updated = ?
+                WHERE paper = ? AND stage = ? AND state != 'done'
+            """, (owner, now, item["paper"], item["stage"]))
+            next_stage = NEXT_STAGE[item["stage"]]
+            if next_stage:
+                conn.execute(
+                    "INSERT OR IGNORE INTO work_items (paper, stage, updated) VALUES (?, ?, ?)",
+                    (item["paper"], next_stage, now)
+                )
+            conn.execute("COMMIT")
+
+    def fail(self, item, owner, error):
+        """Release an item for retry, or park it as failed after max_attempts"""
+        with self._connect() as conn:
+            conn.execute("""
+                UPDATE work_items
+                SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    lease_owner = NULL, lease_expires = NULL, error = ?, updated = ?
+                WHERE paper = ? AND stage = ? AND state = 'leased' AND lease_owner = ?
+            """, (self.max_attempts, str(error)[:500], time.time(),
+                  item["paper"], item["stage"], owner))
+
+    def skip(self, item, owner, reason):
+        """Finish an item without a next stage (e.g. a PDF with no text)"""
+        with self._connect() as conn:
+            conn.execute("""
+                UPDATE work_items SET state = 'skipped', error = ?, updated = ?
+                WHERE paper = ? AND stage = ? AND lease_owner = ?
+            """, (reason, time.time(), item["paper"], item["stage"], owner))
+
+    def counts(self):
+        """{stage: {state: n}}, with leases past their expiry reported as 'expired'"""
+        counts = {stage: {} for stage in STAGES}
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT stage,
+                       CASE WHEN state = 'leased' AND lease_expires < ? THEN 'expired' ELSE state END,
+                       COUNT(*)
+                FROM work_items GROUP BY 1, 2
+            """, (time.time(),)).fetchall()
+        for stage, state, n in rows:
+            counts[stage][state] = counts[stage].get(state, 0) + n
+        return counts
+
+    def is_drained(self):
+        """True when nothing is pending or leased (finished, skipped or failed for good)"""
+        with self._connect() as conn:
+            (open_items,) = conn.execute(
+                "SELECT COUNT(*) FROM work_items WHERE state IN ('pending', 'leased')"
+            ).fetchone()
+        return open_items == 0
+
+    def failures(self):
+        """(paper, stage, error) of items that ran out of attempts"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT paper, stage, error FROM work_items WHERE state = 'failed'"
+            ).fetchall()
+
+    def done_papers(self, stage="embed"):
+        """Papers whose given stage has completed"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT paper FROM work_items WHERE stage = ? AND state = 'done' ORDER BY paper",
+                (stage,)
+            ).fetchall()
+        return [paper for (paper,) in rows]
+
+
+def output_paths(paper, queue_dir=WORK_QUEUE_DIR):
+    """Per-paper stage outputs on the shared directory"""
+    queue_dir = Path(queue_dir)
+    return {
+        "chunks": queue_dir / "chunks" / f"{paper}.json",
+        "embeddings": queue_dir / "embeddings" / f"{paper}.npy",
+    }
+
+
+def _write_atomically(path, write):
+    """Write via a unique temp file and rename, so readers never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class Worker:
+    """Leases and runs work items until the queue is drained"""
+
+    def __init__(self, work_queue, worker_id=None):
+        self.queue = work_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.model = None
+        self.metadata_by_stem = None
+        self.processed = 0
+
+    def log(self, message):
+        print(f"[{self.worker_id}] {message}", flush=True)
+
+    @contextmanager
+    def keep_leased(self, item):
+        """Renew an item's lease in the background while a long stage runs"""
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.queue.lease_s / 3):
+                if not self.queue.renew(item, self.worker_id):
+                    break
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def run_extract(self, item):
+        """PDF → extracted text frame (rewritten on a retry, in case a crash left it partial)"""
+        pdf_path = PAPERS_DIR / f"{item['paper']}.pdf"
+        text_path = extract_text.process_pdf(pdf_path, force=item["attempt"] > 1)
+        return text_path is not None
+
+    def run_chunk(self, item):
+        """Extracted text → per-paper chunk file"""
+        if self.metadata_by_stem is None:
+            self.metadata_by_stem = chunk_documents.load_paper_metadata()
+        text_path = TEXTS_DIR / f"{item['paper']}.txt"
+        chunks = chunk_documents.chunk_text_file(text_path, self.metadata_by_stem)
+        if not chunks:
+            return False
+        payload = json.dumps(chunks, ensure_ascii=False).encode('utf-8')
+        _write_atomically(output_paths(item["paper"], self.queue.queue_dir)["chunks"],
+                          lambda f: f.write(payload))
+        return True
+
+    def run_embed(self, item):
+        """Per-paper chunk file → per-paper embeddings (near-duplicates are collapsed at merge)"""
+        if self.model is None:
+            from sentence_transformers import SentenceTransformer
+            self.log(f"🤖 Loading embedding model: {EMBEDDING_MODEL}")
+            self.model = SentenceTransformer(EMBEDDING_MODEL)
+        paths = output_paths(item["paper"], self.queue.queue_dir)
+        with open(paths["chunks"], 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+        embeddings = self.model.encode(
+            [chunk['text'] for chunk in chunks], batch_size=32, convert_to_numpy=True
+        ).astype('float32')
+        _write_atomically(paths["embeddings"], lambda f: np.save(f, embeddings))
+        return True
+
+    def run(self, wait=False, poll_s=WORK_POLL_S):
+        """Process items; returns when the queue is drained (or never, with wait)"""
+        self.log("👷 Worker started")
+        while True:
+            item = self.queue.lease(self.worker_id)
+            if item is None:
+                if not wait and self.queue.is_drained():
+                    break
+                time.sleep(poll_s)  # Others still hold leases that may expire back to us
+                continue
+
+            start = time.perf_counter()
+            try:
+                with self.keep_leased(item):
+                    produced = getattr(self, f"run_{item['stage']}")(item)
+            except Exception as e:
+                self.queue.fail(item, self.worker_id, e)
+                self.log(f"⚠️  {item['stage']} {item['paper']} failed "
+                         f"(attempt {item['attempt']}): {e}")
+                continue
+
+            if produced:
+                self.queue.complete(item, self.worker_id)
+                self.processed += 1
+                self.log(f"✅ {item['stage']:<7} {item['paper']} "
+                         f"({time.perf_counter() - start:.1f}s)")
+            else:
+                self.queue.skip(item, self.worker_id, "no output")
+                self.log(f"⏭️  {item['stage']:<7} {item['paper']}: nothing to pass on")
+
+        self.log(f"🏁 Done, {self.processed} items processed")
+        return self.processed
+
+
+def enqueue_papers(work_queue, download=False):
+    """Coordinator: queue an extract item for every PDF (downloading first if asked)"""
+    if download:
+        import download_papers_arxiv
+        download_papers_arxiv.main()
+    papers = sorted(path.stem for path in PAPERS_DIR.glob("*.pdf"))
+    added = work_queue.enqueue(papers, "extract")
+    print(f"📥 {len(papers)} papers, {added} newly queued in {work_queue.db_path}")
+    return added
+
+
+def merge(work_queue):
+    """Assemble per-paper chunks and embeddings into one published vector store
+
+    Papers are merged in a fixed order and near-duplicates collapsed the way
+    the single-machine ingest does, so the result doesn't depend on which
+    worker finished first.
+    """
+    import create_vectorstore
+    import vector_search
+
+    failures = work_queue.failures()
+    for paper, stage, error in failures:
+        print(f"   ⚠️  {paper} failed at {stage}: {error}")
+
+    deduplicator = dedup.ChunkDeduplicator() if DEDUP_ENABLED else None
+    all_chunks, all_embeddings = [], []
+
+    # Papers evicted since they were ingested aren't merged back in
+    papers = [p for p in work_queue.done_papers("embed") if (PAPERS_DIR / f"{p}.pdf").exists()]
+    for paper in papers:
+        paths = output_paths(paper, work_queue.queue_dir)
+        with open(paths["chunks"], 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+        embeddings = np.load(paths["embeddings"])
+
+        if deduplicator is not None:
+            kept = {id(chunk) for chunk in deduplicator.add(chunks)}
+            rows = [i for i, chunk in enumerate(chunks) if id(chunk) in kept]
+            chunks, embeddings = [chunks[i] for i in rows], embeddings[rows]
+
+        all_chunks.extend(chunks)
+        all_embeddings.append(embeddings)
+
+    if not all_chunks:
+        print("❌ Nothing to merge")
+        return False
+
+    embeddings = np.concatenate(all_embeddings)
+    print(f"🧩 Merging {len(all_embeddings)} papers, {len(all_chunks)} chunks")
+    if deduplicator is not None:
+        print(f"🧬 Collapsed {deduplicator.collapsed} near-duplicate chunks")
+
+    chunk_documents.save_chunks(all_chunks)
+    if NUM_SHARDS > 1:
+        create_vectorstore.build_sharded_vectorstore(all_chunks, embeddings=embeddings)
+    else:
+        index = vector_search.build_index(embeddings)
+        create_vectorstore.save_vectorstore(index, all_chunks, embeddings)
+    return True
+
+
+def print_status(work_queue):
+    """Per-stage item counts"""
+    counts = work_queue.counts()
+    states = ["pending", "leased", "expired", "done", "skipped", "failed"]
+    print(f"   {'Stage':<10}" + "".join(f"{state:>9}" for state in states))
+    for stage in STAGES:
+        print(f"   {stage:<10}" + "".join(f"{counts[stage].get(state, 0):>9}" for state in states))
+
+
+def _local_worker(queue_dir, worker_id):
+    Worker(WorkQueue(queue_dir), worker_id).run()
+
+
+def run_local(work_queue, num_workers):
+    """Stand in for several nodes with local processes sharing the queue directory"""
+    processes = [
+        multiprocessing.Process(target=_local_worker, args=(work_queue.queue_dir, f"local-{i}"))
+        for i in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return all(process.exitcode == 0 for process in processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed extract / chunk / embed ingest")
+    parser.add_argument("command", choices=["enqueue", "worker", "merge", "status", "local"])
+    parser.add_argument("--queue-dir", type=Path, default=WORK_QUEUE_DIR)
+    parser.add_argument("--download", action="store_true", help="(enqueue, local) Download papers first")
+    parser.add_argument("--wait", action="store_true", help="(worker) Keep polling for new items")
+    parser.add_argument("--id", default=None, help="(worker) Worker name in the queue")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="(local) Worker processes")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🛰️  DISTRIBUTED INGEST")
+    print("=" * 60)
+
+    work_queue = WorkQueue(args.queue_dir)
+
+    if args.command == "enqueue":
+        enqueue_papers(work_queue, args.download)
+    elif args.command == "worker":
+        Worker(work_queue, args.id).run(wait=args.wait)
+    elif args.command == "merge":
+        merge(work_queue)
+    elif args.command == "local":
+        start = time.perf_counter()
+        enqueue_papers(work_queue, args.download)
+        print(f"👷 Starting {args.workers} local workers...")
+        run_local(work_queue, args.workers)
+        print_status(work_queue)
+        merge(work_queue)
+        print(f"⏱️  Wall time: {time.perf_counter() - start:.1f}s")
+        return
+
+    print_status(work_queue)
+
+
+if __name__ == "__main__":
+    main()
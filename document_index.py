@@ -0,0 +1,133 @@
+"""
+Paper-level index for two-stage (document, then chunk) retrieval
+Each paper is represented by the normalised centroid of its chunk vectors; a
+query first picks the top-N papers from this small index and then scores
+only those papers' chunks, so search cost grows with N rather than the corpus
+"""
+
+import json
+import numpy as np
+import vector_search
+
+
+def compute_centroids(chunks, embeddings):
+    """{source: unit-length mean vector} over each paper's chunks"""
+    embeddings = np.asarray(embeddings, dtype='float32')
+    sources = np.array([chunk['source'] for chunk in chunks])
+    centroids = {}
+    for source in np.unique(sources):
+        centroid = embeddings[sources == source].mean(axis=0)
+        norm = np.linalg.norm(centroid)
+        centroids[str(source)] = centroid / norm if norm else centroid
+    return centroids
+
+
+def save_centroids(paths, centroids):
+    """Write paper centroids into a vector store snapshot"""
+    if not centroids:
+        for key in ["documents", "document_sources"]:
+            if paths[key].exists():
+                paths[key].unlink()
+        return
+    sources = sorted(centroids)
+    with open(paths["document_sources"], 'w', encoding='utf-8') as f:
+        json.dump(sources, f, ensure_ascii=False)
+    vectors = np.array([centroids[s] for s in sources], dtype='float32')
+    np.save(paths["documents"], vectors.reshape(len(sources), -1))
+
+
+def load_centroids(paths):
+    """Paper centroids stored in a snapshot ({} if it has none)"""
+    if not paths["documents"].exists() or not paths["document_sources"].exists():
+        return {}
+    with open(paths["document_sources"], 'r', encoding='utf-8') as f:
+        sources = json.load(f)
+    return dict(zip(sources, np.load(paths["documents"])))
+
+
+class DocumentIndex:
+    """Paper centroids plus, for each paper, the positions of its chunks"""
+
+    def __init__(self, centroids, chunks):
+        import faiss
+        self.sources = sorted(centroids)
+        position = {source: i for i, source in enumerate(self.sources)}
+        self.doc_of_chunk = np.array([position[c['source']] for c in chunks], dtype='int64')
+
+        order = np.argsort(self.doc_of_chunk, kind='stable')
+        boundaries = np.searchsorted(self.doc_of_chunk[order], np.arange(len(self.sources) + 1))
+        self.doc_chunk_ids = [order[boundaries[i]:boundaries[i + 1]] for i in range(len(self.sources))]
+
+        vectors = np.array([centroids[s] for s in self.sources], dtype='float32')
+        self.index = faiss.IndexFlatIP(vectors.shape[1])
+        self.index.add(vectors)
+
+    @classmethod
+    def load(cls, paths, chunks, vectors=None):
+        """Document index for a store; built from chunk vectors when the snapshot predates it
+
+        Returns None when no centroids are stored and no vectors are available,
+        or when some chunk's paper has no centroid.
+        """
+        centroids = load_centroids(paths)
+        if not centroids and vectors is not None:
+            centroids = compute_centroids(chunks, vectors)
+        if not centroids or any(c['source'] not in centroids for c in chunks):
+            return None
+        return cls(centroids, chunks)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def top_papers(self, query_embeddings, num_papers, chunk_mask=None):
+        """Positions of the num_papers best papers per query (-1 padded)
+
+        With a chunk mask only papers that still have an allowed chunk compete.
+        """
+        import faiss
+        queries = np.ascontiguousarray(query_embeddings, dtype='float32').copy()
+        faiss.normalize_L2(queries)
+
+        doc_mask = None
+        if chunk_mask is not None:
+            doc_mask = np.zeros(len(self.sources), dtype=bool)
+            doc_mask[np.unique(self.doc_of_chunk[chunk_mask])] = True
+
+        # Inner product on unit vectors: larger is better, FAISS returns best first
+        _, papers = vector_search.search_index(
+            self.index, queries, min(num_papers, len(self.sources)), mask=doc_mask
+        )
+        return papers
+
+    def candidate_chunks(self, papers, chunk_mask=None):
+        """Chunk positions belonging to the given papers (and allowed by the mask)"""
+        papers = papers[papers >= 0]
+        if not len(papers):
+            return np.empty(0, dtype='int64')
+        ids = np.sort(np.concatenate([self.doc_chunk_ids[p] for p in papers]))
+        return ids[chunk_mask[ids]] if chunk_mask is not None else ids
+
+
+def search_candidates(query, candidate_ids, top_k, vectors=None, index=None):
+    """Exact L2 top-k of one query over a subset of chunk positions
+
+    Vectors come from the memory-mapped float32 copy when there is one,
+    otherwise they are reconstructed from the index.
+    """
+    distances = np.full(top_k, np.inf, dtype='float32')
+    indices = np.full(top_k, -1, dtype='int64')
+    if not len(candidate_ids):
+        return distances, indices
+
+    if vectors is not None:
+        candidate_vectors = np.asarray(vectors[candidate_ids], dtype='float32')
+    else:
+        candidate_vectors = index.reconstruct_batch(candidate_ids)
+
+    exact = ((candidate_vectors - query) ** 2).sum(axis=1)
+    k = min(top_k, len(candidate_ids))
+    best = np.argpartition(exact, k - 1)[:k]
+    best = best[np.argsort(exact[best])]
+    distances[:k] = exact[best]
+    indices[:k] = candidate_ids[best]
+    return distances, indices
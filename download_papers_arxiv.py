@@ -1,24 +1,109 @@
 import os
 import time
 import json
-import requests
-import arxiv
+import hashlib
+from contextlib import closing
+import paper_store
 from config import *
 
-def search_arxiv(query, num_results=20):
-    """Search arXiv for lung cancer papers"""
-    print(f"🔍 Searching arXiv for: '{query}'...")
+class CachedAuthor:
+    """Author name as stored in the search cache"""
     
-    # Search arXiv
+    def __init__(self, name):
+        self.name = name
+
+class CachedPaper:
+    """Stand-in for arxiv.Result rebuilt from the search cache"""
+    
+    def __init__(self, record):
+        self.entry_id = record["entry_id"]
+        self.title = record["title"]
+        self.authors = [CachedAuthor(name) for name in record["authors"]]
+        self.published = record["published"]
+        self.pdf_url = record["pdf_url"]
+
+def paper_to_record(paper):
+    """Serializable form of a search result"""
+    return {
+        "entry_id": paper.entry_id,
+        "title": paper.title,
+        "authors": [author.name for author in paper.authors],
+        "published": str(paper.published),
+        "pdf_url": paper.pdf_url
+    }
+
+def search_cache_path(query, max_results):
+    """Cache file for one query"""
+    key = hashlib.sha1(f"{query}|{max_results}".encode('utf-8')).hexdigest()[:16]
+    return ARXIV_CACHE_DIR / f"search_{key}.json"
+
+def load_search_cache(cache_path, ttl_hours=ARXIV_CACHE_TTL_HOURS):
+    """Cached search results, or None if missing or expired"""
+    if not cache_path.exists():
+        return None
+    
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if time.time() - cache.get("created", 0) > ttl_hours * 3600:
+        return None
+    return cache
+
+def save_search_cache(cache_path, records, complete, created):
+    """Write search results consumed so far"""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"created": created, "complete": complete, "results": records}, f)
+    os.replace(tmp_path, cache_path)
+
+def search_arxiv(query, num_results=20, client=None):
+    """Search arXiv for lung cancer papers, yielding results lazily
+
+    Results are served from an on-disk cache (ARXIV_CACHE_TTL_HOURS) and only
+    fetched from arXiv past what the cache already holds. Stop iterating (or
+    close the generator) once you have enough; pass a stub client with a
+    results(search, offset) method to run without network access.
+    """
+    full_query = f"{query} lung cancer biology medicine"
+    max_results = num_results * 2
+    cache_path = search_cache_path(full_query, max_results)
+    
+    cache = load_search_cache(cache_path)
+    records = list(cache["results"]) if cache else []
+    complete = cache["complete"] if cache else False
+    created = cache["created"] if cache else time.time()
+    
+    if cache:
+        print(f"🔍 Using cached arXiv results for: '{query}' ({len(records)} papers)")
+    else:
+        print(f"🔍 Searching arXiv for: '{query}'...")
+    
+    for record in records[:]:
+        yield CachedPaper(record)
+    
+    if complete:
+        return
+    
+    # Search arXiv, continuing after the results already in the cache
+    import arxiv
     search = arxiv.Search(
-        query=f"{query} lung cancer biology medicine",
-        max_results=num_results * 2,
+        query=full_query,
+        max_results=max_results,
         sort_by=arxiv.SortCriterion.Relevance
     )
+    client = client or arxiv.Client()
     
-    results = list(search.results())
-    print(f"✅ Found {len(results)} papers")
-    return results
+    try:
+        for paper in client.results(search, offset=len(records)):
+            records.append(paper_to_record(paper))
+            yield paper
+        complete = True
+    finally:
+        save_search_cache(cache_path, records, complete, created)
 
 def download_arxiv_paper(paper, filename, paper_num):
     """Download paper from arXiv"""
@@ -26,10 +111,12 @@ def download_arxiv_paper(paper, filename, paper_num):
         print(f"\n[{paper_num}] Downloading: {paper.title[:60]}...")
         
         # Download PDF
+        import requests
         pdf_url = paper.pdf_url
         response = requests.get(pdf_url, timeout=30)
         
         if response.status_code == 200:
+            ensure_directories()
             filepath = PAPERS_DIR / filename
             with open(filepath, 'wb') as f:
                 f.write(response.content)
@@ -44,70 +131,141 @@ def download_arxiv_paper(paper, filename, paper_num):
         print(f"❌ Error: {e}")
         return False
 
+def make_filename(paper):
+    """Local PDF filename for a paper, keyed by its arXiv id"""
+    return paper_store.pdf_path(paper_store.paper_id(paper.entry_id)).name
+
+def build_metadata(paper, filename):
+    """Metadata record stored for each downloaded paper"""
+    return {
+        "arxiv_id": paper.entry_id,
+        "paper_id": paper_store.paper_id(paper.entry_id),
+        "title": paper.title,
+        "display_name": paper_store.display_name(paper.title),
+        "authors": [author.name for author in paper.authors],
+        "published": str(paper.published),
+        "filename": filename,
+        "download_date": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+def save_metadata(metadata_list):
+    """Save paper metadata to METADATA_DIR"""
+    ensure_directories()
+    metadata_file = METADATA_DIR / "papers_metadata.json"
+    with open(metadata_file, 'w') as f:
+        json.dump(metadata_list, f, indent=2)
+    return metadata_file
+
+def load_existing_papers():
+    """Metadata of papers already on disk, keyed by paper_id"""
+    metadata_file = METADATA_DIR / "papers_metadata.json"
+    if not metadata_file.exists():
+        return {}
+    
+    with open(metadata_file, 'r') as f:
+        metadata_list = json.load(f)
+    
+    # Older runs named files by a counter and title
+    if paper_store.migrate_legacy_files(metadata_list):
+        save_metadata(metadata_list)
+    
+    return {
+        m["paper_id"]: m for m in metadata_list
+        if (PAPERS_DIR / m["filename"]).exists()
+    }
+
+def fetch_papers(query=PUBMED_QUERY, num_papers=NUM_PAPERS, client=None):
+    """Yield (metadata, newly_downloaded) for num_papers distinct papers
+
+    Papers already on disk (same arXiv id, any version) are reused without
+    network access, and a download whose content matches a stored PDF is
+    dropped in favour of it. The search stops as soon as enough papers are
+    available.
+    """
+    existing = load_existing_papers()
+    manifest = paper_store.load_manifest()
+    seen = set()
+    count = 0
+    
+    if num_papers <= 0:
+        return
+    
+    with closing(search_arxiv(query, num_papers, client)) as papers:
+        for paper in papers:
+            pid = paper_store.paper_id(paper.entry_id)
+            if pid in seen:
+                continue
+            
+            if pid in existing:
+                metadata = existing.pop(pid)
+                seen.add(pid)
+                count += 1
+                print(f"\n[{count}] ♻️  Already downloaded: {metadata['filename']}")
+                yield metadata, False
+            else:
+                filename = make_filename(paper)
+                
+                # Download
+                if download_arxiv_paper(paper, filename, count + 1):
+                    stored_id = paper_store.register_pdf(manifest, pid, paper.entry_id, paper.title)
+                    paper_store.save_manifest(manifest)
+                    
+                    if stored_id == pid:
+                        seen.add(pid)
+                        count += 1
+                        yield build_metadata(paper, filename), True
+                    elif stored_id not in seen and stored_id in existing:
+                        # Identical PDF already stored under another id
+                        print(f"   ♻️  Same content as {stored_id}, keeping the stored copy")
+                        seen.add(stored_id)
+                        count += 1
+                        yield existing.pop(stored_id), False
+                
+                time.sleep(1)  # Be nice to arXiv
+            
+            if count >= num_papers:
+                return
+
+def merge_with_existing(metadata_list):
+    """Keep metadata for papers still on disk that this run didn't return"""
+    seen = {m["paper_id"] for m in metadata_list}
+    return metadata_list + [
+        m for pid, m in load_existing_papers().items() if pid not in seen
+    ]
+
 def main():
     """Main function to download papers from arXiv"""
     print("=" * 60)
     print("🫁 LUNG CANCER RESEARCH PAPER DOWNLOADER (arXiv)")
     print("=" * 60)
     
-    # Search arXiv
-    papers = search_arxiv("lung cancer treatment", NUM_PAPERS)
+    print(f"\n🎯 Collecting {NUM_PAPERS} papers...\n")
     
-    if not papers:
-        print("❌ No papers found!")
-        return
-    
-    print(f"\n🎯 Downloading {NUM_PAPERS} papers...\n")
-    
-    # Download papers
+    # Download papers (reusing any already on disk)
     downloaded = 0
     metadata_list = []
     
-    for idx, paper in enumerate(papers):
-        if downloaded >= NUM_PAPERS:
-            break
-        
-        # Clean title for filename
-        clean_title = "".join(c for c in paper.title if c.isalnum() or c in (' ', '-', '_'))
-        clean_title = clean_title[:60].strip()
-        
-        filename = f"paper_{downloaded + 1}_{clean_title}.pdf"
-        filename = filename.replace(" ", "_")
-        
-        # Download
-        if download_arxiv_paper(paper, filename, downloaded + 1):
-            metadata = {
-                "arxiv_id": paper.entry_id,
-                "title": paper.title,
-                "authors": [author.name for author in paper.authors],
-                "published": str(paper.published),
-                "filename": filename,
-                "download_date": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            metadata_list.append(metadata)
-            downloaded += 1
-        
-        time.sleep(1)  # Be nice to arXiv
+    for metadata, is_new in fetch_papers(PUBMED_QUERY, NUM_PAPERS):
+        metadata_list.append(metadata)
+        downloaded += int(is_new)
+    
+    if not metadata_list:
+        print("❌ No papers found!")
+        return
     
     # Save metadata
-    if metadata_list:
-        metadata_file = METADATA_DIR / "papers_metadata.json"
-        with open(metadata_file, 'w') as f:
-            json.dump(metadata_list, f, indent=2)
+    metadata_file = save_metadata(merge_with_existing(metadata_list))
     
     print("\n" + "=" * 60)
-    if downloaded > 0:
-        print(f"✅ Successfully downloaded {downloaded} papers!")
-        print(f"📁 Location: {PAPERS_DIR}")
-        print(f"📋 Metadata: {metadata_file}")
-    else:
-        print("❌ No papers could be downloaded!")
+    print(f"✅ {len(metadata_list)} papers ready ({downloaded} downloaded, "
+          f"{len(metadata_list) - downloaded} already on disk)")
+    print(f"📁 Location: {PAPERS_DIR}")
+    print(f"📋 Metadata: {metadata_file}")
     print("=" * 60)
 
 if __name__ == "__main__":
-    # Install arxiv package first: pip install arxiv
+    # arxiv is imported by search_arxiv, once the cache runs out
     try:
-        import arxiv
         main()
     except ImportError:
         print("❌ Please install arxiv package:")
@@ -0,0 +1,348 @@
+"""
+Offline retrieval evaluation: recall@k, MRR and latency per configuration
+Questions come from a hand-curated file (EVAL_QUESTIONS_FILE) plus synthetic
+questions generated from chunks. A chunk counts as relevant when it contains
+the labelled answer text, so labels survive re-chunking and index changes.
+
+Label format (both files):
+    [{"question": "...", "answer_text": "..." or ["...", "..."], "source": "2401.01234.txt"}]
+"source" is optional; without it any paper containing the answer text counts.
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from contextlib import contextmanager
+import numpy as np
+import faiss
+from rag_pipeline import RAGPipeline
+from metadata_filter import ChunkFilterIndex
+import chunk_documents
+import extract_text
+import document_index
+import chunk_adjacency
+import snapshots
+import vector_search
+from config import *
+
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "were", "was", "are", "have",
+    "has", "been", "their", "which", "these", "those", "such", "than", "into", "also",
+    "between", "using", "used", "based", "other", "more", "most", "both", "each",
+    "there", "they", "them", "then", "when", "where", "while", "within", "after",
+    "before", "however", "our", "its", "can", "may", "not", "all", "any", "one", "two",
+}
+
+
+def normalize(text):
+    """Lowercase with collapsed whitespace, for substring matching"""
+    return " ".join(text.lower().split())
+
+
+def pick_sentence(text, min_length=60, max_length=300):
+    """Longest well-formed sentence in a chunk (None if there isn't one)"""
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text)]
+    sentences = [s for s in sentences if min_length <= len(s) <= max_length]
+    return max(sentences, key=len) if sentences else None
+
+
+def answer_fragment(sentence, length=60):
+    """Central run of whole words from a sentence, short enough to fit in small chunks"""
+    words = sentence.split()
+    start = len(words) // 2
+    end = start + 1
+    grown = True
+    while grown:
+        grown = False
+        if end < len(words) and len(" ".join(words[start:end + 1])) <= length:
+            end += 1
+            grown = True
+        if start > 0 and len(" ".join(words[start - 1:end])) <= length:
+            start -= 1
+            grown = True
+    return " ".join(words[start:end])
+
+
+def keyword_query(sentence, max_words=8):
+    """Keyword-style query built from a sentence's content words"""
+    words = []
+    for word in re.findall(r"[A-Za-z][A-Za-z0-9\-]+", sentence):
+        lowered = word.lower()
+        if len(lowered) > 3 and lowered not in STOPWORDS and lowered not in words:
+            words.append(lowered)
+    return " ".join(words[:max_words])
+
+
+def generate_synthetic_questions(chunks, num_questions=50, seed=0, llm_pipeline=None):
+    """Question per sampled chunk, labelled with a fragment of the sentence it asks about
+
+    With an LLM the question is written by FLAN-T5; otherwise it is a keyword
+    query drawn from the sentence.
+    """
+    rng = random.Random(seed)
+    candidates = [chunk for chunk in chunks if len(chunk['text']) > 200]
+    items = []
+
+    for chunk in rng.sample(candidates, min(len(candidates), num_questions * 2)):
+        sentence = pick_sentence(chunk['text'])
+        if sentence is None:
+            continue
+
+        question = None
+        if llm_pipeline is not None:
+            output = llm_pipeline(
+                f"Write a question that is answered by this sentence: {sentence}",
+                max_length=64,
+                do_sample=False
+            )
+            question = output[0]['generated_text'].strip()
+        if not question or len(question) < 10:
+            question = keyword_query(sentence)
+
+        items.append({
+            "question": question,
+            "answer_text": answer_fragment(sentence),
+            "source": chunk['source'],
+            "origin": "synthetic"
+        })
+        if len(items) == num_questions:
+            break
+
+    return items
+
+
+def load_questions(path):
+    """Labelled questions from a JSON file ([] if it doesn't exist)"""
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_eval_set(rag, num_synthetic=50, regenerate=False, use_llm=False):
+    """Hand-curated questions plus (cached) synthetic ones"""
+    curated = [dict(item, origin="curated") for item in load_questions(EVAL_QUESTIONS_FILE)]
+
+    synthetic = [] if regenerate else load_questions(EVAL_SYNTHETIC_FILE)
+    if not synthetic and num_synthetic > 0:
+        print(f"🧪 Generating {num_synthetic} synthetic questions...")
+        synthetic = generate_synthetic_questions(
+            rag.chunks, num_synthetic, llm_pipeline=rag.llm_pipeline if use_llm else None
+        )
+        EVAL_SYNTHETIC_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(EVAL_SYNTHETIC_FILE, 'w', encoding='utf-8') as f:
+            json.dump(synthetic, f, indent=2, ensure_ascii=False)
+
+    print(f"📋 {len(curated)} curated + {len(synthetic)} synthetic questions")
+    return curated + synthetic
+
+
+def is_relevant(chunk, item):
+    """Does a retrieved chunk contain the item's answer (in the right paper, if given)?"""
+    source = item.get("source")
+    if source:
+        sources = {chunk['source']} | {ref['source'] for ref in chunk.get('duplicate_sources', [])}
+        if source not in sources:
+            return False
+
+    answers = item["answer_text"]
+    answers = [answers] if isinstance(answers, str) else answers
+    text = normalize(chunk['text'])
+    return any(normalize(answer) in text for answer in answers)
+
+
+def evaluate(rag, items, k_values=EVAL_K_VALUES):
+    """Recall@k, MRR and per-query latency of rag.retrieve_relevant_chunks over items"""
+    max_k = max(k_values)
+    ranks, latencies = [], []
+
+    for item in items:
+        start = time.perf_counter()
+        retrieved = rag.retrieve_relevant_chunks(item["question"], top_k=max_k)
+        latencies.append(time.perf_counter() - start)
+
+        rank = next(
+            (position for position, chunk in enumerate(retrieved, 1) if is_relevant(chunk, item)),
+            None
+        )
+        ranks.append(rank)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "questions": len(items),
+        "recall": {k: float(np.mean([r is not None and r <= k for r in ranks])) for k in k_values},
+        "mrr": float(np.mean([1 / r if r else 0.0 for r in ranks])),
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+        },
+    }
+
+
+@contextmanager
+def override(rag, **attributes):
+    """Temporarily replace RAGPipeline attributes (index, chunks, options...)"""
+    saved = {name: getattr(rag, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(rag, name, value)
+    try:
+        yield rag
+    finally:
+        for name, value in saved.items():
+            setattr(rag, name, value)
+
+
+def stored_vectors(rag):
+    """Exact float32 vectors of the loaded store (None for a sharded store)"""
+    if rag.sharded:
+        return None
+    if rag.rescore_vectors is not None:
+        return np.asarray(rag.rescore_vectors, dtype='float32')
+    if isinstance(rag.index, faiss.IndexFlat):
+        return rag.index.reconstruct_n(0, rag.index.ntotal)
+    return None
+
+
+def rechunked_store(rag, chunk_size):
+    """Index, chunks and filter index rebuilt from the extracted texts at another chunk size"""
+    metadata_by_stem = chunk_documents.load_paper_metadata()
+    chunks = []
+    for text_path in extract_text.list_text_paths():
+        chunks.extend(chunk_documents.chunk_text_file(
+            text_path, metadata_by_stem, chunk_size=chunk_size,
+            chunk_overlap=min(CHUNK_OVERLAP, chunk_size // 5)
+        ))
+
+    embeddings = rag.embedding_model.encode(
+        [chunk['text'] for chunk in chunks], batch_size=32, convert_to_numpy=True
+    ).astype('float32')
+    index = vector_search.build_index(embeddings, "float32")
+    return {
+        "index": index, "chunks": chunks, "filter_index": ChunkFilterIndex(chunks),
+        "rescore_vectors": None, "sharded": False, "hierarchical": False,
+        "adjacency": chunk_adjacency.ChunkAdjacency(chunks),
+    }
+
+
+def build_configs(rag, storages=(), chunk_sizes=(), diversify_variants=True, top_papers=(),
+                  parent_windows=()):
+    """(name, attribute overrides) for every configuration to compare"""
+    configs = [("current", {})]
+
+    if diversify_variants:
+        configs.append((f"diversify={not rag.diversify}", {"diversify": not rag.diversify}))
+
+    documents = rag.documents
+    if top_papers and documents is None:
+        documents = document_index.DocumentIndex.load(
+            snapshots.current_paths(), rag.chunks.metadata, stored_vectors(rag)
+        )
+    if top_papers and documents is None:
+        print("⚠️  Hierarchical variants need paper centroids or exact vectors; skipping")
+    for num_papers in top_papers if documents is not None else ():
+        configs.append((f"hierarchical={num_papers}", {
+            "hierarchical": True, "documents": documents,
+            "hierarchical_top_papers": num_papers, "hierarchical_min_papers": 0,
+        }))
+
+    adjacency = rag.adjacency
+    if parent_windows and adjacency is None:
+        adjacency = chunk_adjacency.ChunkAdjacency(rag.chunks.metadata)
+    for window in parent_windows:
+        configs.append((f"small_to_big={window}", {
+            "small_to_big": True, "parent_window": window, "adjacency": adjacency,
+        }))
+
+    vectors = stored_vectors(rag) if storages else None
+    if storages and vectors is None:
+        print("⚠️  Storage variants need a single (non-sharded) store with exact vectors; skipping")
+    for storage in storages if vectors is not None else ():
+        index = vector_search.build_index(vectors, storage)
+        base = {"index": index, "sharded": False}
+        configs.append((f"storage={storage}", dict(base, rescore_vectors=None)))
+        if storage != "float32":
+            configs.append((f"storage={storage}+rescore", dict(base, rescore_vectors=vectors)))
+
+    for chunk_size in chunk_sizes:
+        print(f"✂️  Re-chunking at {chunk_size} characters...")
+        configs.append((f"chunk_size={chunk_size}", rechunked_store(rag, chunk_size)))
+
+    return configs
+
+
+def print_report(results, k_values=EVAL_K_VALUES):
+    """Side-by-side table of every configuration"""
+    header = f"{'config':<24}" + "".join(f"{'R@' + str(k):>8}" for k in k_values)
+    header += f"{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}"
+    print("\n" + "=" * len(header))
+    print(header)
+    print("=" * len(header))
+    for name, metrics in results.items():
+        row = f"{name:<24}" + "".join(f"{metrics['recall'][k]:>8.2%}" for k in k_values)
+        row += f"{metrics['mrr']:>8.3f}"
+        row += f"{metrics['latency_ms']['p50']:>9.1f}{metrics['latency_ms']['p95']:>9.1f}"
+        print(row)
+    print("=" * len(header))
+
+
+def save_report(results, items):
+    """Write the results as JSON under EVAL_REPORTS_DIR; returns the path"""
+    EVAL_REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    report_file = EVAL_REPORTS_DIR / f"retrieval_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, 'w') as f:
+        json.dump({
+            "questions": len(items),
+            "curated": sum(item.get("origin") == "curated" for item in items),
+            "results": results,
+        }, f, indent=2)
+    return report_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality vs latency")
+    parser.add_argument("--synthetic", type=int, default=50, help="Synthetic questions to use")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate synthetic questions")
+    parser.add_argument("--llm-questions", action="store_true",
+                        help="Write synthetic questions with the LLM instead of keywords")
+    parser.add_argument("--storages", default="", help="e.g. float32,float16,sq8")
+    parser.add_argument("--chunk-sizes", default="", help="e.g. 500,1500 (re-chunks and re-embeds)")
+    parser.add_argument("--hierarchical", default="",
+                        help="Top-paper counts for paper-then-chunk search, e.g. 5,20")
+    parser.add_argument("--parent-window", default="",
+                        help="Small-to-big neighbour counts per side, e.g. 1,2")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📏 RETRIEVAL EVALUATION")
+    print("=" * 60)
+
+    rag = RAGPipeline()
+    rag.track_usage = False  # Don't let evaluation queries shape retention
+
+    items = load_eval_set(rag, args.synthetic, args.regenerate, args.llm_questions)
+    if not items:
+        print("❌ No questions to evaluate!")
+        return
+
+    storages = [s for s in args.storages.split(",") if s]
+    chunk_sizes = [int(n) for n in args.chunk_sizes.split(",") if n]
+    top_papers = [int(n) for n in args.hierarchical.split(",") if n]
+    parent_windows = [int(n) for n in args.parent_window.split(",") if n]
+
+    results = {}
+    for name, overrides in build_configs(rag, storages, chunk_sizes, top_papers=top_papers,
+                                         parent_windows=parent_windows):
+        print(f"\n▶️  {name}")
+        with override(rag, **overrides):
+            rag.retrieve_relevant_chunks("warm up", top_k=max(EVAL_K_VALUES))
+            results[name] = evaluate(rag, items)
+
+    print_report(results)
+    print(f"💾 Report: {save_report(results, items)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,35 @@
 import os
-import PyPDF2
+import sys
+import json
 from pathlib import Path
+import frame_store
 from config import *
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from a single PDF file"""
+_text_store = None
+
+def extract_pages_from_pdf(pdf_path, page_numbers=None):
+    """Extract raw text per page as {page_number: text} (1-based; all pages by default)"""
+    import PyPDF2
     try:
-        text = ""
+        pages = {}
         with open(pdf_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
             num_pages = len(pdf_reader.pages)
             
-            for page_num in range(num_pages):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
+            for page_num in page_numbers or range(1, num_pages + 1):
+                if 1 <= page_num <= num_pages:
+                    pages[page_num] = pdf_reader.pages[page_num - 1].extract_text() or ""
         
-        return text.strip()
+        return pages
     
     except Exception as e:
         print(f"❌ Error extracting text from {pdf_path.name}: {e}")
-        return ""
+        return {}
+
+def extract_text_from_pdf(pdf_path):
+    """Extract text from a single PDF file"""
+    pages = extract_pages_from_pdf(pdf_path)
+    return "\n".join(pages[n] for n in sorted(pages)).strip()
 
 def clean_text(text):
     """Clean extracted text"""
@@ -31,8 +41,164 @@ def clean_text(text):
     
     return text
 
-def process_all_pdfs():
-    """Process all PDFs in the research_papers directory"""
+def build_page_store(page_texts):
+    """Join cleaned pages into one text and record each page's [start, end) offsets
+
+    The joined text is identical to cleaning the whole document at once.
+    """
+    text = ""
+    offsets = []
+    for page_text in page_texts:
+        page_text = clean_text(page_text)
+        if text and page_text:
+            text += " "
+        start = len(text)
+        text += page_text
+        offsets.append([start, len(text)])
+    
+    return text, offsets
+
+def text_store():
+    """Container of every extracted text, one frame per paper (shared within a process)"""
+    global _text_store
+    if _text_store is None:
+        _text_store = frame_store.FrameStore(TEXT_STORE_FILE)
+    return _text_store
+
+def page_offsets_path(text_path):
+    """Page offsets file stored next to a legacy (pre-container) text file"""
+    return text_path.with_suffix('.pages.json')
+
+def remove_legacy_files(text_path):
+    for path in [text_path, page_offsets_path(text_path)]:
+        if path.exists():
+            path.unlink()
+
+def save_page_store(text_path, text, offsets):
+    """Save extracted text and its page offsets as the paper's frame
+
+    text_path names the paper (TEXTS_DIR/<paper id>.txt); chunks keep its
+    file name as their source.
+    """
+    ensure_directories()
+    text_store().put(text_path.stem, {"text": text, "pages": offsets})
+    remove_legacy_files(text_path)
+
+def load_text_record(text_path):
+    """{"text", "pages"} of an extracted paper, or None if it hasn't been extracted"""
+    record = text_store().get(text_path.stem)
+    if record is None and text_path.exists():
+        # Extracted before texts moved into the container
+        with open(text_path, 'r', encoding='utf-8') as f:
+            record = {"text": f.read(), "pages": []}
+        offsets_file = page_offsets_path(text_path)
+        if offsets_file.exists():
+            with open(offsets_file, 'r') as f:
+                record["pages"] = json.load(f)["pages"]
+    return record
+
+def read_text(text_path):
+    """Full extracted text of a paper"""
+    record = load_text_record(text_path)
+    if record is None:
+        raise FileNotFoundError(f"No extracted text for {text_path.stem}; run extract_text.py")
+    return record["text"]
+
+def load_page_offsets(text_path):
+    """Page offsets of an extracted text ([] if it predates page tracking)"""
+    record = load_text_record(text_path)
+    return record["pages"] if record else []
+
+def load_page_texts(text_path):
+    """Cleaned text of every page, sliced from the stored text"""
+    record = load_text_record(text_path)
+    if record is None:
+        return []
+    return [record["text"][start:end] for start, end in record["pages"]]
+
+def text_timestamp(text_path):
+    """When a paper's text was last written (0 if it never was)"""
+    timestamp = text_store().timestamp(text_path.stem)
+    if timestamp is None and text_path.exists():
+        return text_path.stat().st_mtime
+    return timestamp or 0
+
+def list_text_paths():
+    """Text path of every extracted paper, whether in the container or a legacy file"""
+    stems = set(text_store().keys()) | {path.stem for path in TEXTS_DIR.glob("*.txt")}
+    return [TEXTS_DIR / f"{stem}.txt" for stem in sorted(stems)]
+
+def delete_texts(stems):
+    """Drop papers' texts; returns the ones that were in the container
+
+    The container space is reclaimed by compact().
+    """
+    deleted = text_store().delete(stems)
+    for stem in stems:
+        remove_legacy_files(TEXTS_DIR / f"{stem}.txt")
+    return deleted
+
+def pack_legacy_texts():
+    """Move legacy .txt / .pages.json files into the container; returns how many"""
+    legacy = [path for path in sorted(TEXTS_DIR.glob("*.txt")) if path.stem not in text_store()]
+    if legacy:
+        text_store().put_many((path.stem, load_text_record(path)) for path in legacy)
+    for path in TEXTS_DIR.glob("*.txt"):
+        remove_legacy_files(path)
+    return len(legacy)
+
+def text_path_for(pdf_path):
+    """Extracted text file for a PDF (both named by paper id)"""
+    return TEXTS_DIR / (Path(pdf_path).stem + ".txt")
+
+def is_extracted(pdf_path):
+    """True if a PDF's text and page offsets are already on disk"""
+    text_path = text_path_for(pdf_path)
+    if text_path.stem in text_store():
+        return True
+    return text_path.exists() and page_offsets_path(text_path).exists()
+
+def process_pdf(pdf_path, force=False):
+    """Extract, clean and save the text of one PDF; returns the text path or None
+
+    PDFs are content-addressed by paper id, so an existing text is reused
+    unless force is set.
+    """
+    if not force and is_extracted(pdf_path):
+        return text_path_for(pdf_path)
+    
+    pages = extract_pages_from_pdf(pdf_path)
+    text, offsets = build_page_store(pages[n] for n in sorted(pages))
+    
+    if not text:
+        return None
+    
+    # Save extracted text with page offsets
+    text_path = text_path_for(pdf_path)
+    save_page_store(text_path, text, offsets)
+    
+    return text_path
+
+def reextract_pages(pdf_path, page_numbers):
+    """Re-extract only some pages of an already processed PDF; returns the text path"""
+    text_path = text_path_for(pdf_path)
+    page_texts = load_page_texts(text_path)
+    
+    if not page_texts:
+        # Nothing stored per page yet: fall back to a full extraction
+        return process_pdf(pdf_path, force=True)
+    
+    for page_num, page_text in extract_pages_from_pdf(pdf_path, page_numbers).items():
+        page_texts[page_num - 1] = page_text
+    
+    text, offsets = build_page_store(page_texts)
+    save_page_store(text_path, text, offsets)
+    print(f"   ✅ Re-extracted pages {sorted(page_numbers)} of {pdf_path.name}")
+    
+    return text_path
+
+def process_all_pdfs(force=False):
+    """Process all PDFs in the research_papers directory (skipping ones already extracted)"""
     print("=" * 60)
     print("📄 TEXT EXTRACTION FROM PDFs")
     print("=" * 60)
@@ -47,26 +213,23 @@ def process_all_pdfs():
     print(f"📚 Found {len(pdf_files)} PDF files\n")
     
     extracted_count = 0
+    skipped_count = 0
     
     for idx, pdf_path in enumerate(pdf_files, 1):
         print(f"[{idx}/{len(pdf_files)}] Processing: {pdf_path.name}")
         
-        # Extract text
-        text = extract_text_from_pdf(pdf_path)
+        if not force and is_extracted(pdf_path):
+            print(f"   ⏭️  Already extracted: {text_path_for(pdf_path).name}\n")
+            skipped_count += 1
+            continue
         
-        if text:
-            # Clean text
-            text = clean_text(text)
-            
-            # Save extracted text
-            text_filename = pdf_path.stem + ".txt"
-            text_path = TEXTS_DIR / text_filename
-            
-            with open(text_path, 'w', encoding='utf-8') as f:
-                f.write(text)
-            
-            print(f"   ✅ Extracted {len(text)} characters")
-            print(f"   💾 Saved to: {text_filename}")
+        # Extract, clean and save text
+        text_path = process_pdf(pdf_path)
+        
+        if text_path:
+            print(f"   ✅ Extracted {len(read_text(text_path))} characters "
+                  f"from {len(load_page_offsets(text_path))} pages")
+            print(f"   💾 Saved to: {TEXT_STORE_FILE.name} [{text_path.stem}]")
             extracted_count += 1
         else:
             print(f"   ⚠️  No text extracted")
@@ -75,8 +238,10 @@ def process_all_pdfs():
     
     print("=" * 60)
     print(f"✅ Successfully extracted text from {extracted_count} papers!")
+    if skipped_count:
+        print(f"⏭️  Reused {skipped_count} papers extracted earlier (--force to redo)")
     print(f"📁 Location: {TEXTS_DIR}")
     print("=" * 60)
 
 if __name__ == "__main__":
-    process_all_pdfs()
\ No newline at end of file
+    process_all_pdfs(force="--force" in sys.argv)
\ No newline at end of file
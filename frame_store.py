@@ -0,0 +1,359 @@
+"""
+Compressed, randomly accessible containers for extracted texts and chunks
+A container is one append-only file of independently zlib-compressed frames,
+each stored under a key (a paper or a source file). Opening a container scans
+the record headers into an offset index, so any frame is read back with one
+seek and one decompress; the other frames are never touched.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Sequence
+from config import *
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+MAGIC = b"RAGFRM1\n"
+HEADER = struct.Struct("<IIdB")  # key bytes, data bytes, write time, flags
+DELETED = 1
+
+
+def encode_frame(value, level=FRAME_COMPRESSION_LEVEL):
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'), level)
+
+
+def decode_frame(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def pack_record(key, data, timestamp=None, flags=0):
+    key = key.encode('utf-8')
+    timestamp = time.time() if timestamp is None else timestamp
+    return HEADER.pack(len(key), len(data), timestamp, flags) + key + data
+
+
+class FrameStore:
+    """Key → JSON value container; the last record written for a key wins
+
+    Reads go through one file handle kept open for the store's lifetime, so a
+    snapshot's container stays readable after the snapshot is pruned. Appends
+    from other processes (pipelined or distributed ingest) are picked up on
+    the next lookup.
+    """
+
+    def __init__(self, path, cache_size=FRAME_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self.entries = {}  # key → (data offset, data bytes, write time)
+        self.dead_bytes = 0
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._file = None
+        self._identity = None
+        self._scanned = 0
+
+    def _refresh(self):
+        """Reopen after a compaction, index records appended since the last scan"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._file is not None and self._identity is not None:
+                return  # Unlinked under us (pruned snapshot): keep serving the open file
+            self.entries, self._scanned = {}, 0
+            return
+
+        if self._file is None or self._identity != (stat.st_dev, stat.st_ino):
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self.path, 'rb')
+            self._identity = (stat.st_dev, stat.st_ino)
+            self.entries, self._cache, self.dead_bytes, self._scanned = {}, OrderedDict(), 0, 0
+
+        if stat.st_size > self._scanned:
+            self._scanned = self._scan(self._file, self._scanned)
+
+    def _scan(self, f, offset):
+        """Index records from offset on; returns where the last complete record ends"""
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if offset == 0:
+            f.seek(0)
+            if f.read(len(MAGIC)) != MAGIC:
+                if size:
+                    raise ValueError(f"{self.path} is not a frame container")
+                return 0
+            offset = len(MAGIC)
+
+        while offset + HEADER.size <= size:
+            f.seek(offset)
+            key_len, data_len, timestamp, flags = HEADER.unpack(f.read(HEADER.size))
+            end = offset + HEADER.size + key_len + data_len
+            if end > size:
+                break  # An append cut short by a crash; the next append truncates it
+            key = f.read(key_len).decode('utf-8')
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.dead_bytes += HEADER.size + len(key.encode('utf-8')) + previous[1]
+                self._cache.pop(key, None)
+            if flags & DELETED:
+                self.dead_bytes += end - offset
+            else:
+                self.entries[key] = (offset + HEADER.size + key_len, data_len, timestamp)
+            offset = end
+        return offset
+
+    def keys(self):
+        with self._lock:
+            self._refresh()
+            return list(self.entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key not in self.entries:
+                self._refresh()
+            return key in self.entries
+
+    def __len__(self):
+        return len(self.keys())
+
+    def timestamp(self, key):
+        """When the frame for key was written (None if there is none)"""
+        with self._lock:
+            self._refresh()
+            entry = self.entries.get(key)
+            return entry[2] if entry else None
+
+    def stored_size(self, key):
+        """Compressed bytes of key's frame (0 if there is none)"""
+        with self._lock:
+            self._refresh()
+            entry = self.entries.get(key)
+            return entry[1] if entry else 0
+
+    def get(self, key, default=None):
+        """Decoded frame for key; recently used frames are served from memory"""
+        with self._lock:
+            self._refresh()  # A rewritten frame evicts the cached copy
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+
+            offset, length, _ = entry
+            self._file.seek(offset)
+            value = decode_frame(self._file.read(length))
+
+            if self.cache_size:
+                self._cache[key] = value
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return value
+
+    def items(self):
+        """(key, value) for every frame, in the order they were written"""
+        for key in self.keys():
+            value = self.get(key)
+            if value is not None:
+                yield key, value
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def put_many(self, items):
+        """Append frames for several keys in one locked write"""
+        self._append(b"".join(pack_record(key, encode_frame(value)) for key, value in items))
+
+    def delete(self, keys):
+        """Append tombstones; the bytes are reclaimed by compact()"""
+        with self._lock:
+            self._refresh()
+            keys = [key for key in keys if key in self.entries]
+        if keys:
+            self._append(b"".join(pack_record(key, b"", flags=DELETED) for key in keys))
+        return keys
+
+    def _append(self, records):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            while True:
+                with open(self.path, 'a+b') as f:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file closes
+                    if os.stat(self.path).st_ino != os.fstat(f.fileno()).st_ino:
+                        continue  # Compacted while we waited for the lock
+
+                    # Index everything appended so far to find where valid records end
+                    self._refresh()
+                    size = f.seek(0, os.SEEK_END)
+                    if self._scanned == 0:
+                        f.truncate(0)
+                        f.write(MAGIC)
+                    elif size != self._scanned:
+                        f.truncate(self._scanned)  # Drop a torn record left by a crash
+                    f.write(records)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    return
+
+    def compact(self):
+        """Rewrite live frames only and swap the file in by rename; returns bytes reclaimed"""
+        if not self.path.exists():
+            return 0
+        with self._lock, open(self.path, 'rb') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)  # Appenders that were waiting retry on the new file
+            self._refresh()
+            before = os.path.getsize(self.path)
+            records = []
+            for key, (offset, length, timestamp) in self.entries.items():
+                f.seek(offset)
+                records.append(pack_record(key, f.read(length), timestamp))
+            write_container(self.path, records)
+            self._refresh()
+            return before - os.path.getsize(self.path)
+
+    def stats(self):
+        """Frame count plus stored and decompressed bytes"""
+        raw_bytes = 0
+        for key in self.keys():
+            offset, length, _ = self.entries[key]
+            with self._lock:
+                self._file.seek(offset)
+                raw_bytes += len(zlib.decompress(self._file.read(length)))
+        return {
+            "frames": len(self.entries),
+            "stored_bytes": sum(length for _, length, _ in self.entries.values()),
+            "raw_bytes": raw_bytes,
+            "dead_bytes": self.dead_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file, self._identity, self._scanned = None, None, 0
+
+
+def write_container(path, records):
+    """Replace a container with packed records (temp file + rename)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        for record in records:
+            f.write(record)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_frames(path, items):
+    """Write a new container holding just these (key, value) frames"""
+    write_container(path, (pack_record(key, encode_frame(value)) for key, value in items))
+
+
+# Chunk lists of a vector store snapshot: metadata in the pickle, text in frames
+
+class ChunkList(Sequence):
+    """Chunk dicts of a snapshot, with each chunk's text read from its source's frame
+
+    metadata holds everything but the text, for callers (filters, centroids,
+    source lists) that never need it. Stores written before the text moved
+    out of the pickle have no texts container; their metadata is returned as is.
+    """
+
+    def __init__(self, metadata, texts=None):
+        self.metadata = metadata
+        self.texts = texts
+        self.slots = []
+        if texts is not None:
+            # Position of each chunk within its source's frame
+            seen = {}
+            for chunk in metadata:
+                self.slots.append(seen.get(chunk['source'], 0))
+                seen[chunk['source']] = self.slots[-1] + 1
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if self.texts is None:
+            return self.metadata[position]
+        chunk = dict(self.metadata[position])
+        chunk['text'] = self.texts.get(chunk['source'])[self.slots[position]]
+        return chunk
+
+
+def save_chunk_store(paths, chunks):
+    """Write a snapshot's chunk metadata pickle and its per-source text frames"""
+    texts = {}
+    metadata = []
+    for chunk in chunks:
+        texts.setdefault(chunk['source'], []).append(chunk['text'])
+        metadata.append({key: value for key, value in chunk.items() if key != 'text'})
+
+    write_frames(paths["chunk_texts"], texts.items())
+    tmp_path = paths["chunks"].with_name(paths["chunks"].name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(metadata, f)
+    os.replace(tmp_path, paths["chunks"])
+
+
+def load_chunk_store(paths):
+    """ChunkList for a snapshot (legacy pickles with the text inline still load)"""
+    with open(paths["chunks"], 'rb') as f:
+        metadata = pickle.load(f)
+    texts = None
+    if paths["chunk_texts"].exists():
+        texts = FrameStore(paths["chunk_texts"])
+        texts.keys()  # Open it now, so the snapshot stays readable even once it is pruned
+    return ChunkList(metadata, texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, compact or migrate to the frame containers")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Pack legacy .txt/.pages.json files and all_chunks.json into containers")
+    parser.add_argument("--compact", action="store_true", help="Reclaim space from replaced frames")
+    args = parser.parse_args()
+
+    import extract_text
+    import chunk_documents
+
+    print("=" * 60)
+    print("🗜️  FRAME CONTAINERS")
+    print("=" * 60)
+
+    if args.migrate:
+        print(f"📦 Packed {extract_text.pack_legacy_texts()} text files into {TEXT_STORE_FILE.name}")
+        print(f"📦 Packed {chunk_documents.pack_legacy_chunks()} chunks into {CHUNK_STORE_FILE.name}")
+
+    for store in [extract_text.text_store(), chunk_documents.chunk_store()]:
+        if args.compact:
+            print(f"🧹 {store.path.name}: reclaimed {store.compact() / 1024:.0f} KB")
+        stats = store.stats()
+        ratio = stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+        print(f"\n📁 {store.path}")
+        print(f"   Frames: {stats['frames']}")
+        print(f"   Stored: {stats['stored_bytes'] / 1024:.0f} KB "
+              f"({stats['raw_bytes'] / 1024:.0f} KB raw, {ratio:.1f}x)")
+        if stats["dead_bytes"]:
+            print(f"   Reclaimable: {stats['dead_bytes'] / 1024:.0f} KB (--compact)")
+
+
+if __name__ == "__main__":
+    main()
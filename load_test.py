@@ -0,0 +1,382 @@
+"""
+Concurrent-user load test for the question answering path
+Simulated users replay a question mix against one process, either calling
+RAGPipeline directly ("pipeline") or re-running app.py per question against a
+Streamlit stand-in ("app"), while the number of users ramps up stage by stage.
+Each stage reports throughput, latency percentiles, error / fallback rates and
+memory growth; a JSON report is written to LOAD_TEST_REPORTS_DIR.
+
+Runs on a single CPU machine: add --no-llm to answer extractively, or
+--llm-deadline to tighten the two-phase deadline.
+"""
+
+import argparse
+import json
+import random
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from rag_pipeline import RAGPipeline
+from session_manager import SessionManager
+from config import *
+
+APP_SCRIPT = Path(__file__).parent / "app.py"
+
+
+def current_rss_mb():
+    """Resident memory of this process (peak RSS where /proc isn't available)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def question_mix():
+    """The app's example questions plus the curated evaluation questions"""
+    questions = list(EXAMPLE_QUESTIONS)
+    if EVAL_QUESTIONS_FILE.exists():
+        with open(EVAL_QUESTIONS_FILE, 'r', encoding='utf-8') as f:
+            questions += [item["question"] for item in json.load(f)]
+    return questions
+
+
+class Outcomes:
+    """Per-thread record of how the pipeline answered the last question"""
+
+    def __init__(self, deadline=LLM_ANSWER_DEADLINE_S):
+        self.deadline = deadline
+        self.local = threading.local()
+
+    def attach(self, rag):
+        """Wrap a pipeline's answer methods on the instance (the class is untouched)
+
+        The two-phase upgrade also gets this run's deadline, so app.py's
+        rag.upgrade_answer(result) call uses it too.
+        """
+        answer_question = rag.answer_question
+        answer_question_fast = rag.answer_question_fast
+        upgrade_answer = rag.upgrade_answer
+
+        def record(result):
+            if 'cached_query' in result:
+                self.local.outcome = "cache"
+            elif result.get('timed_out'):
+                self.local.outcome = "fallback"
+            elif result.get('answer_type') == 'extractive' or rag.llm_pipeline is None:
+                self.local.outcome = "extractive"
+            else:
+                self.local.outcome = "generated"
+            return result
+
+        rag.answer_question = lambda *a, **kw: record(answer_question(*a, **kw))
+        rag.answer_question_fast = lambda *a, **kw: record(answer_question_fast(*a, **kw))
+        rag.upgrade_answer = lambda result: record(upgrade_answer(result, self.deadline))
+
+    def reset(self):
+        self.local.outcome = None
+
+    def last(self):
+        return getattr(self.local, "outcome", None)
+
+
+class StopRun(Exception):
+    """Raised by the stand-in st.stop()"""
+
+
+class _Null:
+    """Context manager / placeholder that accepts and ignores any call"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __getattr__(self, name):
+        return self
+
+
+class SessionState(dict):
+    """dict with attribute access, like st.session_state"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class StreamlitStandIn:
+    """Just enough of the streamlit module to run app.py headlessly
+
+    Every simulated user runs the script on its own thread, so session state,
+    the question being "typed" and any st.error() messages are thread-local.
+    Widgets return their defaults, except that the question box holds the
+    user's question and the Ask button is pressed.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.sidebar = _Null()
+
+    def begin(self, session_state, question):
+        self.local.session_state = session_state
+        self.local.question = question
+        self.local.errors = []
+
+    @property
+    def session_state(self):
+        return self.local.session_state
+
+    def errors(self):
+        return self.local.errors
+
+    def error(self, message, *args, **kwargs):
+        self.local.errors.append(str(message))
+
+    def stop(self):
+        raise StopRun()
+
+    def rerun(self):
+        raise StopRun()
+
+    def text_input(self, label, value="", *args, **kwargs):
+        return self.local.question if label == "Your Question:" else kwargs.get("value", value)
+
+    def button(self, label, *args, **kwargs):
+        return label == "🔍 Ask"
+
+    def radio(self, label, options, *args, **kwargs):
+        return options[0]
+
+    def selectbox(self, label, options, *args, **kwargs):
+        return options[0] if options else None
+
+    def multiselect(self, label, options, default=None, *args, **kwargs):
+        return list(default or [])
+
+    def slider(self, label, min_value=None, max_value=None, value=None, *args, **kwargs):
+        return value
+
+    def columns(self, spec, *args, **kwargs):
+        return [_Null() for _ in range(spec if isinstance(spec, int) else len(spec))]
+
+    def __getattr__(self, name):
+        # markdown, header, metric, spinner, expander, empty, caption, ...
+        return _Null()
+
+
+class AppRunner:
+    """Runs app.py once per question, the way a Streamlit rerun would"""
+
+    def __init__(self, rag, shared_pipeline=True):
+        self.rag = rag
+        self.shared_pipeline = shared_pipeline
+        self.code = compile(APP_SCRIPT.read_text(encoding='utf-8'), str(APP_SCRIPT), "exec")
+        self.st = StreamlitStandIn()
+        sys.modules["streamlit"] = self.st
+
+    def new_session(self):
+        """Session state of a browser tab that has already loaded the system
+
+        Seeding it skips initialize_system(), which would count a real session
+        (and could trigger retention). With shared_pipeline=False every
+        session loads its own RAGPipeline, as app.py does.
+        """
+        return SessionState(
+            rag_pipeline=self.rag if self.shared_pipeline else RAGPipeline(),
+            session_manager=SessionManager(),
+            setup_complete=True,
+        )
+
+    def ask(self, session_state, question):
+        self.st.begin(session_state, question)
+        try:
+            exec(self.code, {"__name__": "__app__"})
+        except StopRun:
+            pass
+        if self.st.errors():
+            raise RuntimeError(self.st.errors()[0])
+
+
+def simulated_user(ask, questions, stop_at, samples, think_s, seed, outcomes):
+    """Ask random questions until the stage ends, recording (latency, outcome, error)"""
+    rng = random.Random(seed)
+    while time.perf_counter() < stop_at:
+        question = rng.choice(questions)
+        outcomes.reset()
+        start = time.perf_counter()
+        error = None
+        try:
+            ask(question)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        samples.append((time.perf_counter() - start, outcomes.last(), error))
+        if think_s:
+            time.sleep(rng.uniform(0, 2 * think_s))
+
+
+def run_stage(make_user, num_users, duration_s, questions, think_s, outcomes, seed=0):
+    """One load level: num_users concurrent users for duration_s seconds"""
+    samples = []
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    stop_at = started + duration_s
+
+    threads = [
+        threading.Thread(
+            target=simulated_user,
+            args=(make_user(), questions, stop_at, samples, think_s, seed + i, outcomes),
+            daemon=True
+        )
+        for i in range(num_users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - started
+    rss_after = current_rss_mb()
+    return summarize(num_users, samples, elapsed, rss_before, rss_after)
+
+
+def summarize(num_users, samples, elapsed, rss_before, rss_after):
+    """Throughput, latency percentiles, error / fallback rates and memory for a stage"""
+    latencies_ms = np.array([latency for latency, _, error in samples if error is None]) * 1000
+    outcomes = [outcome for _, outcome, error in samples if error is None]
+    errors = [error for _, _, error in samples if error is not None]
+    answered = len(latencies_ms)
+
+    def share(kind):
+        return sum(outcome == kind for outcome in outcomes) / answered if answered else 0.0
+
+    return {
+        "users": num_users,
+        "requests": len(samples),
+        "throughput_qps": answered / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            f"p{p}": float(np.percentile(latencies_ms, p)) if answered else None
+            for p in (50, 90, 95, 99)
+        },
+        "error_rate": len(errors) / len(samples) if samples else 0.0,
+        "errors": sorted(set(errors))[:5],
+        "fallback_rate": share("fallback"),
+        "extractive_rate": share("extractive"),
+        "cache_hit_rate": share("cache"),
+        "rss_mb": {"before": round(rss_before, 1), "after": round(rss_after, 1),
+                   "growth": round(rss_after - rss_before, 1)},
+    }
+
+
+def print_report(stages):
+    """One row per load level"""
+    header = (f"{'users':>6}{'reqs':>7}{'q/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'errors':>8}{'fallbk':>8}{'cache':>8}{'RSS MB':>9}{'+MB':>7}")
+    print("\n" + "=" * len(header))
+    print(header)
+    print("=" * len(header))
+    for stage in stages:
+        latency = {k: v if v is not None else float("nan") for k, v in stage["latency_ms"].items()}
+        print(f"{stage['users']:>6}{stage['requests']:>7}{stage['throughput_qps']:>8.2f}"
+              f"{latency['p50']:>9.0f}{latency['p95']:>9.0f}{latency['p99']:>9.0f}"
+              f"{stage['error_rate']:>8.1%}{stage['fallback_rate']:>8.1%}"
+              f"{stage['cache_hit_rate']:>8.1%}{stage['rss_mb']['after']:>9.0f}"
+              f"{stage['rss_mb']['growth']:>+7.0f}")
+    print("=" * len(header))
+    for stage in stages:
+        for error in stage["errors"]:
+            print(f"   ❌ {stage['users']} users: {error}")
+
+
+def save_report(stages, settings):
+    """Write the run as JSON under LOAD_TEST_REPORTS_DIR; returns the path"""
+    LOAD_TEST_REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    report_file = LOAD_TEST_REPORTS_DIR / f"load_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"settings": settings, "stages": stages}, f, indent=2)
+    return report_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp simulated users against the RAG pipeline")
+    parser.add_argument("--target", choices=["pipeline", "app"], default="pipeline",
+                        help="Call RAGPipeline directly, or run app.py against a Streamlit stand-in")
+    parser.add_argument("--users", default=",".join(map(str, LOAD_TEST_USERS)),
+                        help="Concurrent users per stage, e.g. 1,2,4,8")
+    parser.add_argument("--duration", type=float, default=LOAD_TEST_STAGE_S, help="Seconds per stage")
+    parser.add_argument("--think-ms", type=float, default=0, help="Mean pause between a user's questions")
+    parser.add_argument("--no-llm", action="store_true", help="Extractive answers only")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the semantic answer cache")
+    parser.add_argument("--llm-deadline", type=float, default=LLM_ANSWER_DEADLINE_S,
+                        help="Two-phase deadline before falling back to the extractive answer")
+    parser.add_argument("--session-pipelines", action="store_true",
+                        help="(app) Each user loads its own RAGPipeline, as real sessions do")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🏋️  LOAD TEST")
+    print("=" * 60)
+
+    rag = RAGPipeline()
+    outcomes = Outcomes(args.llm_deadline)
+
+    def prepare(pipeline):
+        pipeline.track_usage = False  # Don't let synthetic traffic shape retention
+        pipeline.query_log = None  # ...or the prewarm question mix
+        if args.no_llm:
+            pipeline.llm_pipeline = None
+        if args.no_cache:
+            pipeline.semantic_cache = None
+        outcomes.attach(pipeline)
+        return pipeline
+
+    prepare(rag)
+
+    if args.target == "app":
+        runner = AppRunner(rag, shared_pipeline=not args.session_pipelines)
+
+        def make_user():
+            session_state = runner.new_session()
+            if args.session_pipelines:
+                prepare(session_state.rag_pipeline)
+            return lambda question: runner.ask(session_state, question)
+    else:
+        def make_user():
+            def ask(question):
+                if TWO_PHASE_ANSWERS:
+                    return rag.upgrade_answer(rag.answer_question_fast(question))
+                return rag.answer_question(question)
+            return ask
+
+    questions = question_mix()
+    user_counts = [int(n) for n in args.users.split(",") if n]
+    print(f"📋 {len(questions)} questions, stages: {user_counts} users × {args.duration:.0f}s "
+          f"({args.target})")
+
+    stages = []
+    for num_users in user_counts:
+        print(f"\n▶️  {num_users} concurrent user(s)...")
+        stages.append(run_stage(make_user, num_users, args.duration, questions,
+                                args.think_ms / 1000, outcomes))
+
+    print_report(stages)
+    print(f"💾 Report: {save_report(stages, vars(args))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Per-field bitmaps over chunk metadata for filtered vector search
+Filters (source, author, publication year range) become a boolean mask over
+chunk positions that is pushed into the FAISS search as an ID selector
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+FILTER_CACHE_SIZE = 64
+
+
+def mask_to_selector(mask):
+    """Wrap a boolean mask over index ids in a FAISS bitmap selector"""
+    import faiss
+    packed = np.packbits(mask.astype(bool), bitorder='little')
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(packed))
+    selector.referenced_objects = [packed]  # keep the bitmap alive as long as the selector
+    return selector
+
+
+class ChunkFilterIndex:
+    """Bitmaps per source and per author plus a year column, built once per chunk list"""
+
+    def __init__(self, chunks):
+        self.num_chunks = len(chunks)
+        self.years = np.array([chunk.get('year', 0) for chunk in chunks], dtype='int16')
+        self.source_bitmaps = {}
+        self.author_bitmaps = {}
+
+        for position, chunk in enumerate(chunks):
+            self._bitmap(self.source_bitmaps, chunk['source'])[position] = True
+            # Chunks dedup collapsed into this one still belong to their own papers
+            for reference in chunk.get('duplicate_sources', []):
+                self._bitmap(self.source_bitmaps, reference['source'])[position] = True
+            for author in chunk.get('authors', []):
+                self._bitmap(self.author_bitmaps, author.lower())[position] = True
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()  # Shared by every session searching this store
+
+    def _bitmap(self, bitmaps, key):
+        if key not in bitmaps:
+            bitmaps[key] = np.zeros(self.num_chunks, dtype=bool)
+        return bitmaps[key]
+
+    def _any_of(self, bitmaps, keys):
+        """OR together the bitmaps for several values of one field"""
+        mask = np.zeros(self.num_chunks, dtype=bool)
+        for key in keys:
+            if key in bitmaps:
+                mask |= bitmaps[key]
+        return mask
+
+    def mask(self, filters):
+        """Boolean mask of chunks matching every given filter (None = no filtering)
+
+        filters: {"sources": [...], "authors": [...], "year_min": int, "year_max": int}
+        """
+        if not filters or not any(v not in (None, [], "") for v in filters.values()):
+            return None
+
+        key = tuple(sorted(
+            (name, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+            for name, value in filters.items()
+        ))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        mask = np.ones(self.num_chunks, dtype=bool)
+        if filters.get("sources"):
+            mask &= self._any_of(self.source_bitmaps, filters["sources"])
+        if filters.get("authors"):
+            # Match on any author whose name contains the search text
+            wanted = [a.lower() for a in filters["authors"]]
+            keys = [name for name in self.author_bitmaps if any(w in name for w in wanted)]
+            mask &= self._any_of(self.author_bitmaps, keys)
+        if filters.get("year_min"):
+            mask &= self.years >= int(filters["year_min"])
+        if filters.get("year_max"):
+            mask &= (self.years > 0) & (self.years <= int(filters["year_max"]))
+
+        with self._lock:
+            self._cache[key] = mask
+            if len(self._cache) > FILTER_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return mask
+
+    def year_range(self):
+        """(min, max) known publication year, or None"""
+        known = self.years[self.years > 0]
+        if not len(known):
+            return None
+        return int(known.min()), int(known.max())
+
+    def authors(self):
+        """All author names seen in chunk metadata"""
+        return sorted(self.author_bitmaps)
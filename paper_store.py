@@ -0,0 +1,145 @@
+"""
+Content-addressed storage for downloaded papers
+PDFs are stored as <paper_id>.pdf (the version-less arXiv id), and a manifest
+maps each id to its content hash and a human-readable name, so the same paper
+is never downloaded, extracted or chunked twice
+"""
+
+import hashlib
+import json
+import os
+import re
+from config import *
+
+MANIFEST_FILE = METADATA_DIR / "paper_manifest.json"
+
+
+def paper_id(arxiv_id):
+    """Stable id from an arXiv entry id or URL ('http://arxiv.org/abs/2401.01234v2' -> '2401.01234')"""
+    arxiv_id = str(arxiv_id).split("/abs/")[-1]
+    arxiv_id = re.sub(r"v\d+$", "", arxiv_id)
+    return arxiv_id.replace("/", "_")
+
+
+def display_name(title, max_length=60):
+    """Readable name for a paper (the old title-based filename)"""
+    clean_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_'))
+    return clean_title[:max_length].strip().replace(" ", "_")
+
+
+def parse_year(published):
+    """Year from a 'YYYY-MM-DD ...' published string (0 if unknown)"""
+    try:
+        return int(str(published)[:4])
+    except (TypeError, ValueError):
+        return 0
+
+
+def pdf_path(pid):
+    """Where a paper's PDF is stored"""
+    return PAPERS_DIR / f"{pid}.pdf"
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest():
+    """{paper_id: {"sha256", "arxiv_id", "title", "display_name", "filename"}}"""
+    if not MANIFEST_FILE.exists():
+        return {}
+    with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    """Write the manifest atomically"""
+    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_FILE.with_name(MANIFEST_FILE.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def find_by_hash(manifest, sha256):
+    """Id of a stored paper with this content, or None"""
+    for pid, entry in manifest.items():
+        if entry.get("sha256") == sha256:
+            return pid
+    return None
+
+
+def register_pdf(manifest, pid, arxiv_id, title):
+    """Record a freshly written PDF; returns the id its content is stored under
+
+    If identical content is already stored under another id the new file is
+    deleted and that id is returned instead.
+    """
+    path = pdf_path(pid)
+    sha256 = file_sha256(path)
+
+    existing = find_by_hash(manifest, sha256)
+    if existing is not None and existing != pid and pdf_path(existing).exists():
+        path.unlink()
+        return existing
+
+    manifest[pid] = {
+        "sha256": sha256,
+        "arxiv_id": arxiv_id,
+        "title": title,
+        "display_name": display_name(title),
+        "filename": path.name,
+    }
+    return pid
+
+
+def forget(manifest, paper_ids):
+    """Drop evicted papers from the manifest"""
+    for pid in paper_ids:
+        manifest.pop(pid, None)
+    return manifest
+
+
+def migrate_legacy_files(metadata_list):
+    """Rename counter-named files ('paper_3_Some_Title.pdf') to their paper id
+
+    Updates metadata_list in place; returns the number of papers migrated.
+    """
+    manifest = load_manifest()
+    migrated = 0
+
+    for metadata in metadata_list:
+        pid = paper_id(metadata["arxiv_id"])
+        old_stem = os.path.splitext(metadata["filename"])[0]
+        if old_stem == pid:
+            continue
+
+        renames = [
+            (PAPERS_DIR / f"{old_stem}.pdf", pdf_path(pid)),
+            (TEXTS_DIR / f"{old_stem}.txt", TEXTS_DIR / f"{pid}.txt"),
+            (TEXTS_DIR / f"{old_stem}.pages.json", TEXTS_DIR / f"{pid}.pages.json"),
+        ]
+        for old_path, new_path in renames:
+            if old_path.exists():
+                if new_path.exists():
+                    old_path.unlink()  # Same paper stored twice under old names
+                else:
+                    os.replace(old_path, new_path)
+
+        metadata.update({
+            "paper_id": pid,
+            "filename": f"{pid}.pdf",
+            "display_name": display_name(metadata["title"]),
+        })
+        if pid not in manifest and pdf_path(pid).exists():
+            register_pdf(manifest, pid, metadata["arxiv_id"], metadata["title"])
+        migrated += 1
+
+    if migrated:
+        save_manifest(manifest)
+    return migrated
@@ -0,0 +1,173 @@
+"""
+Multi-process, length-bucketed embedding for create_vectorstore.py
+Chunks are sorted by token length so every batch pads to a similar length,
+sharded across encoder processes, and written back in original order
+"""
+
+import multiprocessing as mp
+import os
+import time
+import numpy as np
+from config import *
+
+BATCH_SIZE_CANDIDATES = [8, 16, 32, 64, 128]
+
+_worker_model = None  # One SentenceTransformer per worker process
+
+
+def _init_worker(model_name, num_threads):
+    """Load the encoder once per worker and pin its intra-op thread count"""
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(num_threads)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_task(task):
+    """Encode one shard; write rows straight into the memmap when one is given"""
+    positions, texts, batch_size, output_path = task
+    embeddings = _worker_model.encode(
+        texts,
+        batch_size=batch_size,
+        show_progress_bar=False,
+        convert_to_numpy=True
+    ).astype('float32')
+
+    if output_path:
+        output = np.load(output_path, mmap_mode='r+')
+        output[positions] = embeddings
+        output.flush()
+        del output
+        return positions, None
+
+    return positions, embeddings
+
+
+def token_lengths(model, texts):
+    """Token count per text (character count if the model has no tokenizer)"""
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return np.array([len(text) for text in texts])
+
+    encoded = tokenizer(
+        texts,
+        add_special_tokens=True,
+        truncation=True,
+        max_length=model.max_seq_length
+    )
+    return np.array([len(ids) for ids in encoded['input_ids']])
+
+
+def autotune_batch_size(model, texts, lengths, candidates=BATCH_SIZE_CANDIDATES, sample_size=256):
+    """Pick the batch size with the best texts/sec on a sample of typical-length chunks"""
+    order = np.argsort(lengths)
+    middle = len(order) // 2
+    sample_ids = order[max(0, middle - sample_size // 2):middle + sample_size // 2]
+    sample = [texts[i] for i in sample_ids]
+
+    if len(sample) < min(candidates):
+        return min(candidates)
+
+    # Warm up kernels so the first candidate isn't penalised
+    model.encode(sample[:min(candidates)], show_progress_bar=False)
+
+    best_batch_size, best_rate = candidates[0], 0.0
+    for batch_size in candidates:
+        if batch_size > len(sample):
+            break
+        start = time.perf_counter()
+        model.encode(sample, batch_size=batch_size, show_progress_bar=False)
+        rate = len(sample) / (time.perf_counter() - start)
+        print(f"   batch_size={batch_size:<4} {rate:8.1f} texts/s")
+        if rate > best_rate:
+            best_batch_size, best_rate = batch_size, rate
+
+    return best_batch_size
+
+
+def make_tasks(texts, lengths, batch_size, batches_per_task, output_path):
+    """Sort by length (longest first) and cut into shards of whole batches"""
+    order = np.argsort(-lengths, kind='stable')
+    task_size = batch_size * batches_per_task
+
+    tasks = []
+    for start in range(0, len(order), task_size):
+        positions = order[start:start + task_size]
+        tasks.append((positions, [texts[i] for i in positions], batch_size, output_path))
+    return tasks
+
+
+def encode_parallel(texts, model_name=EMBEDDING_MODEL, num_workers=EMBED_WORKERS,
+                    batch_size=EMBED_BATCH_SIZE, output_path=None, model=None):
+    """Encode texts with a pool of worker processes; returns float32 array in input order
+
+    batch_size may be "auto" to benchmark a few sizes first. When output_path
+    is given the result is a memory-mapped .npy file that workers fill in place.
+    """
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+
+    dimension = model.get_sentence_embedding_dimension()
+    if not texts:
+        return np.empty((0, dimension), dtype='float32')
+
+    cpu_count = os.cpu_count() or 1
+    num_workers = num_workers or max(1, cpu_count // 2)
+    threads_per_worker = max(1, cpu_count // num_workers)
+
+    lengths = token_lengths(model, texts)
+    print(f"📏 Token lengths: min {lengths.min()}, median {int(np.median(lengths))}, max {lengths.max()}")
+
+    if batch_size == "auto":
+        print("⏱️  Auto-tuning batch size...")
+        import torch
+        previous_threads = torch.get_num_threads()
+        torch.set_num_threads(threads_per_worker)
+        batch_size = autotune_batch_size(model, texts, lengths)
+        torch.set_num_threads(previous_threads)
+    print(f"✅ Using batch size {batch_size}")
+
+    # Padding saved by bucketing: tokens in padded batches, file order vs sorted
+    def padded_tokens(ordered):
+        return sum(
+            ordered[i:i + batch_size].max() * len(ordered[i:i + batch_size])
+            for i in range(0, len(ordered), batch_size)
+        )
+    unsorted, bucketed = padded_tokens(lengths), padded_tokens(np.sort(lengths))
+    print(f"📦 Padding overhead: {unsorted / lengths.sum() - 1:.1%} in file order, "
+          f"{bucketed / lengths.sum() - 1:.1%} bucketed")
+
+    if output_path:
+        # Create the file only: workers reopen it, so nothing stays mapped in the parent
+        np.lib.format.open_memmap(
+            str(output_path), mode='w+', dtype='float32', shape=(len(texts), dimension)
+        )
+        output_path = str(output_path)
+    else:
+        embeddings = np.empty((len(texts), dimension), dtype='float32')
+
+    tasks = make_tasks(texts, lengths, batch_size, EMBED_BATCHES_PER_TASK, output_path)
+    print(f"🔄 Encoding {len(texts)} chunks: {num_workers} workers × "
+          f"{threads_per_worker} threads, {len(tasks)} shards")
+
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    start = time.perf_counter()
+    done = 0
+
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(num_workers, initializer=_init_worker,
+                  initargs=(model_name, threads_per_worker)) as pool:
+        for positions, shard_embeddings in pool.imap_unordered(_encode_task, tasks):
+            if shard_embeddings is not None:
+                embeddings[positions] = shard_embeddings
+            done += len(positions)
+            print(f"   {done}/{len(texts)} chunks", end="\r")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ Encoded {len(texts)} chunks in {elapsed:.1f}s ({len(texts) / elapsed:.1f} chunks/s)")
+
+    if output_path:
+        return np.load(output_path, mmap_mode='r')
+    return embeddings
@@ -0,0 +1,241 @@
+"""
+Pipelined ingest for the Lung Cancer RAG Chatbot
+Each paper flows download → extract → chunk → embed through bounded queues,
+so downloads, PDF parsing and embedding overlap instead of running back to back
+"""
+
+import queue
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import download_papers_arxiv
+import extract_text
+import chunk_documents
+import create_vectorstore
+import vector_search
+import dedup
+from config import *
+
+_DONE = object()  # Sentinel passed down the pipeline when a stage finishes
+
+
+class StageStats:
+    """Per-stage counters for progress and the final throughput report"""
+
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, elapsed, ok=True):
+        with self.lock:
+            self.busy_time += elapsed
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+
+class PipelinedIngest:
+    """Runs the four ingest stages concurrently, connected by bounded queues"""
+
+    def __init__(self, num_papers=NUM_PAPERS, query=PUBMED_QUERY, queue_size=PIPELINE_QUEUE_SIZE):
+        self.num_papers = num_papers
+        self.query = query
+        self.pdf_queue = queue.Queue(maxsize=queue_size)
+        self.text_queue = queue.Queue(maxsize=queue_size)
+        self.chunk_queue = queue.Queue(maxsize=queue_size)
+        self.stats = {name: StageStats(name) for name in ["download", "extract", "chunk", "embed"]}
+        self.metadata_list = []
+        self.all_chunks = []
+        self.index = None
+        self.embeddings = []
+        self.deduplicator = dedup.ChunkDeduplicator() if DEDUP_ENABLED else None
+        self.wall_time = 0.0
+        self.errors = []
+        self.print_lock = threading.Lock()
+
+    def log(self, stage, message):
+        """Thread-safe progress line"""
+        with self.print_lock:
+            print(f"[{stage:>8}] {message}")
+
+    def _drain(self, input_queue):
+        """Consume a queue until its sentinel so the upstream stage never blocks"""
+        while input_queue.get() is not _DONE:
+            pass
+
+    def _run_stage(self, name, target, input_queue=None):
+        """Wrap a stage so a crash is recorded and the pipeline still shuts down"""
+        def runner():
+            try:
+                target()
+            except Exception as e:
+                self.errors.append(f"{name}: {e}")
+                self.log(name, f"❌ Stage failed: {e}")
+                if input_queue is not None:
+                    self._drain(input_queue)
+        return threading.Thread(target=runner, name=f"ingest-{name}", daemon=True)
+
+    def download_stage(self):
+        """Producer: yields papers one at a time (reusing PDFs already on disk)"""
+        try:
+            papers = download_papers_arxiv.fetch_papers(self.query, self.num_papers)
+            start = time.perf_counter()
+
+            for metadata, is_new in papers:
+                self.stats["download"].record(time.perf_counter() - start)
+                self.metadata_list.append(metadata)
+                self.pdf_queue.put(PAPERS_DIR / metadata["filename"])
+                status = "downloaded" if is_new else "already on disk"
+                self.log("download", f"{len(self.metadata_list)}/{self.num_papers} "
+                                     f"{metadata['filename']} ({status})")
+                start = time.perf_counter()
+        finally:
+            if self.metadata_list:
+                download_papers_arxiv.save_metadata(
+                    download_papers_arxiv.merge_with_existing(self.metadata_list)
+                )
+            self.pdf_queue.put(_DONE)
+
+    def extract_stage(self):
+        """PDF → cleaned text file"""
+        try:
+            while (pdf_path := self.pdf_queue.get()) is not _DONE:
+                start = time.perf_counter()
+                text_path = extract_text.process_pdf(pdf_path)
+                self.stats["extract"].record(time.perf_counter() - start, text_path is not None)
+
+                if text_path:
+                    self.text_queue.put(text_path)
+                    self.log("extract", f"{text_path.name}")
+                else:
+                    self.log("extract", f"⚠️  No text extracted from {pdf_path.name}")
+        finally:
+            self.text_queue.put(_DONE)
+
+    def chunk_stage(self):
+        """Text file → chunk records"""
+        try:
+            while (text_path := self.text_queue.get()) is not _DONE:
+                start = time.perf_counter()
+                # The download stage records metadata before queueing the PDF
+                metadata_by_stem = {
+                    Path(m['filename']).stem: m for m in list(self.metadata_list)
+                }
+                chunks = chunk_documents.chunk_text_file(text_path, metadata_by_stem)
+                self.stats["chunk"].record(time.perf_counter() - start, bool(chunks))
+
+                if chunks:
+                    self.chunk_queue.put(chunks)
+                    self.log("chunk", f"{text_path.name}: {len(chunks)} chunks")
+        finally:
+            self.chunk_queue.put(_DONE)
+
+    def embed_stage(self, model):
+        """Chunk records → vectors, added to the index as each paper arrives"""
+        while (chunks := self.chunk_queue.get()) is not _DONE:
+            start = time.perf_counter()
+            if self.deduplicator is not None:
+                # Only chunks that aren't near-duplicates of earlier ones get a vector
+                chunks = self.deduplicator.add(chunks)
+                if not chunks:
+                    continue
+            embeddings = model.encode(
+                [chunk['text'] for chunk in chunks],
+                batch_size=32,
+                convert_to_numpy=True
+            )
+            embeddings = embeddings.astype('float32')
+            self.embeddings.append(embeddings)
+            if self.index is not None and self.index.is_trained:
+                self.index.add(embeddings)
+            self.all_chunks.extend(chunks)
+            self.stats["embed"].record(time.perf_counter() - start)
+            self.log("embed", f"+{len(chunks)} vectors ({len(self.all_chunks)} total)")
+
+    def run(self):
+        """Run all stages; returns True if an index was built"""
+        ensure_directories()
+        print(f"🤖 Loading embedding model: {EMBEDDING_MODEL}")
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(EMBEDDING_MODEL)
+        if NUM_SHARDS == 1:
+            # Sharded stores are indexed per shard once every chunk is known
+            self.index = vector_search.create_empty_index(model.get_sentence_embedding_dimension())
+
+        start = time.perf_counter()
+        threads = [
+            self._run_stage("download", self.download_stage),
+            self._run_stage("extract", self.extract_stage, self.pdf_queue),
+            self._run_stage("chunk", self.chunk_stage, self.text_queue),
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Embedding runs on the main thread; it's the stage that needs the most CPU
+        try:
+            self.embed_stage(model)
+        except Exception as e:
+            self.errors.append(f"embed: {e}")
+            print(f"❌ Embedding failed: {e}")
+            self._drain(self.chunk_queue)
+        finally:
+            for thread in threads:
+                thread.join()
+        self.wall_time = time.perf_counter() - start
+
+        if self.errors or not self.all_chunks:
+            print("❌ Ingest did not complete, vector store not saved")
+            return False
+
+        embeddings = np.concatenate(self.embeddings)
+        chunk_documents.save_chunks(self.all_chunks)
+        if NUM_SHARDS > 1:
+            create_vectorstore.build_sharded_vectorstore(self.all_chunks, embeddings=embeddings)
+            return True
+
+        if not self.index.is_trained:
+            # 8-bit SQ needs the whole corpus to train, so it is built once at the end
+            self.index = vector_search.build_index(embeddings)
+        create_vectorstore.save_vectorstore(self.index, self.all_chunks, embeddings)
+        return True
+
+    def print_report(self):
+        """Print per-stage and end-to-end throughput"""
+        print("\n📊 Pipelined ingest report:")
+        print(f"   {'Stage':<10}{'Done':>6}{'Failed':>8}{'Busy (s)':>10}{'Items/s':>10}")
+        for stage in self.stats.values():
+            rate = stage.processed / stage.busy_time if stage.busy_time else 0.0
+            print(f"   {stage.name:<10}{stage.processed:>6}{stage.failed:>8}"
+                  f"{stage.busy_time:>10.1f}{rate:>10.2f}")
+
+        busy_total = sum(stage.busy_time for stage in self.stats.values())
+        wall = max(self.wall_time, 1e-9)
+        print(f"\n   Wall time: {wall:.1f}s (sequential would be ≥ {busy_total:.1f}s)")
+        print(f"   Overlap factor: {busy_total / wall:.2f}x")
+        print(f"   Throughput: {len(self.metadata_list) / wall * 60:.1f} papers/min, "
+              f"{len(self.all_chunks) / wall:.1f} chunks/s")
+        if self.deduplicator is not None:
+            print(f"   Near-duplicate chunks collapsed: {self.deduplicator.collapsed}")
+        for error in self.errors:
+            print(f"   ⚠️  {error}")
+
+
+def main():
+    """Run pipelined ingest end to end"""
+    print("=" * 60)
+    print("🚰 PIPELINED INGEST")
+    print("=" * 60)
+
+    ingest = PipelinedIngest()
+    success = ingest.run()
+    ingest.print_report()
+    return success
+
+
+if __name__ == "__main__":
+    main()
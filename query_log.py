@@ -0,0 +1,123 @@
+"""
+Append-only query log and prewarm question selection
+Answered questions are handed to a background writer thread, so logging never
+adds latency to a query; at startup the most frequent recent questions are
+read back and replayed to fill the caches before users arrive
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from config import *
+
+_CLOSE = object()  # Sentinel that stops the writer thread
+
+
+def clean_filters(filters):
+    """Filters without empty values, as plain JSON types (None if nothing is set)"""
+    cleaned = {key: list(value) if isinstance(value, (list, tuple)) else value
+               for key, value in (filters or {}).items() if value not in (None, [], ())}
+    return cleaned or None
+
+
+class QueryLog:
+    """JSON-lines log written by a daemon thread from an in-memory queue"""
+
+    def __init__(self, path=QUERY_LOG_PATH, max_mb=QUERY_LOG_MAX_MB, max_pending=1000):
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def record(self, query, filters=None, latency_s=None, cache_hit=False):
+        """Queue one answered question (dropped rather than blocking if the writer is behind)"""
+        entry = {
+            "ts": round(time.time(), 3),
+            "query": query,
+            "filters": clean_filters(filters),
+            "latency_ms": round(latency_s * 1000, 1) if latency_s is not None else None,
+            "cache_hit": cache_hit,
+            "corpus": CORPUS,
+        }
+        self._start()
+        try:
+            self.pending.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="query-log", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _write_loop(self):
+        while True:
+            entries = [self.pending.get()]
+            # Write whatever else is already waiting in the same append
+            while not self.pending.empty() and len(entries) < 100:
+                entries.append(self.pending.get_nowait())
+
+            closing = entries[-1] is _CLOSE
+            entries = [entry for entry in entries if entry is not _CLOSE]
+            if entries:
+                try:
+                    self._append(entries)
+                except OSError as e:
+                    print(f"⚠️  Query log write failed: {e}")
+            if closing:
+                return
+
+    def _append(self, entries):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+            os.replace(self.path, rotated_path(self.path))
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+
+    def close(self):
+        """Write out everything queued and stop the writer"""
+        if self._writer is not None and self._writer.is_alive():
+            self.pending.put(_CLOSE)
+            self._writer.join(timeout=5)
+
+
+def rotated_path(path=QUERY_LOG_PATH):
+    return path.with_name(path.name + ".1")
+
+
+def read_entries(path=QUERY_LOG_PATH, since=0.0):
+    """Logged entries newer than since, oldest first (rotated file included)"""
+    entries = []
+    for log_file in [rotated_path(path), path]:
+        if not log_file.exists():
+            continue
+        with open(log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash
+                if entry.get("ts", 0) >= since and entry.get("corpus", CORPUS) == CORPUS:
+                    entries.append(entry)
+    return entries
+
+
+def frequent_queries(limit=PREWARM_TOP_QUERIES, window_days=PREWARM_WINDOW_DAYS, path=QUERY_LOG_PATH):
+    """Most asked (question, filters) pairs of the last window_days, most frequent first"""
+    entries = read_entries(path, since=time.time() - window_days * 86400)
+    counts = Counter()
+    latest = {}
+    for entry in entries:
+        key = (" ".join(entry["query"].lower().split()),
+               json.dumps(entry.get("filters"), sort_keys=True))
+        counts[key] += 1
+        latest[key] = (entry["query"], entry.get("filters"))
+    return [latest[key] for key, _ in counts.most_common(limit)]
@@ -1,13 +1,30 @@
-import pickle
-import faiss
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import numpy as np
 import os
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-import torch
+from session_manager import paper_usage_tracker
+import vector_search
+import sharded_index
+import snapshots
+import document_index
+import chunk_adjacency
+import frame_store
+import runtime_profile
+import query_log
+from metadata_filter import ChunkFilterIndex
+import dedup
+from semantic_cache import SemanticCache
 from config import *
 
+# Everything one query needs from the vector store, read together so a hot swap can't mix versions
+StoreView = namedtuple(
+    "StoreView",
+    ["index", "rescore_vectors", "sharded", "chunks", "filter_index", "documents", "adjacency"]
+)
+
 class RAGPipeline:
     """RAG Pipeline for Question Answering with Small Cached Model"""
     
@@ -15,32 +32,211 @@ class RAGPipeline:
         """Initialize the RAG pipeline"""
         self.embedding_model = None
         self.index = None
+        self.rescore_vectors = None
+        self.sharded = False
         self.chunks = None
+        self.filter_index = None
+        self.documents = None
+        self.adjacency = None
+        self.semantic_cache = None
         self.llm_pipeline = None
+        self.generation_executor = None
+        self.runtime_profile = None
+        self.diversify = DIVERSIFY_RESULTS
+        self.hierarchical = HIERARCHICAL_RETRIEVAL
+        self.hierarchical_top_papers = HIERARCHICAL_TOP_PAPERS
+        self.hierarchical_min_papers = HIERARCHICAL_MIN_PAPERS
+        self.small_to_big = SMALL_TO_BIG
+        self.parent_window = PARENT_WINDOW
+        self.track_usage = True  # Off for offline evaluation runs
+        self.usage_tracker = paper_usage_tracker()
+        self.query_log = query_log.QueryLog() if QUERY_LOG_ENABLED else None
+        self.prewarm_done = threading.Event()
+        self.store_version = None
+        self._store_lock = threading.Lock()
+        self._stop_watching = threading.Event()
+        self._failed_version = None
+        self.corpus = CORPUS
+        self.corpora = OrderedDict()  # Other corpora loaded on demand, least recently used first
+        self._corpora_lock = threading.Lock()
         
         self.load_vectorstore()
         self.load_models()
-    
-    def load_vectorstore(self):
-        """Load FAISS index and chunks"""
-        print("📚 Loading vector store...")
         
-        index_file = FAISS_INDEX_PATH.with_suffix('.index')
-        metadata_file = FAISS_INDEX_PATH.with_suffix('.pkl')
+        if SNAPSHOT_POLL_INTERVAL_S > 0:
+            self.start_snapshot_watcher()
+    
+    def read_vectorstore(self, paths):
+        """Load an index and its chunks from one snapshot without touching the live store"""
+        import faiss
+        manifest = sharded_index.load_manifest(paths["shards"])
         
-        if not index_file.exists() or not metadata_file.exists():
+        if (manifest is None and not paths["index"].exists()) or not paths["chunks"].exists():
             raise FileNotFoundError(
                 "Vector store not found! Please run create_vectorstore.py first."
             )
         
-        # Load FAISS index
-        self.index = faiss.read_index(str(index_file))
+        store = {"index": None, "rescore_vectors": None, "sharded": False}
+        if manifest is not None:
+            # Shards load lazily on first search and are searched in parallel
+            store["index"] = sharded_index.open_sharded_index(manifest)
+            store["sharded"] = True
+            print(f"✅ Opened {manifest['num_shards']} shards")
+        else:
+            # Load FAISS index
+            store["index"] = faiss.read_index(str(paths["index"]))
+            
+            # Exact float32 vectors for re-ranking compressed search results (stay on disk)
+            if VECTOR_RESCORE and paths["vectors"].exists():
+                store["rescore_vectors"] = np.load(paths["vectors"], mmap_mode='r')
+                print("✅ Memory-mapped float32 vectors for rescoring")
+        
+        # Chunk metadata in memory; chunk text is read from its source's frame when retrieved
+        store["chunks"] = frame_store.load_chunk_store(paths)
+        
+        # Source / author / year bitmaps for filtered search
+        store["filter_index"] = ChunkFilterIndex(store["chunks"].metadata)
+        
+        # Paper centroids for hierarchical (paper, then chunk) search
+        store["documents"] = None
+        if self.hierarchical:
+            vectors = store["rescore_vectors"]
+            if vectors is None and isinstance(store["index"], faiss.IndexFlat):
+                vectors = store["index"].reconstruct_n(0, store["index"].ntotal)
+            store["documents"] = document_index.DocumentIndex.load(
+                paths, store["chunks"].metadata, vectors
+            )
+            if store["documents"] is None:
+                print("⚠️  No paper centroids for this store, using flat search")
         
-        # Load chunks metadata
-        with open(metadata_file, 'rb') as f:
-            self.chunks = pickle.load(f)
+        # Each chunk's neighbours in its paper, for widening small-to-big hits
+        store["adjacency"] = None
+        if self.small_to_big:
+            store["adjacency"] = chunk_adjacency.ChunkAdjacency(store["chunks"].metadata)
         
-        print(f"✅ Loaded {len(self.chunks)} chunks")
+        return store
+    
+    def _swap_store(self, store, version):
+        """Make a loaded store live in one step"""
+        with self._store_lock:
+            self.index = store["index"]
+            self.rescore_vectors = store["rescore_vectors"]
+            self.sharded = store["sharded"]
+            self.chunks = store["chunks"]
+            self.filter_index = store["filter_index"]
+            self.documents = store["documents"]
+            self.adjacency = store["adjacency"]
+            self.store_version = version
+    
+    @staticmethod
+    def _view_of(store):
+        return StoreView(store["index"], store["rescore_vectors"], store["sharded"],
+                         store["chunks"], store["filter_index"], store["documents"],
+                         store["adjacency"])
+    
+    def _corpus_view(self, name):
+        """Store view of any corpus, loaded on first use and kept resident LRU-style
+        
+        Only MAX_RESIDENT_CORPORA corpora besides this pipeline's own stay in
+        memory; a corpus that was re-ingested is reloaded on its next query.
+        """
+        if name == self.corpus:
+            return self._store_view()
+        if name not in CORPORA:
+            raise ValueError(f"Unknown corpus '{name}' (choose from {', '.join(CORPORA)})")
+        
+        vectorstore_dir = corpus_paths(name)["vectorstore"]
+        version = snapshots.current_version(vectorstore_dir)
+        with self._corpora_lock:
+            entry = self.corpora.get(name)
+            if entry is not None and entry[0] == version:
+                self.corpora.move_to_end(name)
+                return entry[1]
+        
+        print(f"📂 Loading corpus '{name}'...")
+        view = self._view_of(self.read_vectorstore(snapshots.current_paths(vectorstore_dir)))
+        
+        with self._corpora_lock:
+            replaced = [self.corpora.pop(name)] if name in self.corpora else []
+            self.corpora[name] = (version, view)
+            while len(self.corpora) > MAX_RESIDENT_CORPORA:
+                evicted_name, evicted = self.corpora.popitem(last=False)
+                replaced.append(evicted)
+                print(f"📤 Unloaded corpus '{evicted_name}'")
+        
+        for _, old_view in replaced:
+            if old_view.sharded:
+                threading.Timer(SNAPSHOT_GRACE_S, old_view.index.close).start()
+        return view
+    
+    def _store_view(self):
+        """Consistent view of the live store for one query"""
+        with self._store_lock:
+            return StoreView(self.index, self.rescore_vectors, self.sharded,
+                             self.chunks, self.filter_index, self.documents, self.adjacency)
+    
+    def load_vectorstore(self):
+        """Load FAISS index and chunks from the published snapshot"""
+        print("📚 Loading vector store...")
+        
+        version = snapshots.current_version()
+        self._swap_store(self.read_vectorstore(snapshots.current_paths()), version)
+        
+        print(f"✅ Loaded {len(self.chunks)} chunks" + (f" (snapshot {version})" if version else ""))
+    
+    def _warm_up(self, store):
+        """Run one search on a freshly loaded store so its first real query isn't cold"""
+        probe = np.zeros((1, store["index"].d), dtype='float32')
+        if store["sharded"]:
+            store["index"].search(probe, 1)  # Loads every shard
+        else:
+            vector_search.search_index(store["index"], probe, 1, vectors=store["rescore_vectors"])
+    
+    def check_for_new_snapshot(self):
+        """Load a newly published snapshot in the background and swap it in; True if swapped
+        
+        Queries already running finish on the store they started with.
+        """
+        version = snapshots.current_version()
+        if version is None or version in (self.store_version, self._failed_version):
+            return False
+        
+        print(f"🔄 New vector store snapshot {version}, loading...")
+        try:
+            store = self.read_vectorstore(snapshots.store_paths(SNAPSHOTS_DIR / version))
+            self._warm_up(store)
+        except Exception as e:
+            print(f"⚠️  Could not load snapshot {version}: {e}")
+            self._failed_version = version
+            return False
+        
+        old_view = self._store_view()
+        self._swap_store(store, version)
+        
+        # Cached answers were built from the old chunks
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
+        if old_view.sharded:
+            # Let in-flight searches on the old shards finish before closing them
+            threading.Timer(SNAPSHOT_GRACE_S, old_view.index.close).start()
+        
+        print(f"✅ Swapped to snapshot {version} ({len(store['chunks'])} chunks)")
+        return True
+    
+    def start_snapshot_watcher(self, interval=SNAPSHOT_POLL_INTERVAL_S):
+        """Poll for new snapshots on a daemon thread"""
+        def watch():
+            while not self._stop_watching.wait(interval):
+                try:
+                    self.check_for_new_snapshot()
+                except Exception as e:
+                    print(f"⚠️  Snapshot watcher error: {e}")
+        
+        threading.Thread(target=watch, name="snapshot-watcher", daemon=True).start()
+    
+    def stop_snapshot_watcher(self):
+        """Stop polling for new snapshots"""
+        self._stop_watching.set()
     
     def check_model_cached(self, model_name):
         """Check if model is already cached locally"""
@@ -61,8 +257,24 @@ class RAGPipeline:
     
     def load_models(self):
         """Load embedding and small LLM models with caching check"""
+        # Deferred so importing this module (e.g. from app.py) stays fast
+        from sentence_transformers import SentenceTransformer
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
+        import torch
         print("🤖 Loading models...")
         
+        # Using FLAN-T5 Small (77MB) - Perfect for your needs!
+        small_model_name = "google/flan-t5-small"  # Only 77MB!
+        
+        # Thread settings tuned for this host on an earlier start
+        fingerprint = runtime_profile.host_fingerprint(EMBEDDING_MODEL, small_model_name)
+        self.runtime_profile = runtime_profile.load_profile(fingerprint)
+        if self.runtime_profile:
+            runtime_profile.apply_profile(self.runtime_profile)
+            print(f"⚙️  Runtime profile: {self.runtime_profile['intra_op_threads']} threads, "
+                  f"embed batch {self.runtime_profile['embed_batch_size']}, "
+                  f"generation batch {self.runtime_profile['generation_batch_size']}")
+        
         # Load embedding model (same as used for creating vectors)
         print(f"Loading embedding model: {EMBEDDING_MODEL}")
         if self.check_model_cached(EMBEDDING_MODEL):
@@ -70,10 +282,12 @@ class RAGPipeline:
         self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
         print(f"✅ Loaded embedding model")
         
-        # Load SMALL LLM for text generation
-        # Using FLAN-T5 Small (77MB) - Perfect for your needs!
-        small_model_name = "google/flan-t5-small"  # Only 77MB!
+        if SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(
+                self.embedding_model.get_sentence_embedding_dimension()
+            )
         
+        # Load SMALL LLM for text generation
         try:
             print(f"\n🧠 Loading LLM: {small_model_name}")
             print(f"   Model size: ~77MB (very small!)")
@@ -103,36 +317,187 @@ class RAGPipeline:
             print(f"⚠️  Could not load {small_model_name}: {e}")
             print("   Falling back to extractive answers only...")
             self.llm_pipeline = None
-    
-    def retrieve_relevant_chunks(self, query, top_k=TOP_K_RETRIEVAL):
-        """Retrieve most relevant chunks for a query"""
-        # Create embedding for query
-        query_embedding = self.embedding_model.encode([query], convert_to_numpy=True)
         
-        # Search in FAISS
-        distances, indices = self.index.search(query_embedding.astype('float32'), top_k)
-        
-        # Get relevant chunks
+        if self.runtime_profile is None:
+            if RUNTIME_AUTOTUNE:
+                self.runtime_profile = runtime_profile.autotune(
+                    self.embedding_model, self.llm_pipeline, fingerprint
+                )
+                runtime_profile.save_profile(self.runtime_profile)
+            else:
+                self.runtime_profile = runtime_profile.default_profile(fingerprint)
+            runtime_profile.apply_profile(self.runtime_profile)
+    
+    def _collect_chunks(self, indices, distances, chunks=None):
+        """Turn one row of FAISS search results into scored chunk dicts"""
+        chunks = self.chunks if chunks is None else chunks
         relevant_chunks = []
-        for idx, distance in zip(indices[0], distances[0]):
-            chunk = self.chunks[idx].copy()
+        for idx, distance in zip(indices, distances):
+            if idx < 0:
+                # FAISS pads with -1 when fewer than top_k vectors exist
+                continue
+            chunk = chunks[idx].copy()
             chunk['similarity_score'] = float(1 / (1 + distance))
             relevant_chunks.append(chunk)
         
         return relevant_chunks
     
-    def generate_answer(self, query, context):
-        """Generate answer using small LLM or extractive method"""
+    def _collect_hits(self, indices, distances, store):
+        """Scored chunks for one row of search results, widened to their neighbours in small-to-big mode"""
+        if not self.small_to_big or store.adjacency is None:
+            return self._collect_chunks(indices, distances, store.chunks)
+        
+        hits = [(idx, float(1 / (1 + distance)))
+                for idx, distance in zip(indices, distances) if idx >= 0]
+        return store.adjacency.expand(hits, store.chunks, self.parent_window)
+    
+    def _search(self, query_embeddings, top_k, filters=None, store=None):
+        """Search the index, re-ranking with exact vectors when available
+
+        filters ({"sources", "authors", "year_min", "year_max"}) are applied
+        inside the FAISS search, so a filtered query still returns top_k chunks.
+        """
+        store = store or self._store_view()
+        mask = store.filter_index.mask(filters)
+        if mask is not None and not mask.any():
+            empty = np.full((len(query_embeddings), top_k), -1, dtype='int64')
+            return np.full(empty.shape, np.inf, dtype='float32'), empty
+        
+        if (self.hierarchical and store.documents is not None
+                and len(store.documents) >= self.hierarchical_min_papers):
+            return self._hierarchical_search(query_embeddings, top_k, mask, store)
+        
+        if store.sharded:
+            return store.index.search(query_embeddings, top_k, mask=mask)
+        return vector_search.search_index(
+            store.index, query_embeddings, top_k, vectors=store.rescore_vectors, mask=mask
+        )
+    
+    def _hierarchical_search(self, query_embeddings, top_k, mask, store):
+        """Two-stage search: top papers by centroid, then only those papers' chunks"""
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        papers = store.documents.top_papers(query_embeddings, self.hierarchical_top_papers, mask)
+        
+        distances = np.full((len(query_embeddings), top_k), np.inf, dtype='float32')
+        indices = np.full((len(query_embeddings), top_k), -1, dtype='int64')
+        
+        for row, (query, row_papers) in enumerate(zip(query_embeddings, papers)):
+            candidates = store.documents.candidate_chunks(row_papers, mask)
+            if store.sharded:
+                # Shard files aren't addressable by chunk position: narrow the search with a mask
+                candidate_mask = np.zeros(len(store.chunks), dtype=bool)
+                candidate_mask[candidates] = True
+                if candidate_mask.any():
+                    row_distances, row_indices = store.index.search(
+                        query[None], top_k, mask=candidate_mask
+                    )
+                    # Candidate shards may hold fewer than top_k vectors: the rest stays padding
+                    width = row_distances.shape[1]
+                    distances[row, :width], indices[row, :width] = row_distances[0], row_indices[0]
+            else:
+                distances[row], indices[row] = document_index.search_candidates(
+                    query, candidates, top_k, vectors=store.rescore_vectors, index=store.index
+                )
         
-        if self.llm_pipeline:
-            # Use FLAN-T5 for generation
-            prompt = f"""Answer the question based on the context and check answer is relevant to question if it is then show answer if it is not then search all over the internet and find best possible answer for it from your knowledge.
+        return distances, indices
+    
+    def _fetch_k(self, top_k):
+        """How many candidates to fetch so diversity filtering can still fill top_k"""
+        return top_k * 2 if self.diversify else top_k
+    
+    def _finalize(self, relevant_chunks, top_k):
+        """Apply the diversity option and cut to top_k"""
+        if self.diversify:
+            return dedup.diversify(relevant_chunks, top_k)
+        return relevant_chunks[:top_k]
+    
+    def encode_queries(self, queries):
+        """Embed one or more queries with the same model used for the chunks"""
+        return self.embedding_model.encode(
+            queries,
+            batch_size=min(len(queries), self.runtime_profile['embed_batch_size']),
+            convert_to_numpy=True
+        )
+    
+    def retrieve_by_embeddings(self, query_embeddings, top_k=TOP_K_RETRIEVAL, filters=None,
+                               track_usage=True):
+        """Retrieve relevant chunks for already-encoded queries with one search per corpus
+        
+        filters["corpora"] lists the corpora to search (default: this pipeline's
+        own); results from several corpora are merged into one top_k.
+        track_usage=False keeps synthetic queries (prewarming) out of retention.
+        """
+        filters = dict(filters or {})
+        corpora = filters.pop("corpora", None) or [self.corpus]
+        fetch_k = self._fetch_k(top_k)
+        
+        merged = [[] for _ in range(len(query_embeddings))]
+        for name in corpora:
+            store = self._corpus_view(name)
+            distances, indices = self._search(query_embeddings, fetch_k, filters, store)
+            for row, (row_indices, row_distances) in enumerate(zip(indices, distances)):
+                for chunk in self._collect_hits(row_indices, row_distances, store):
+                    chunk['corpus'] = name
+                    merged[row].append(chunk)
+        
+        all_chunks = [
+            self._finalize(sorted(row, key=lambda c: c['similarity_score'], reverse=True), top_k)
+            for row in merged
+        ]
+        if track_usage and self.track_usage:
+            # Usage (and retention) is tracked for this pipeline's own corpus
+            self.usage_tracker.record(
+                chunk['source'] for relevant_chunks in all_chunks for chunk in relevant_chunks
+                if chunk['corpus'] == self.corpus
+            )
+        
+        return all_chunks
+    
+    def retrieve_relevant_chunks(self, query, top_k=TOP_K_RETRIEVAL, filters=None):
+        """Retrieve most relevant chunks for a query"""
+        # Create embedding for query
+        query_embedding = self.encode_queries([query])
+        
+        # Search in FAISS and get relevant chunks
+        return self.retrieve_by_embeddings(query_embedding, top_k, filters)[0]
+    
+    def retrieve_relevant_chunks_batch(self, queries, top_k=TOP_K_RETRIEVAL, filters=None):
+        """Retrieve relevant chunks for several queries with one encode and one search"""
+        return self.retrieve_by_embeddings(self.encode_queries(queries), top_k, filters)
+    
+    @staticmethod
+    def format_citation(chunk):
+        """Readable paper name with page range when the chunk records one"""
+        name = chunk.get('display_name') or chunk['source']
+        if 'page_start' not in chunk:
+            return name
+        if chunk['page_start'] == chunk['page_end']:
+            return f"{name}, p. {chunk['page_start']}"
+        return f"{name}, pp. {chunk['page_start']}-{chunk['page_end']}"
+    
+    def build_context(self, relevant_chunks):
+        """Combine retrieved chunks into a single context string"""
+        return "\n\n".join([
+            f"[Source: {self.format_citation(chunk)}]\n{chunk['text']}"
+            for chunk in relevant_chunks
+        ])
+    
+    def build_prompt(self, query, context):
+        """Build the FLAN-T5 prompt for a question and its context"""
+        return f"""Answer the question based on the context and check answer is relevant to question if it is then show answer if it is not then search all over the internet and find best possible answer for it from your knowledge.
 
 Context: {context[:800]}
 
 Question: {query}
 
 Answer:"""
+    
+    def generate_answer(self, query, context):
+        """Generate answer using small LLM or extractive method"""
+        
+        if self.llm_pipeline:
+            # Use FLAN-T5 for generation
+            prompt = self.build_prompt(query, context)
             
             try:
                 result = self.llm_pipeline(
@@ -158,6 +523,47 @@ Answer:"""
             # Use extractive method
             return self.generate_extractive_answer(query, context)
     
+    def generate_answers_batch(self, queries, contexts):
+        """Generate answers for several questions with a single batched LLM call"""
+        if not self.llm_pipeline:
+            return [
+                self.generate_extractive_answer(query, context)
+                for query, context in zip(queries, contexts)
+            ]
+        
+        prompts = [
+            self.build_prompt(query, context)
+            for query, context in zip(queries, contexts)
+        ]
+        
+        try:
+            # Only the first sequence is ever used, so don't sample extras per prompt
+            results = self.llm_pipeline(
+                prompts,
+                batch_size=min(len(prompts), self.runtime_profile['generation_batch_size']),
+                max_length=200,
+                num_return_sequences=1,
+                temperature=0.7,
+                do_sample=True
+            )
+        except Exception as e:
+            print(f"⚠️ Batched generation error: {e}")
+            results = [None] * len(prompts)
+        
+        answers = []
+        for query, context, result in zip(queries, contexts, results):
+            # The pipeline returns a list per prompt when given a list of prompts
+            if isinstance(result, list):
+                result = result[0] if result else None
+            answer = result['generated_text'].strip() if result else ""
+            
+            if answer and len(answer) > 10:
+                answers.append(answer)
+            else:
+                answers.append(self.generate_extractive_answer(query, context))
+        
+        return answers
+    
     def generate_extractive_answer(self, query, context):
         """Generate answer by extracting most relevant sentences"""
         sentences = context.split('. ')
@@ -183,19 +589,31 @@ Answer:"""
         
         return answer
     
-    def answer_question(self, query):
+    def answer_question(self, query, filters=None, log=True, track_usage=True):
         """Complete RAG pipeline: retrieve + generate"""
         print(f"\n🔍 Query: {query}")
+        started = time.perf_counter()
+        
+        query_embedding = self.encode_queries([query])
+        cache_filters = self._cache_filters(filters)
+        
+        # Paraphrases of a recent question reuse its answer
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.lookup(query_embedding[0], cache_filters)
+            if cached is not None:
+                print(f"⚡ Semantic cache hit ({cached['cache_similarity']:.3f}): {cached['cached_query']}")
+                if log:
+                    self._log_query(query, filters, started, cache_hit=True)
+                return cached
         
         # Retrieve relevant chunks
         print("📚 Retrieving relevant information...")
-        relevant_chunks = self.retrieve_relevant_chunks(query)
+        relevant_chunks = self.retrieve_by_embeddings(
+            query_embedding, filters=filters, track_usage=track_usage
+        )[0]
         
         # Combine context
-        context = "\n\n".join([
-            f"[Source: {chunk['source']}]\n{chunk['text']}"
-            for chunk in relevant_chunks
-        ])
+        context = self.build_context(relevant_chunks)
         
         print(f"✅ Found {len(relevant_chunks)} relevant chunks")
         
@@ -203,16 +621,210 @@ Answer:"""
         print("🤖 Generating answer...")
         answer = self.generate_answer(query, context)
         
-        return {
+        result = {
             'answer': answer,
             'sources': relevant_chunks,
             'context': context
         }
+        
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(query, query_embedding[0], result, cache_filters)
+        if log:
+            self._log_query(query, filters, started)
+        
+        return result
+    
+    def answer_question_fast(self, query, filters=None, log=True):
+        """Phase one of a two-phase answer: retrieval plus an instant extractive answer
+        
+        When an LLM is loaded, generation starts on a background worker and
+        result['pending'] holds its Future; call upgrade_answer() to swap it in.
+        """
+        print(f"\n🔍 Query: {query}")
+        started = time.perf_counter()
+        
+        query_embedding = self.encode_queries([query])
+        cache_filters = self._cache_filters(filters)
+        
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.lookup(query_embedding[0], cache_filters)
+            if cached is not None:
+                print(f"⚡ Semantic cache hit ({cached['cache_similarity']:.3f}): {cached['cached_query']}")
+                if log:
+                    self._log_query(query, filters, started, cache_hit=True)
+                return cached
+        
+        print("📚 Retrieving relevant information...")
+        relevant_chunks = self.retrieve_by_embeddings(query_embedding, filters=filters)[0]
+        context = self.build_context(relevant_chunks)
+        print(f"✅ Found {len(relevant_chunks)} relevant chunks")
+        
+        result = {
+            'answer': self.generate_extractive_answer(query, context),
+            'answer_type': 'extractive',
+            'sources': relevant_chunks,
+            'context': context,
+            'pending': None,
+            'started': started
+        }
+        if log:
+            self._log_query(query, filters, started)
+        
+        if self.llm_pipeline is None:
+            self._cache_final_answer(query, query_embedding[0], result, result['answer'], cache_filters)
+            return result
+        
+        print("🤖 Generating answer in the background...")
+        if self.generation_executor is None:
+            # One worker: generations run in order and never compete for CPU
+            self.generation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm")
+        future = self.generation_executor.submit(self.generate_answer, query, context)
+        # Late answers still reach the cache even after the caller has given up on them
+        future.add_done_callback(
+            lambda f: self._cache_final_answer(
+                query, query_embedding[0], result,
+                f.result() if not f.exception() else result['answer'], cache_filters
+            )
+        )
+        result['pending'] = future
+        return result
+    
+    def _log_query(self, query, filters, started, cache_hit=False):
+        """Hand an answered question to the query log (written in the background)"""
+        if self.query_log is not None:
+            self.query_log.record(query, filters, time.perf_counter() - started, cache_hit)
+    
+    def _cache_filters(self, filters):
+        """Filters plus the snapshot of every corpus they search, as the semantic cache key
+        
+        The cache is cleared when this pipeline's own snapshot swaps, but other
+        corpora can be re-ingested at any time; answers built from their old
+        snapshots then stop matching.
+        """
+        corpora = (filters or {}).get("corpora") or [self.corpus]
+        versions = [
+            (name, self.store_version if name == self.corpus
+             else snapshots.current_version(corpus_paths(name)["vectorstore"]))
+            for name in corpora
+        ]
+        return dict(filters or {}, snapshots=versions)
+    
+    def _cache_final_answer(self, query, query_embedding, result, answer, filters):
+        """Store the best available answer for a query in the semantic cache"""
+        if self.semantic_cache is None:
+            return
+        final = {'answer': answer, 'sources': result['sources'], 'context': result['context']}
+        self.semantic_cache.store(query, query_embedding, final, filters)
+    
+    def upgrade_answer(self, result, deadline=LLM_ANSWER_DEADLINE_S):
+        """Phase two: replace the extractive answer with the LLM's if it arrives in time
+        
+        The deadline counts from when the question was asked, so the total wait
+        is bounded no matter how slow generation is.
+        """
+        future = result.get('pending')
+        if future is None:
+            return result
+        
+        remaining = deadline - (time.perf_counter() - result['started'])
+        try:
+            answer = future.result(timeout=max(remaining, 0))
+        except FutureTimeout:
+            print(f"⏱️ Generation missed the {deadline:.0f}s deadline, keeping the extractive answer")
+            result['timed_out'] = True
+            return result
+        except Exception as e:
+            print(f"⚠️ Generation error: {e}")
+            result['pending'] = None
+            return result
+        
+        result['pending'] = None
+        if answer != result['answer']:
+            result['answer'] = answer
+            result['answer_type'] = 'generated'
+        return result
+    
+    def answer_questions(self, queries):
+        """Batched RAG pipeline: one retrieval pass and one generation pass for all queries"""
+        print(f"\n🔍 Batch of {len(queries)} queries")
+        started = time.perf_counter()
+        
+        query_embeddings = self.encode_queries(queries)
+        results = [None] * len(queries)
+        cache_filters = self._cache_filters(None)
+        
+        if self.semantic_cache is not None:
+            for i, embedding in enumerate(query_embeddings):
+                results[i] = self.semantic_cache.lookup(embedding, cache_filters)
+        
+        misses = [i for i, result in enumerate(results) if result is None]
+        for i, query in enumerate(queries):
+            self._log_query(query, None, started, cache_hit=results[i] is not None)
+        if misses:
+            miss_queries = [queries[i] for i in misses]
+            all_chunks = self.retrieve_by_embeddings(query_embeddings[misses])
+            contexts = [self.build_context(chunks) for chunks in all_chunks]
+            answers = self.generate_answers_batch(miss_queries, contexts)
+            
+            for i, answer, relevant_chunks, context in zip(misses, answers, all_chunks, contexts):
+                results[i] = {
+                    'answer': answer,
+                    'sources': relevant_chunks,
+                    'context': context
+                }
+                if self.semantic_cache is not None:
+                    self.semantic_cache.store(queries[i], query_embeddings[i], results[i], cache_filters)
+        
+        return results
+    
+    def prewarm(self, questions=None, background=True):
+        """Replay frequent recent questions and the app's examples to warm caches and models
+        
+        Runs on a daemon thread by default; prewarm_done is set when it finishes.
+        Replayed questions are not logged again and don't count as paper usage.
+        """
+        if questions is None:
+            questions = query_log.frequent_queries() + [(q, None) for q in EXAMPLE_QUESTIONS]
+        
+        def run():
+            start = time.perf_counter()
+            seen = set()
+            warmed = 0
+            for question, filters in questions:
+                key = (question.lower().strip(), repr(filters))
+                if key in seen:
+                    continue
+                seen.add(key)
+                try:
+                    self.answer_question(question, filters=filters, log=False, track_usage=False)
+                    warmed += 1
+                except Exception as e:
+                    print(f"⚠️  Prewarm failed for '{question}': {e}")
+            print(f"🔥 Prewarmed {warmed} questions in {time.perf_counter() - start:.1f}s")
+            self.prewarm_done.set()
+        
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="prewarm", daemon=True)
+        thread.start()
+        return thread
+    
+    def get_cache_stats(self):
+        """Semantic cache hit rate and the effect of other thresholds"""
+        if self.semantic_cache is None:
+            return None
+        return self.semantic_cache.get_stats()
+    
+    def source_names(self):
+        """Readable paper name for each source file in the vector store"""
+        return {c['source']: c.get('display_name') or c['source'] for c in self.chunks.metadata}
     
     def summarize_document(self, source_file):
         """Summarize a specific document"""
         # Get all chunks from this document
-        doc_chunks = [c for c in self.chunks if c['source'] == source_file]
+        doc_chunks = [self.chunks[i] for i, c in enumerate(self.chunks.metadata)
+                      if c['source'] == source_file]
         
         if not doc_chunks:
             return f"Document '{source_file}' not found."
@@ -251,7 +863,11 @@ Answer:"""
             'llm_model': 'google/flan-t5-small (77MB)',
             'llm_loaded': self.llm_pipeline is not None,
             'cache_location': str(Path.home() / ".cache" / "huggingface"),
-            'models_cached': True
+            'models_cached': True,
+            'cpu_threads': self.runtime_profile['intra_op_threads'] if self.runtime_profile else None,
+            'store_version': self.store_version,
+            'corpus': self.corpus,
+            'resident_corpora': [self.corpus] + list(self.corpora)
         }
         return info
 
@@ -285,7 +901,30 @@ if __name__ == "__main__":
         print("📚 SOURCES:")
         print("=" * 60)
         for source in result['sources']:
-            print(f"- {source['source']} (Similarity: {source['similarity_score']:.2f})")
+            print(f"- {rag.format_citation(source)} (Similarity: {source['similarity_score']:.2f})")
+        
+        # Paraphrase should be served from the semantic cache
+        rag.answer_question("How is lung cancer usually treated?")
+        stats = rag.get_cache_stats()
+        if stats:
+            print("\n" + "=" * 60)
+            print("⚡ SEMANTIC CACHE:")
+            print("=" * 60)
+            print(f"Hit rate: {stats['hit_rate']:.0%} ({stats['hits']}/{stats['lookups']}) "
+                  f"at threshold {stats['threshold']}")
+            for threshold, rate in stats['hit_rate_by_threshold'].items():
+                print(f"   threshold {threshold:.2f} → hit rate {rate:.0%}")
+        
+        # Two-phase answer: extractive first, LLM answer within the deadline
+        two_phase_query = "What are the risk factors for lung cancer?"
+        phase_start = time.perf_counter()
+        fast = rag.answer_question_fast(two_phase_query)
+        print("\n" + "=" * 60)
+        print("⚡ TWO-PHASE ANSWER:")
+        print("=" * 60)
+        print(f"Phase 1 ({(time.perf_counter() - phase_start) * 1000:.0f} ms): {fast['answer']}")
+        final = rag.upgrade_answer(fast)
+        print(f"Phase 2 [{final['answer_type']}]: {final['answer']}")
         
     except Exception as e:
         print(f"\n❌ Error: {e}")
@@ -0,0 +1,288 @@
+"""
+Selective, cost-aware eviction for the local corpus
+Drops least-recently-retrieved papers until the data fits the disk budget,
+removing only their files and vectors so surviving papers are never re-ingested
+"""
+
+import json
+import os
+from pathlib import Path
+import numpy as np
+import sharded_index
+import snapshots
+import document_index
+import paper_store
+import frame_store
+import extract_text
+import chunk_documents
+from config import *
+
+MB = 1024 * 1024
+
+
+def get_directory_size(directory):
+    """Total size in bytes of all files under a directory"""
+    if not directory.exists():
+        return 0
+    return sum(f.stat().st_size for f in directory.rglob("*") if f.is_file())
+
+
+def get_data_size():
+    """Bytes used by papers, extracted texts, chunks and the vector store"""
+    return sum(
+        get_directory_size(directory)
+        for directory in [PAPERS_DIR, TEXTS_DIR, CHUNKS_DIR, VECTORSTORE_DIR]
+    )
+
+
+def load_vectorstore_files(paths=None):
+    """Load the FAISS index and its chunk list (None, None if missing)"""
+    import faiss
+    paths = paths or snapshots.current_paths()
+    index_file = paths["index"]
+    metadata_file = paths["chunks"]
+
+    if not index_file.exists() or not metadata_file.exists():
+        return None, None
+
+    index = faiss.read_index(str(index_file))
+    chunks = frame_store.load_chunk_store(paths)
+
+    return index, chunks
+
+
+def write_atomic(path, write_fn, mode='wb'):
+    """Write to a temp file next to path, then rename over it"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    encoding = None if 'b' in mode else 'utf-8'
+    with open(tmp_path, mode, encoding=encoding) as f:
+        write_fn(f)
+    os.replace(tmp_path, path)
+
+
+def estimate_paper_costs(chunks, dimension):
+    """Estimate bytes each paper occupies across every stage of the pipeline
+
+    chunks is the vector store's ChunkList (None if there is no store).
+    """
+    costs = {}
+
+    for pdf_path in PAPERS_DIR.glob("*.pdf"):
+        costs[pdf_path.stem] = costs.get(pdf_path.stem, 0) + pdf_path.stat().st_size
+
+    texts = extract_text.text_store()
+    for text_path in extract_text.list_text_paths():
+        size = texts.stored_size(text_path.stem) or text_path.stat().st_size
+        costs[text_path.stem] = costs.get(text_path.stem, 0) + size
+
+    if chunks is None:
+        return costs
+
+    # Chunk text is stored compressed twice (chunk container and snapshot) plus one vector each;
+    # legacy snapshots still carry the text uncompressed in the pickle
+    chunk_texts = chunk_documents.chunk_store()
+    for source in {chunk['source'] for chunk in chunks.metadata}:
+        size = chunk_texts.stored_size(source)
+        if chunks.texts is not None:
+            size += chunks.texts.stored_size(source)
+        costs[Path(source).stem] = costs.get(Path(source).stem, 0) + size
+    for chunk in chunks.metadata:
+        paper = Path(chunk['source']).stem
+        costs[paper] = costs.get(paper, 0) + len(chunk.get('text', '').encode('utf-8')) + 4 * dimension
+
+    return costs
+
+
+def select_papers_to_evict(costs, usage, disk_budget, current_size, min_papers=RETENTION_MIN_PAPERS):
+    """Pick papers to evict: least recently retrieved first, larger first among ties"""
+    def eviction_order(paper):
+        hits, last_retrieved = usage.get(paper, (0, 0.0))
+        return (last_retrieved, hits, -costs[paper])
+
+    candidates = sorted(costs, key=eviction_order)
+    evict = []
+    projected_size = current_size
+
+    for paper in candidates:
+        if projected_size <= disk_budget or len(costs) - len(evict) <= min_papers:
+            break
+        evict.append(paper)
+        projected_size -= costs[paper]
+
+    return evict, projected_size
+
+
+# Fields that describe a chunk's own paper and position, replaced when it is re-homed
+PAPER_FIELDS = ("title", "authors", "published", "year", "arxiv_id", "paper_id", "display_name",
+                "char_start", "char_end", "page_start", "page_end")
+
+
+def rehome_chunk(chunk, papers, metadata_by_stem):
+    """A chunk as it survives evicting papers, or None if it goes with them
+
+    Dedup kept one representative for near-duplicate chunks; if its paper is
+    evicted while a collapsed duplicate's paper survives, the chunk (and its
+    vector) moves to that paper instead of disappearing from it.
+    """
+    references = [ref for ref in chunk.get('duplicate_sources', [])
+                  if Path(ref['source']).stem not in papers]
+    if Path(chunk['source']).stem in papers:
+        if not references:
+            return None
+        home, references = references[0], references[1:]
+        chunk = {key: value for key, value in chunk.items() if key not in PAPER_FIELDS}
+        chunk.update(chunk_documents.paper_fields(metadata_by_stem.get(Path(home['source']).stem)))
+        chunk['source'], chunk['chunk_id'] = home['source'], home['chunk_id']
+    else:
+        chunk = dict(chunk)
+
+    if references:
+        chunk['duplicate_sources'] = references
+    else:
+        chunk.pop('duplicate_sources', None)
+    return chunk
+
+
+def surviving_chunks(chunks, papers, metadata_by_stem):
+    """Boolean removal mask over a ChunkList plus the re-homed chunks that remain"""
+    remove_mask = np.zeros(len(chunks), dtype=bool)
+    kept = []
+    for position in range(len(chunks)):
+        metadata = chunks.metadata[position]
+        touched = Path(metadata['source']).stem in papers or any(
+            Path(ref['source']).stem in papers for ref in metadata.get('duplicate_sources', [])
+        )
+        chunk = rehome_chunk(chunks[position], papers, metadata_by_stem) if touched else chunks[position]
+        if chunk is None:
+            remove_mask[position] = True
+        else:
+            kept.append(chunk)
+    return remove_mask, kept
+
+
+def evict_papers(papers):
+    """Remove papers' files, chunks and vectors while keeping everything else intact"""
+    import faiss
+    papers = set(papers)
+    if not papers:
+        return
+    metadata_by_stem = chunk_documents.load_paper_metadata()
+
+    # Vector store: drop only the evicted papers' vectors (flat index keeps order),
+    # published as a new snapshot so running apps swap to it cleanly
+    if snapshots.current_paths()["chunks"].exists():
+        with snapshots.publish(base_on_current=True) as paths:
+            index, chunks = load_vectorstore_files(paths)
+            if index is None and sharded_index.load_manifest(paths["shards"]) is not None:
+                chunks = frame_store.load_chunk_store(paths)
+                remove_mask, chunks = surviving_chunks(chunks, papers, metadata_by_stem)
+                sharded_index.remove_chunks(remove_mask, paths["shards"])
+                frame_store.save_chunk_store(paths, chunks)
+                print(f"   ✅ Removed {int(remove_mask.sum())} vectors from shards ({len(chunks)} remain)")
+            elif index is not None:
+                remove_mask, chunks = surviving_chunks(chunks, papers, metadata_by_stem)
+                remove_ids = np.flatnonzero(remove_mask).astype('int64')
+                frame_store.save_chunk_store(paths, chunks)
+                if len(remove_ids):
+                    index.remove_ids(remove_ids)
+                    write_atomic(
+                        paths["index"],
+                        lambda f: f.write(faiss.serialize_index(index).tobytes())
+                    )
+
+                    if paths["vectors"].exists():
+                        vectors = np.delete(np.load(paths["vectors"]), remove_ids, axis=0)
+                        write_atomic(paths["vectors"], lambda f: np.save(f, vectors))
+                print(f"   ✅ Removed {len(remove_ids)} vectors ({index.ntotal} remain)")
+
+            centroids = document_index.load_centroids(paths)
+            if centroids:
+                document_index.save_centroids(
+                    paths, {s: c for s, c in centroids.items() if Path(s).stem not in papers}
+                )
+
+        # Keep SNAPSHOT_KEEP snapshots: running apps may still serve the pre-eviction one,
+        # and a sharded store reads its shard files lazily on first search
+        snapshots.prune_snapshots()
+
+    # Saved chunks: move re-homed representatives to their surviving paper's frame,
+    # drop the papers' frames, then rewrite the container without them
+    chunk_documents.pack_legacy_chunks()
+    chunk_store = chunk_documents.chunk_store()
+    evicted_sources = [s for s in chunk_store.keys() if Path(s).stem in papers]
+    moved = {}
+    for source in evicted_sources:
+        for chunk in chunk_store.get(source, []):
+            chunk = rehome_chunk(chunk, papers, metadata_by_stem)
+            if chunk is not None:
+                moved.setdefault(chunk['source'], []).append(chunk)
+    if moved:
+        chunk_store.put_many(
+            (source, sorted(chunk_store.get(source, []) + chunks, key=lambda c: c['chunk_id']))
+            for source, chunks in moved.items()
+        )
+    if chunk_store.delete(evicted_sources):
+        chunk_store.compact()
+
+    # Paper metadata
+    metadata_file = METADATA_DIR / "papers_metadata.json"
+    if metadata_file.exists():
+        with open(metadata_file, 'r') as f:
+            metadata_list = json.load(f)
+        metadata_list = [m for m in metadata_list if Path(m['filename']).stem not in papers]
+        write_atomic(metadata_file, lambda f: json.dump(metadata_list, f, indent=2), mode='w')
+
+    # Content manifest (so a later download of the paper isn't treated as a duplicate)
+    if paper_store.MANIFEST_FILE.exists():
+        paper_store.save_manifest(paper_store.forget(paper_store.load_manifest(), papers))
+
+    # Extracted texts
+    if extract_text.delete_texts(sorted(papers)):
+        extract_text.text_store().compact()
+
+    # Raw files
+    for paper in papers:
+        pdf_path = PAPERS_DIR / f"{paper}.pdf"
+        if pdf_path.exists():
+            pdf_path.unlink()
+        print(f"   🗑️  Evicted: {paper}")
+
+
+def apply_retention_policy(usage_tracker, disk_budget_mb=RETENTION_DISK_BUDGET_MB):
+    """Evict papers until the corpus fits the disk budget; returns evicted paper names"""
+    print("\n" + "=" * 60)
+    print("🧹 APPLYING RETENTION POLICY")
+    print("=" * 60)
+
+    disk_budget = disk_budget_mb * MB
+    current_size = get_data_size()
+    print(f"💾 Data size: {current_size / MB:.1f} MB (budget {disk_budget_mb} MB)")
+
+    if current_size <= disk_budget:
+        print("✅ Within budget, nothing to evict")
+        return []
+
+    index, chunks = load_vectorstore_files()
+    manifest = sharded_index.load_manifest()
+    if index is not None:
+        dimension = index.d
+    elif manifest is not None:
+        dimension = manifest["dimension"]
+        chunks = frame_store.load_chunk_store(snapshots.current_paths())
+    else:
+        dimension = 0
+    costs = estimate_paper_costs(chunks, dimension)
+    usage = usage_tracker.load_usage()
+
+    evict, projected_size = select_papers_to_evict(costs, usage, disk_budget, current_size)
+    if not evict:
+        print(f"⚠️  Over budget but only {len(costs)} papers left (min {RETENTION_MIN_PAPERS})")
+        return []
+
+    print(f"🗑️  Evicting {len(evict)} of {len(costs)} papers "
+          f"(~{(current_size - projected_size) / MB:.1f} MB)")
+    evict_papers(evict)
+    usage_tracker.forget(evict)
+
+    print(f"✅ Data size now: {get_data_size() / MB:.1f} MB")
+    return evict
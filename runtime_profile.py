@@ -0,0 +1,187 @@
+"""
+Startup autotuner for CPU inference settings
+Benchmarks a few torch thread counts and batch sizes for the embedder and the
+generator on this host, saves the fastest profile to METADATA_DIR and applies
+it on later starts, so concurrent sessions don't oversubscribe the cores
+"""
+
+import json
+import os
+import platform
+import threading
+import time
+from config import *
+
+PROFILE_VERSION = 1
+EMBED_BATCH_CANDIDATES = [1, 4, 8, 16, 32]
+GENERATION_BATCH_CANDIDATES = [1, 2, 4, 8]
+
+# Representative inputs: short questions for the embedder, a chunk-sized prompt for the generator
+BENCHMARK_QUERIES = [
+    "What are the common treatments for lung cancer?",
+    "How does immunotherapy work for non-small cell lung cancer?",
+    "What are the risk factors for developing lung cancer?",
+    "Which biomarkers predict response to EGFR inhibitors?",
+]
+BENCHMARK_PROMPT = (
+    "Answer the question based on the research context below.\n\n"
+    "Context: " + " ".join(["Lung cancer is treated with surgery, chemotherapy, "
+                            "radiotherapy, targeted therapy and immunotherapy."] * 8) +
+    "\n\nQuestion: What are the common treatments for lung cancer?\n\nAnswer:"
+)
+
+
+def host_fingerprint(embedding_model_name, llm_model_name):
+    """What a profile was measured on; a mismatch means re-tuning"""
+    import torch
+    return {
+        "version": PROFILE_VERSION,
+        "cpu_count": os.cpu_count() or 1,
+        "machine": platform.machine(),
+        "torch": torch.__version__,
+        "cuda": torch.cuda.is_available(),
+        "concurrent_sessions": EXPECTED_CONCURRENT_SESSIONS,
+        "embedding_model": embedding_model_name,
+        "llm_model": llm_model_name,
+    }
+
+
+def thread_candidates(cpu_count=None, concurrent_sessions=EXPECTED_CONCURRENT_SESSIONS):
+    """Thread counts worth trying: powers of two up to each session's share of the cores"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    share = max(1, cpu_count // max(1, concurrent_sessions))
+    candidates = {share}
+    threads = 1
+    while threads < share:
+        candidates.add(threads)
+        threads *= 2
+    return sorted(candidates)
+
+
+def load_profile(fingerprint, path=RUNTIME_PROFILE_PATH):
+    """Saved profile for this host and these models, or None"""
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r') as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return profile if profile.get("fingerprint") == fingerprint else None
+
+
+def save_profile(profile, path=RUNTIME_PROFILE_PATH):
+    """Persist a tuned profile (temp file + rename, so readers never see a partial file)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Several sessions may autotune at once: each writes its own temp file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def apply_profile(profile):
+    """Apply thread settings process-wide (call before running any model)"""
+    import torch
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    torch.set_num_threads(profile["intra_op_threads"])
+    try:
+        torch.set_num_interop_threads(profile["inter_op_threads"])
+    except RuntimeError:
+        pass  # Only settable before the first parallel op; keep what is running
+
+
+def _time(fn, repeats=2):
+    """Best wall time of a few calls (after one warm-up call)"""
+    fn()
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_embedder(model, threads, batch_sizes=EMBED_BATCH_CANDIDATES):
+    """{batch_size: queries/sec} at a given thread count"""
+    import torch
+    torch.set_num_threads(threads)
+    rates = {}
+    for batch_size in batch_sizes:
+        queries = (BENCHMARK_QUERIES * batch_size)[:batch_size]
+        elapsed = _time(lambda: model.encode(queries, batch_size=batch_size,
+                                             show_progress_bar=False))
+        rates[batch_size] = batch_size / elapsed
+    return rates
+
+
+def benchmark_generator(llm_pipeline, threads, batch_sizes=GENERATION_BATCH_CANDIDATES,
+                        max_length=48):
+    """{batch_size: answers/sec} at a given thread count (greedy, short outputs)"""
+    import torch
+    torch.set_num_threads(threads)
+    rates = {}
+    for batch_size in batch_sizes:
+        prompts = [BENCHMARK_PROMPT] * batch_size
+        elapsed = _time(lambda: llm_pipeline(prompts, batch_size=batch_size,
+                                             max_length=max_length, do_sample=False),
+                        repeats=1)
+        rates[batch_size] = batch_size / elapsed
+    return rates
+
+
+def autotune(embedding_model, llm_pipeline, fingerprint):
+    """Benchmark thread/batch settings and return the best profile
+
+    Threads are chosen by single-request latency (embed one query + generate
+    one answer), since that is what an interactive session waits on; batch
+    sizes are then chosen by throughput at that thread count.
+    """
+    print("⏱️  Autotuning CPU inference settings (one-off for this host)...")
+    results = []
+
+    for threads in thread_candidates(fingerprint["cpu_count"]):
+        embed_rates = benchmark_embedder(embedding_model, threads)
+        generation_rates = (
+            benchmark_generator(llm_pipeline, threads) if llm_pipeline is not None else {}
+        )
+        latency = 1 / embed_rates[1] + (1 / generation_rates[1] if generation_rates else 0)
+        print(f"   threads={threads:<3} single-request latency {latency * 1000:7.1f} ms")
+        results.append((latency, threads, embed_rates, generation_rates))
+
+    latency, threads, embed_rates, generation_rates = min(results, key=lambda r: (r[0], r[1]))
+    profile = {
+        "fingerprint": fingerprint,
+        "intra_op_threads": threads,
+        "inter_op_threads": 1,
+        "embed_batch_size": max(embed_rates, key=embed_rates.get),
+        "generation_batch_size": (
+            max(generation_rates, key=generation_rates.get) if generation_rates else 1
+        ),
+        "single_request_latency_ms": round(latency * 1000, 1),
+        "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    print(f"✅ Profile: {threads} threads, embed batch {profile['embed_batch_size']}, "
+          f"generation batch {profile['generation_batch_size']}")
+    return profile
+
+
+def default_profile(fingerprint):
+    """Untuned settings: each session gets its share of the cores"""
+    return {
+        "fingerprint": fingerprint,
+        "intra_op_threads": thread_candidates(fingerprint["cpu_count"])[-1],
+        "inter_op_threads": 1,
+        "embed_batch_size": max(EMBED_BATCH_CANDIDATES),
+        "generation_batch_size": max(GENERATION_BATCH_CANDIDATES),
+    }
+
+
+if __name__ == "__main__":
+    # Force a fresh tuning run: python runtime_profile.py
+    from rag_pipeline import RAGPipeline
+
+    if RUNTIME_PROFILE_PATH.exists():
+        RUNTIME_PROFILE_PATH.unlink()
+    rag = RAGPipeline()
+    print(json.dumps(rag.runtime_profile, indent=2))
@@ -0,0 +1,111 @@
+"""
+Semantic answer cache keyed on query embedding similarity
+Paraphrased questions ("treatments for lung cancer" / "how is lung cancer
+treated") hit the same entry when their cosine similarity clears a threshold
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import *
+
+REPORT_THRESHOLDS = [0.80, 0.85, 0.90, 0.95, 0.98]
+
+
+class SemanticCache:
+    """Small in-memory ANN index over recent query embeddings with LRU eviction"""
+
+    def __init__(self, dimension, threshold=SEMANTIC_CACHE_THRESHOLD, capacity=SEMANTIC_CACHE_SIZE):
+        import faiss
+        self.threshold = threshold
+        self.capacity = capacity
+        # Inner product on normalised vectors = cosine similarity
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.entries = OrderedDict()  # id -> (query, filters_key, result), oldest first
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.best_similarities = []  # Best match per lookup, for threshold reports
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype='float32').reshape(1, -1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    @staticmethod
+    def filters_key(filters):
+        """Hashable form of a filters dict (answers are only shared under equal filters)"""
+        if not filters:
+            return ()
+        return tuple(sorted(
+            (name, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+            for name, value in filters.items() if value not in (None, [], "")
+        ))
+
+    def lookup(self, query_embedding, filters=None):
+        """Cached result for a similar enough query, or None"""
+        vector = self._normalize(query_embedding)
+        key = self.filters_key(filters)
+
+        with self._lock:
+            best_similarity, best_id = -1.0, None
+            if self.index.ntotal:
+                similarities, ids = self.index.search(vector, min(8, self.index.ntotal))
+                for similarity, entry_id in zip(similarities[0], ids[0]):
+                    if entry_id >= 0 and self.entries[entry_id][1] == key:
+                        best_similarity, best_id = float(similarity), int(entry_id)
+                        break
+
+            self.best_similarities.append(best_similarity)
+            if len(self.best_similarities) > 10000:
+                del self.best_similarities[:5000]
+
+            if best_id is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(best_id)
+            cached_query, _, result = self.entries[best_id]
+
+        return dict(result, cache_hit=True, cached_query=cached_query,
+                    cache_similarity=best_similarity)
+
+    def store(self, query, query_embedding, result, filters=None):
+        """Remember a result, evicting the least recently used entry when full"""
+        vector = self._normalize(query_embedding)
+
+        with self._lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.index.add_with_ids(vector, np.array([entry_id], dtype='int64'))
+            self.entries[entry_id] = (query, self.filters_key(filters), result)
+
+            if len(self.entries) > self.capacity:
+                oldest_id, _ = self.entries.popitem(last=False)
+                self.index.remove_ids(np.array([oldest_id], dtype='int64'))
+
+    def clear(self):
+        """Drop every entry (e.g. after the vector store changes)"""
+        with self._lock:
+            self.index.reset()
+            self.entries.clear()
+
+    def get_stats(self):
+        """Hit rate so far and the hit rate each alternative threshold would have given"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            similarities = np.array(self.best_similarities, dtype='float32')
+            return {
+                "entries": len(self.entries),
+                "threshold": self.threshold,
+                "lookups": lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "hit_rate_by_threshold": {
+                    t: float((similarities >= t).mean()) if len(similarities) else 0.0
+                    for t in REPORT_THRESHOLDS
+                }
+            }
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Headless HTTP server for the Lung Cancer RAG Chatbot
+Owns a single RAGPipeline and coalesces concurrent questions into micro-batches
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from rag_pipeline import RAGPipeline
+from config import *
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler queue is at capacity"""
+
+
+class MicroBatchScheduler:
+    """Collects concurrent questions and runs them through the pipeline in batches"""
+
+    def __init__(self, rag_pipeline, max_batch_size=SERVE_MAX_BATCH_SIZE,
+                 max_wait_ms=SERVE_MAX_WAIT_MS, max_queue_size=SERVE_MAX_QUEUE_SIZE):
+        self.rag_pipeline = rag_pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        # One worker thread so the models only ever see one batch at a time
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.worker_task = None
+        self.stats = {
+            "requests": 0,
+            "rejected": 0,
+            "errors": 0,
+            "batches": 0,
+            "batched_requests": 0,
+            "total_latency": 0.0
+        }
+
+    def start(self):
+        """Start the batching loop on the running event loop"""
+        self.worker_task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and release the worker thread"""
+        if self.worker_task:
+            self.worker_task.cancel()
+            try:
+                await self.worker_task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, question):
+        """Queue a question and wait for its answer"""
+        future = asyncio.get_running_loop().create_future()
+
+        try:
+            self.queue.put_nowait((question, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise QueueFullError(f"Queue full ({self.queue.maxsize} pending questions)")
+
+        self.stats["requests"] += 1
+        return await future
+
+    async def _collect_batch(self):
+        """Wait for one question, then gather more until the batch is full or time is up"""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Drop questions whose clients already went away
+        return [item for item in batch if not item[1].done()]
+
+    async def _run(self):
+        """Main batching loop"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+
+            questions = [question for question, _, _ in batch]
+
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.rag_pipeline.answer_questions, questions
+                )
+            except Exception as e:
+                print(f"⚠️  Batch failed: {e}")
+                self.stats["errors"] += len(batch)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            now = time.perf_counter()
+            self.stats["batches"] += 1
+            self.stats["batched_requests"] += len(batch)
+
+            for (_, future, enqueued_at), result in zip(batch, results):
+                self.stats["total_latency"] += now - enqueued_at
+                if not future.done():
+                    future.set_result(result)
+
+    def get_stats(self):
+        """Get scheduler statistics"""
+        batches = self.stats["batches"]
+        served = self.stats["batched_requests"]
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_queue_size": self.queue.maxsize,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": self.stats["requests"],
+            "rejected": self.stats["rejected"],
+            "errors": self.stats["errors"],
+            "batches": batches,
+            "avg_batch_size": served / batches if batches else 0.0,
+            "avg_latency_ms": 1000 * self.stats["total_latency"] / served if served else 0.0
+        }
+
+
+def format_result(result):
+    """Make a pipeline result JSON friendly (context is left out to keep responses small)"""
+    return {
+        "answer": result["answer"],
+        "sources": [
+            {
+                "source": chunk["source"],
+                "chunk_id": chunk["chunk_id"],
+                "similarity_score": chunk["similarity_score"],
+                "text": chunk["text"]
+            }
+            for chunk in result["sources"]
+        ]
+    }
+
+
+async def handle_ask(request):
+    """POST /ask {"question": "..."}"""
+    try:
+        payload = await request.json()
+    except Exception:
+        return web.json_response({"error": "Body must be JSON"}, status=400)
+
+    question = str(payload.get("question", "")).strip()
+    if not question:
+        return web.json_response({"error": "Missing 'question'"}, status=400)
+
+    scheduler = request.app["scheduler"]
+    try:
+        result = await scheduler.submit(question)
+    except QueueFullError as e:
+        return web.json_response(
+            {"error": str(e)}, status=503, headers={"Retry-After": "1"}
+        )
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+    return web.json_response(format_result(result))
+
+
+async def handle_health(request):
+    """GET /health"""
+    return web.json_response({
+        "status": "ok",
+        "chunks": len(request.app["rag_pipeline"].chunks),
+        "scheduler": request.app["scheduler"].get_stats()
+    })
+
+
+def create_app(rag_pipeline, max_batch_size=SERVE_MAX_BATCH_SIZE,
+               max_wait_ms=SERVE_MAX_WAIT_MS, max_queue_size=SERVE_MAX_QUEUE_SIZE):
+    """Create the aiohttp application around an already loaded pipeline"""
+    app = web.Application()
+    app["rag_pipeline"] = rag_pipeline
+
+    async def on_startup(app):
+        app["scheduler"] = MicroBatchScheduler(
+            rag_pipeline, max_batch_size, max_wait_ms, max_queue_size
+        )
+        app["scheduler"].start()
+
+    async def on_cleanup(app):
+        await app["scheduler"].stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/ask", handle_ask)
+    app.router.add_get("/health", handle_health)
+
+    return app
+
+
+def main():
+    """Load the pipeline once and serve it over HTTP"""
+    parser = argparse.ArgumentParser(description="Serve the RAG pipeline over HTTP")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=SERVE_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=SERVE_MAX_WAIT_MS)
+    parser.add_argument("--max-queue-size", type=int, default=SERVE_MAX_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🌐 LUNG CANCER RAG HTTP SERVER")
+    print("=" * 60)
+
+    rag_pipeline = RAGPipeline()
+    if PREWARM_ON_STARTUP:
+        # Before serving: the batch worker must be the only thread using the models
+        rag_pipeline.prewarm(background=False)
+    app = create_app(
+        rag_pipeline,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue_size=args.max_queue_size
+    )
+
+    print(f"\n🚀 Serving on http://{args.host}:{args.port}")
+    print(f"   Batch size ≤ {args.max_batch_size}, wait ≤ {args.max_wait_ms} ms, "
+          f"queue ≤ {args.max_queue_size}")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
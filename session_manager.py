@@ -1,18 +1,99 @@
+import atexit
 import json
 import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
+import snapshots
 from config import *
 
+_usage_tracker = None
+_usage_tracker_lock = threading.Lock()
+
+@contextmanager
+def connect_tracker_db(db_path):
+    """Open a short-lived autocommit connection to the tracker database"""
+    conn = sqlite3.connect(str(db_path), timeout=10, isolation_level=None)
+    try:
+        conn.execute("PRAGMA busy_timeout = 10000")
+        yield conn
+    finally:
+        conn.close()
+
+
 class SessionManager:
-    """Manages session tracking and automatic cleanup after 10 sessions"""
+    """Manages session tracking and automatic cleanup after 10 sessions
+
+    Tracker state lives in a single-row SQLite table (WAL mode), so several
+    Streamlit workers can update it concurrently without corrupting it. Reads
+    are served from a short-lived in-memory cache to keep page renders free
+    of file I/O.
+    """
     
-    def __init__(self):
-        self.tracker_file = METADATA_DIR / "session_tracker.json"
+    TRACKER_FIELDS = ["session_count", "first_download", "last_session",
+                      "total_papers", "auto_cleanup_enabled"]
+    
+    def __init__(self, cache_ttl=SESSION_CACHE_TTL):
+        self.tracker_db = METADATA_DIR / "session_tracker.db"
+        self.legacy_tracker_file = METADATA_DIR / "session_tracker.json"
+        ensure_directories()
         self.max_sessions = 10
+        self.cache_ttl = cache_ttl
+        self._cache = None
+        self._cache_time = 0.0
+        self._lock = threading.Lock()
+        self._create_schema()
+    
+    def _connect(self):
+        """Open a connection to the tracker database"""
+        return connect_tracker_db(self.tracker_db)
+    
+    def _create_schema(self):
+        """Create the tracker table (and migrate the old JSON tracker once)"""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tracker (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    session_count INTEGER NOT NULL,
+                    first_download TEXT,
+                    last_session TEXT,
+                    total_papers INTEGER,
+                    auto_cleanup_enabled INTEGER NOT NULL
+                )
+            """)
+            exists = conn.execute("SELECT 1 FROM tracker WHERE id = 1").fetchone()
+        
+        if not exists and self.legacy_tracker_file.exists():
+            try:
+                with open(self.legacy_tracker_file, 'r') as f:
+                    self.save_tracker(json.load(f))
+                print("✅ Migrated session_tracker.json to SQLite")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️  Could not migrate session_tracker.json: {e}")
+    
+    def _row_to_dict(self, row):
+        """Convert a tracker row into the tracker dict format"""
+        tracker_data = dict(zip(self.TRACKER_FIELDS, row))
+        tracker_data["auto_cleanup_enabled"] = bool(tracker_data["auto_cleanup_enabled"])
+        return tracker_data
+    
+    def _update_cache(self, tracker_data):
+        """Remember the latest tracker state for cached reads"""
+        with self._lock:
+            self._cache = dict(tracker_data)
+            self._cache_time = time.monotonic()
+    
+    def invalidate_cache(self):
+        """Force the next read to go to the database"""
+        with self._lock:
+            self._cache = None
         
     def initialize_tracker(self):
-        """Create new session tracker file"""
+        """Create new session tracker row"""
         tracker_data = {
             "session_count": 0,
             "first_download": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -21,40 +102,92 @@ class SessionManager:
             "auto_cleanup_enabled": True
         }
         
-        with open(self.tracker_file, 'w') as f:
-            json.dump(tracker_data, f, indent=2)
+        self.save_tracker(tracker_data)
         
         return tracker_data
     
-    def load_tracker(self):
-        """Load session tracker data"""
-        if not self.tracker_file.exists():
+    def load_tracker(self, use_cache=True):
+        """Load session tracker data (from cache when fresh)"""
+        if use_cache:
+            with self._lock:
+                if self._cache is not None and time.monotonic() - self._cache_time < self.cache_ttl:
+                    return dict(self._cache)
+        
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(self.TRACKER_FIELDS)} FROM tracker WHERE id = 1"
+            ).fetchone()
+        
+        if row is None:
             return self.initialize_tracker()
         
-        with open(self.tracker_file, 'r') as f:
-            return json.load(f)
+        tracker_data = self._row_to_dict(row)
+        self._update_cache(tracker_data)
+        return tracker_data
     
     def save_tracker(self, tracker_data):
-        """Save session tracker data"""
-        with open(self.tracker_file, 'w') as f:
-            json.dump(tracker_data, f, indent=2)
+        """Save session tracker data in a single atomic write"""
+        values = [tracker_data.get(field) for field in self.TRACKER_FIELDS]
+        values[self.TRACKER_FIELDS.index("auto_cleanup_enabled")] = int(
+            bool(tracker_data.get("auto_cleanup_enabled", True))
+        )
+        
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO tracker (id, {', '.join(self.TRACKER_FIELDS)}) "
+                f"VALUES (1, ?, ?, ?, ?, ?)",
+                values
+            )
+        
+        self._update_cache(tracker_data)
+    
+    def _increment_counter(self):
+        """Atomically bump the session counter and return the new tracker state"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front so concurrent workers serialise here
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT 1 FROM tracker WHERE id = 1").fetchone() is None:
+                    conn.execute(
+                        "INSERT INTO tracker (id, session_count, first_download, last_session, "
+                        "total_papers, auto_cleanup_enabled) VALUES (1, 0, ?, NULL, ?, 1)",
+                        (now, NUM_PAPERS)
+                    )
+                conn.execute(
+                    "UPDATE tracker SET session_count = session_count + 1, last_session = ? "
+                    "WHERE id = 1",
+                    (now,)
+                )
+                row = conn.execute(
+                    f"SELECT {', '.join(self.TRACKER_FIELDS)} FROM tracker WHERE id = 1"
+                ).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        
+        tracker_data = self._row_to_dict(row)
+        self._update_cache(tracker_data)
+        return tracker_data
     
     def increment_session(self):
         """Increment session count and check if cleanup needed"""
-        tracker_data = self.load_tracker()
-        tracker_data["session_count"] += 1
-        tracker_data["last_session"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        tracker_data = self._increment_counter()
         
         print(f"\n📊 Session {tracker_data['session_count']}/{self.max_sessions}")
         
         # Check if cleanup needed
         if tracker_data["session_count"] >= self.max_sessions:
             print(f"\n⚠️  Maximum sessions ({self.max_sessions}) reached!")
-            print("🗑️  Triggering automatic cleanup...")
-            self.cleanup_all_data()
-            return True  # Cleanup performed
+            if RETENTION_POLICY == "wipe":
+                print("🗑️  Triggering automatic cleanup...")
+                self.cleanup_all_data()
+                return True  # Cleanup performed
+            self.apply_retention_policy()
+            return False  # Data kept, no re-ingest needed
         else:
-            self.save_tracker(tracker_data)
             remaining = self.max_sessions - tracker_data["session_count"]
             print(f"✅ {remaining} sessions remaining before auto-cleanup")
             return False  # No cleanup
@@ -89,6 +222,19 @@ class SessionManager:
         print("=" * 60)
         print("\n💡 Next session will re-download papers and rebuild index.")
     
+    def apply_retention_policy(self):
+        """Evict least-recently-retrieved papers over the disk budget and reset the counter"""
+        import retention
+        
+        # The pipeline's tracker: its buffered hits are flushed before papers are ranked
+        evicted = retention.apply_retention_policy(paper_usage_tracker())
+        
+        tracker_data = self.load_tracker(use_cache=False)
+        tracker_data["session_count"] = 0
+        self.save_tracker(tracker_data)
+        
+        return evicted
+    
     def get_session_info(self):
         """Get current session information"""
         tracker_data = self.load_tracker()
@@ -103,11 +249,17 @@ class SessionManager:
     
     def check_data_exists(self):
         """Check if all required data exists"""
-        required_files = [
-            FAISS_INDEX_PATH.with_suffix('.index'),
-            FAISS_INDEX_PATH.with_suffix('.pkl'),
-            CHUNKS_DIR / "all_chunks.json"
-        ]
+        store = snapshots.current_paths()
+        required_files = [store["chunks"]]
+        
+        # Chunk container (or the all_chunks.json it replaced)
+        chunks_exist = CHUNK_STORE_FILE.exists() or (CHUNKS_DIR / "all_chunks.json").exists()
+        
+        # Either a single index or a sharded store
+        index_exists = (
+            store["index"].exists()
+            or (store["shards"] / "manifest.json").exists()
+        )
         
         required_dirs = [
             PAPERS_DIR,
@@ -123,7 +275,7 @@ class SessionManager:
             for d in required_dirs
         )
         
-        return files_exist and dirs_have_content
+        return index_exists and chunks_exist and files_exist and dirs_have_content
     
     def force_cleanup(self):
         """Manually trigger cleanup (for admin use)"""
@@ -132,13 +284,95 @@ class SessionManager:
     
     def reset_counter(self):
         """Reset session counter without deleting data"""
-        tracker_data = self.load_tracker()
+        tracker_data = self.load_tracker(use_cache=False)
         tracker_data["session_count"] = 0
         tracker_data["last_session"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.save_tracker(tracker_data)
         print("✅ Session counter reset to 0")
 
 
+class PaperUsageTracker:
+    """Records which papers retrieval actually returns, for least-recently-retrieved eviction
+
+    Hits are buffered in memory and written in one transaction every
+    USAGE_FLUSH_EVERY hits, so retrieval never waits on the database; the
+    rest are written when the process exits.
+    """
+    
+    def __init__(self, flush_every=USAGE_FLUSH_EVERY):
+        self.tracker_db = METADATA_DIR / "session_tracker.db"
+        self.flush_every = flush_every
+        self._pending = {}
+        self._pending_hits = 0
+        self._lock = threading.Lock()
+        ensure_directories()
+        
+        with connect_tracker_db(self.tracker_db) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS paper_usage (
+                    paper TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL,
+                    last_retrieved REAL NOT NULL
+                )
+            """)
+        atexit.register(self.flush)
+    
+    def record(self, sources):
+        """Record retrieval hits for chunk sources (e.g. 'paper_1_x.txt')"""
+        now = time.time()
+        with self._lock:
+            for source in sources:
+                paper = Path(source).stem
+                hits, _ = self._pending.get(paper, (0, now))
+                self._pending[paper] = (hits + 1, now)
+                self._pending_hits += 1
+            should_flush = self._pending_hits >= self.flush_every
+        
+        if should_flush:
+            self.flush()
+    
+    def flush(self):
+        """Write buffered hits to the database"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_hits = 0
+        
+        if not pending:
+            return
+        
+        with connect_tracker_db(self.tracker_db) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO paper_usage (paper, hits, last_retrieved) VALUES (?, ?, ?) "
+                "ON CONFLICT(paper) DO UPDATE SET hits = hits + excluded.hits, "
+                "last_retrieved = MAX(last_retrieved, excluded.last_retrieved)",
+                [(paper, hits, last) for paper, (hits, last) in pending.items()]
+            )
+            conn.execute("COMMIT")
+    
+    def load_usage(self):
+        """Get {paper: (hits, last_retrieved)} including unflushed hits"""
+        self.flush()
+        with connect_tracker_db(self.tracker_db) as conn:
+            rows = conn.execute("SELECT paper, hits, last_retrieved FROM paper_usage").fetchall()
+        return {paper: (hits, last) for paper, hits, last in rows}
+    
+    def forget(self, papers):
+        """Drop usage rows for evicted papers"""
+        with connect_tracker_db(self.tracker_db) as conn:
+            conn.executemany("DELETE FROM paper_usage WHERE paper = ?", [(p,) for p in papers])
+
+
+def paper_usage_tracker():
+    """The process's PaperUsageTracker, shared by retrieval and the retention policy"""
+    global _usage_tracker
+    with _usage_tracker_lock:
+        if _usage_tracker is None:
+            _usage_tracker = PaperUsageTracker()
+        return _usage_tracker
+
+
 # Utility functions
 def check_and_setup():
     """Check if setup needed and return status"""
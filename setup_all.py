@@ -4,10 +4,25 @@ Complete setup script for Lung Cancer RAG Chatbot
 Runs all steps in order with session management
 """
 
+import os
 import sys
 import subprocess
 import time
+from pathlib import Path
 from session_manager import SessionManager
+from config import RETENTION_POLICY, INGEST_MODE, DISTRIBUTED_WORKERS
+
+# Distributions the setup needs (alternatives that satisfy the same import in one tuple)
+REQUIRED_PACKAGES = [
+    ("biopython",),
+    ("requests",),
+    ("PyPDF2",),
+    ("langchain",),
+    ("faiss-cpu", "faiss-gpu", "faiss"),
+    ("sentence-transformers",),
+    ("transformers",),
+    ("streamlit",),
+]
 
 def print_header(text):
     """Print formatted header"""
@@ -37,7 +52,6 @@ def run_step(step_num, step_name, script_name):
             create_vectorstore.main()
         
         print(f"\n✅ Step {step_num} completed successfully!")
-        time.sleep(2)
         return True
         
     except Exception as e:
@@ -45,28 +59,52 @@ def run_step(step_num, step_name, script_name):
         print(f"   Please check the error and try running {script_name} manually.")
         return False
 
+def canonical_name(name):
+    """Distribution names compare case-insensitively with - and _ equivalent"""
+    return name.lower().replace("_", "-")
+
+def requirement_pins():
+    """{package: version} pinned in requirements.txt"""
+    requirements_file = Path(__file__).parent / "requirements.txt"
+    pins = {}
+    if requirements_file.exists():
+        for line in requirements_file.read_text(encoding='utf-8-sig').splitlines():
+            if "==" in line:
+                name, pinned = line.split("==", 1)
+                pins[canonical_name(name.strip())] = pinned.strip()
+    return pins
+
 def check_requirements():
-    """Check if all requirements are installed"""
+    """Check if all requirements are installed (from package metadata, without importing them)"""
     print_header("CHECKING REQUIREMENTS")
-    
-    try:
-        import Bio
-        import requests
-        import PyPDF2
-        import langchain
-        import faiss
-        import sentence_transformers
-        import transformers
-        import streamlit
-        
-        print("✅ All required packages are installed!")
-        return True
+    from importlib.metadata import version, PackageNotFoundError
+    
+    pins = requirement_pins()
+    missing = []
+    
+    for alternatives in REQUIRED_PACKAGES:
+        for package in alternatives:
+            try:
+                installed = version(package)
+                break
+            except PackageNotFoundError:
+                continue
+        else:
+            missing.append(alternatives[0])
+            continue
         
-    except ImportError as e:
-        print(f"❌ Missing package: {e}")
+        pinned = pins.get(canonical_name(package))
+        if pinned and pinned != installed:
+            print(f"⚠️  {package} {installed} is installed, requirements.txt pins {pinned}")
+    
+    if missing:
+        print(f"❌ Missing packages: {', '.join(missing)}")
         print("\n📦 Please install requirements first:")
         print("   pip install -r requirements.txt")
         return False
+    
+    print("✅ All required packages are installed!")
+    return True
 
 def main():
     """Main setup function"""
@@ -80,8 +118,11 @@ def main():
     # Check if cleanup needed
     session_info = session_mgr.get_session_info()
     if session_info['cleanup_needed']:
-        print("\n⚠️  Previous session limit reached. Performing cleanup...")
-        session_mgr.cleanup_all_data()
+        print("\n⚠️  Previous session limit reached. Applying retention policy...")
+        if RETENTION_POLICY == "wipe":
+            session_mgr.cleanup_all_data()
+        else:
+            session_mgr.apply_retention_policy()
     
     # Check if data already exists
     if session_mgr.check_data_exists():
@@ -115,17 +156,36 @@ def main():
     start_time = time.time()
     
     # Run all steps
-    steps = [
-        (1, "Downloading Papers from PubMed", "download_papers_arxiv.py"),
-        (2, "Extracting Text from PDFs", "extract_text.py"),
-        (3, "Chunking Documents", "chunk_documents.py"),
-        (4, "Creating Vector Store with FAISS", "create_vectorstore.py")
-    ]
-    
-    for step_num, step_name, script_name in steps:
-        success = run_step(step_num, step_name, script_name)
-        if not success:
-            print("\n❌ Setup failed. Please fix the error and try again.")
+    if "--distributed" in sys.argv or (INGEST_MODE == "distributed" and "--pipelined" not in sys.argv):
+        print_header("STEPS 1-4: Distributed Download → Extract → Chunk → Embed")
+        import distributed_ingest
+        work_queue = distributed_ingest.WorkQueue()
+        distributed_ingest.enqueue_papers(work_queue, download=True)
+        workers = DISTRIBUTED_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+        print(f"👷 Starting {workers} local workers (more can join from other hosts)...")
+        distributed_ingest.run_local(work_queue, workers)
+        distributed_ingest.print_status(work_queue)
+        if not distributed_ingest.merge(work_queue):
+            print("\n❌ Setup failed. Re-run with --sequential to isolate the failing step.")
+            sys.exit(1)
+    elif "--sequential" in sys.argv or (INGEST_MODE == "sequential" and "--pipelined" not in sys.argv):
+        steps = [
+            (1, "Downloading Papers from PubMed", "download_papers_arxiv.py"),
+            (2, "Extracting Text from PDFs", "extract_text.py"),
+            (3, "Chunking Documents", "chunk_documents.py"),
+            (4, "Creating Vector Store with FAISS", "create_vectorstore.py")
+        ]
+        
+        for step_num, step_name, script_name in steps:
+            success = run_step(step_num, step_name, script_name)
+            if not success:
+                print("\n❌ Setup failed. Please fix the error and try again.")
+                sys.exit(1)
+    else:
+        print_header("STEPS 1-4: Pipelined Download → Extract → Chunk → Embed")
+        import pipelined_ingest
+        if not pipelined_ingest.main():
+            print("\n❌ Setup failed. Re-run with --sequential to isolate the failing step.")
             sys.exit(1)
     
     # Initialize session tracker
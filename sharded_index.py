@@ -0,0 +1,296 @@
+"""
+Sharded FAISS vector store with scatter-gather search
+Chunks are assigned to shards by a hash of their source file, each shard is
+built and saved independently, loaded lazily, and searched in parallel
+(threads, or local worker processes) with a global top-k merge.
+Shards live in the shards/ directory of a vector store snapshot; functions
+default to the published snapshot when no shards_dir is given
+"""
+
+import hashlib
+import json
+import multiprocessing as mp
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import vector_search
+import snapshots
+from config import *
+
+MANIFEST_NAME = "manifest.json"
+
+
+def resolve_shards_dir(shards_dir=None):
+    """shards_dir, or the shard directory of the published snapshot"""
+    return Path(shards_dir) if shards_dir else snapshots.current_paths()["shards"]
+
+
+def shard_for_source(source, num_shards=NUM_SHARDS):
+    """Stable shard number for a source file (all its chunks land together)"""
+    return zlib.crc32(source.encode('utf-8')) % num_shards
+
+
+def assign_shards(chunks, num_shards=NUM_SHARDS):
+    """Global chunk positions belonging to each shard"""
+    assignment = [[] for _ in range(num_shards)]
+    for position, chunk in enumerate(chunks):
+        assignment[shard_for_source(chunk['source'], num_shards)].append(position)
+    return [np.array(ids, dtype='int64') for ids in assignment]
+
+
+def shard_paths(shard_id, shards_dir=None):
+    """Files that make up one shard"""
+    base = resolve_shards_dir(shards_dir) / f"shard_{shard_id:03d}"
+    return {
+        "index": base.with_suffix('.index'),
+        "ids": base.with_suffix('.ids.npy'),
+        "vectors": base.with_suffix('.npy'),
+    }
+
+
+def save_shard(shard_id, index, ids, embeddings=None, storage=VECTOR_STORAGE, shards_dir=None):
+    """Write one shard's index, id map and (for compressed storage) rescoring vectors"""
+    import faiss
+    shards_dir = resolve_shards_dir(shards_dir)
+    shards_dir.mkdir(parents=True, exist_ok=True)
+    paths = shard_paths(shard_id, shards_dir)
+
+    faiss.write_index(index, str(paths["index"]))
+    np.save(paths["ids"], np.asarray(ids, dtype='int64'))
+
+    if storage != "float32" and VECTOR_RESCORE and embeddings is not None:
+        np.save(paths["vectors"], np.asarray(embeddings, dtype='float32'))
+    elif paths["vectors"].exists():
+        paths["vectors"].unlink()
+
+    return paths
+
+
+def chunks_fingerprint(chunks):
+    """Digest of the chunk list in order; shard id maps are only valid for the list they were built from"""
+    digest = hashlib.sha1()
+    for chunk in chunks:
+        digest.update(f"{chunk['source']}\0{chunk['chunk_id']}\0{chunk['text']}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def write_manifest(num_shards, dimension, counts, storage=VECTOR_STORAGE, shards_dir=None,
+                   fingerprint=None):
+    """Describe the sharded store so readers know what to load"""
+    shards_dir = resolve_shards_dir(shards_dir)
+    shards_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "num_shards": num_shards,
+        "dimension": dimension,
+        "storage": storage,
+        "counts": [int(count) for count in counts],
+        "chunks_fingerprint": fingerprint,
+    }
+    with open(shards_dir / MANIFEST_NAME, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(shards_dir=None):
+    """Load the shard manifest, or None if the store isn't sharded
+
+    The returned dict remembers which directory it came from, so shards are
+    loaded from the same snapshot even after a newer one is published.
+    """
+    shards_dir = resolve_shards_dir(shards_dir)
+    manifest_file = shards_dir / MANIFEST_NAME
+    if not manifest_file.exists():
+        return None
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    manifest["shards_dir"] = str(shards_dir)
+    return manifest
+
+
+def merge_results(results, top_k):
+    """Merge per-shard (distances, global ids) into a global top-k"""
+    distances = np.concatenate([d for d, _ in results], axis=1)
+    indices = np.concatenate([i for _, i in results], axis=1)
+    distances = np.where(indices < 0, np.inf, distances)
+
+    order = np.argsort(distances, axis=1, kind='stable')[:, :top_k]
+    return (
+        np.take_along_axis(distances, order, axis=1),
+        np.take_along_axis(indices, order, axis=1),
+    )
+
+
+class Shard:
+    """One shard, loaded from disk the first time it is searched"""
+
+    def __init__(self, shard_id, shards_dir):
+        self.shard_id = shard_id
+        self.paths = shard_paths(shard_id, shards_dir)
+        self.index = None
+        self.ids = None
+        self.vectors = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the shard if it isn't resident yet"""
+        import faiss
+        if self.index is not None:
+            return
+        with self._lock:
+            if self.index is not None:
+                return
+            if not self.paths["index"].exists():
+                raise FileNotFoundError(
+                    f"Shard {self.shard_id} not built: {self.paths['index']}\n"
+                    f"Run: python create_vectorstore.py --shard {self.shard_id}"
+                )
+            self.ids = np.load(self.paths["ids"])
+            if VECTOR_RESCORE and self.paths["vectors"].exists():
+                self.vectors = np.load(self.paths["vectors"], mmap_mode='r')
+            self.index = faiss.read_index(str(self.paths["index"]))
+
+    def search(self, query_embeddings, top_k, mask=None):
+        """Search this shard; returns distances and global chunk positions
+
+        mask is a boolean array over global chunk positions.
+        """
+        self.load()
+        local_mask = mask[self.ids] if mask is not None else None
+        k = min(top_k, self.index.ntotal)
+        if k == 0 or (local_mask is not None and not local_mask.any()):
+            empty = np.empty((len(query_embeddings), 0))
+            return empty.astype('float32'), empty.astype('int64')
+
+        distances, local = vector_search.search_index(
+            self.index, query_embeddings, k, vectors=self.vectors, mask=local_mask
+        )
+        global_ids = np.where(local >= 0, self.ids[np.maximum(local, 0)], -1)
+        return distances, global_ids
+
+
+class ShardedIndex:
+    """Scatter-gather search over shards using a thread per shard
+
+    FAISS releases the GIL while searching, so shards really run in parallel.
+    """
+
+    def __init__(self, manifest):
+        self.shards = [
+            Shard(i, manifest["shards_dir"]) for i in range(manifest["num_shards"])
+        ]
+        self.ntotal = sum(manifest["counts"])
+        self.d = manifest["dimension"]
+        self.executor = ThreadPoolExecutor(max_workers=len(self.shards))
+
+    def search(self, query_embeddings, top_k, mask=None):
+        """Search all shards in parallel and merge their top-k"""
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        results = list(self.executor.map(
+            lambda shard: shard.search(query_embeddings, top_k, mask), self.shards
+        ))
+        return merge_results(results, top_k)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def _shard_worker(conn, shard_ids, shards_dir):
+    """Worker process: owns a subset of shards and answers search requests"""
+    shards = [Shard(shard_id, shards_dir) for shard_id in shard_ids]
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        query_embeddings, top_k, mask = request
+        try:
+            results = [shard.search(query_embeddings, top_k, mask) for shard in shards]
+            conn.send(("ok", merge_results(results, top_k)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+    conn.close()
+
+
+class ShardWorkerPool:
+    """Scatter-gather search with shards served by separate local processes"""
+
+    def __init__(self, manifest, num_workers=SHARD_WORKERS):
+        num_shards = manifest["num_shards"]
+        num_workers = min(num_workers, num_shards)
+        self.ntotal = sum(manifest["counts"])
+        self.d = manifest["dimension"]
+        self.workers = []
+        self._lock = threading.Lock()
+
+        ctx = mp.get_context("spawn")
+        for worker_id in range(num_workers):
+            shard_ids = list(range(worker_id, num_shards, num_workers))
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_shard_worker, args=(child_conn, shard_ids, manifest["shards_dir"]),
+                daemon=True
+            )
+            process.start()
+            self.workers.append((process, parent_conn))
+
+    def search(self, query_embeddings, top_k, mask=None):
+        """Send the queries to every worker and merge their answers"""
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        with self._lock:
+            for _, conn in self.workers:
+                conn.send((query_embeddings, top_k, mask))
+            replies = [conn.recv() for _, conn in self.workers]
+
+        errors = [payload for status, payload in replies if status == "error"]
+        if errors:
+            raise RuntimeError(f"Shard worker failed: {errors[0]}")
+        return merge_results([payload for _, payload in replies], top_k)
+
+    def close(self):
+        """Stop the worker processes"""
+        with self._lock:
+            for process, conn in self.workers:
+                conn.send(None)
+                conn.close()
+                process.join(timeout=5)
+
+
+def open_sharded_index(manifest, num_workers=SHARD_WORKERS):
+    """In-process threaded search, or worker processes when SHARD_WORKERS > 0"""
+    if num_workers > 0:
+        return ShardWorkerPool(manifest, num_workers)
+    return ShardedIndex(manifest)
+
+
+def remove_chunks(remove_mask, shards_dir=None):
+    """Drop chunks (by global position) from every shard and renumber the rest"""
+    import faiss
+    shards_dir = resolve_shards_dir(shards_dir)
+    manifest = load_manifest(shards_dir)
+    new_positions = np.cumsum(~remove_mask) - 1
+
+    for shard_id in range(manifest["num_shards"]):
+        paths = shard_paths(shard_id, shards_dir)
+        if not paths["index"].exists():
+            continue
+
+        ids = np.load(paths["ids"])
+        drop = remove_mask[ids]
+        if not drop.any():
+            np.save(paths["ids"], new_positions[ids])
+            continue
+
+        index = faiss.read_index(str(paths["index"]))
+        index.remove_ids(np.where(drop)[0].astype('int64'))
+        vectors = None
+        if paths["vectors"].exists():
+            vectors = np.load(paths["vectors"])[~drop]
+
+        save_shard(shard_id, index, new_positions[ids[~drop]], vectors, manifest["storage"],
+                   shards_dir)
+        manifest["counts"][shard_id] = int(index.ntotal)
+
+    # No fingerprint: ids were renumbered, so only a full rebuild may follow
+    write_manifest(manifest["num_shards"], manifest["dimension"],
+                   manifest["counts"], manifest["storage"], shards_dir)
@@ -0,0 +1,189 @@
+"""
+Versioned vector store snapshots published by atomic rename
+Each build writes a complete store into a staging directory, renames it to
+snapshots/<version>, then atomically repoints CURRENT at it, so readers only
+ever see whole snapshots and a running app can hot-swap to the new version
+"""
+
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from config import *
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishes are not serialized across processes
+    fcntl = None
+
+CURRENT_FILE = VECTORSTORE_DIR / "CURRENT"
+LOCK_FILE = VECTORSTORE_DIR / "publish.lock"
+STAGING_PREFIX = ".staging-"
+
+
+def store_paths(base_dir):
+    """Files that make up a vector store rooted at base_dir"""
+    return {
+        "dir": base_dir,
+        "index": base_dir / "faiss_index.index",
+        "chunks": base_dir / "faiss_index.pkl",
+        "chunk_texts": base_dir / "chunk_texts.frames",
+        "vectors": base_dir / "faiss_index.npy",
+        "shards": base_dir / "shards",
+        "documents": base_dir / "documents.npy",
+        "document_sources": base_dir / "documents.json",
+    }
+
+
+def legacy_paths(vectorstore_dir=VECTORSTORE_DIR):
+    """Pre-snapshot layout (files directly in the vector store directory)"""
+    paths = store_paths(vectorstore_dir)
+    paths["dir"] = vectorstore_dir
+    return paths
+
+
+def current_version(vectorstore_dir=VECTORSTORE_DIR):
+    """Name of the published snapshot, or None if nothing has been published
+
+    vectorstore_dir selects a corpus (defaults to this process's RAG_CORPUS).
+    """
+    try:
+        version = (vectorstore_dir / CURRENT_FILE.name).read_text().strip()
+    except FileNotFoundError:
+        return None
+    snapshots_dir = vectorstore_dir / SNAPSHOTS_DIR.name
+    return version if version and (snapshots_dir / version).is_dir() else None
+
+
+def current_paths(vectorstore_dir=VECTORSTORE_DIR):
+    """Paths of the published snapshot (legacy flat files if there is none)"""
+    version = current_version(vectorstore_dir)
+    if version is None:
+        return legacy_paths(vectorstore_dir)
+    return store_paths(vectorstore_dir / SNAPSHOTS_DIR.name / version)
+
+
+def built_corpora():
+    """Corpora that have a vector store to search"""
+    return [
+        name for name in CORPORA
+        if current_paths(corpus_paths(name)["vectorstore"])["chunks"].exists()
+    ]
+
+
+def new_version():
+    """Sortable, unique snapshot name"""
+    now = time.time()
+    return time.strftime("v%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1e6) % 1000000:06d}"
+
+
+def _point_current_at(version):
+    """Atomically replace CURRENT"""
+    tmp_path = CURRENT_FILE.with_name(CURRENT_FILE.name + ".tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CURRENT_FILE)
+
+
+def _fsync_tree(directory):
+    """Flush every file in a staged snapshot before it becomes visible"""
+    for path in directory.rglob("*"):
+        if path.is_file():
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+
+
+def list_versions():
+    """Published snapshot names, oldest first"""
+    if not SNAPSHOTS_DIR.exists():
+        return []
+    return sorted(
+        p.name for p in SNAPSHOTS_DIR.iterdir()
+        if p.is_dir() and not p.name.startswith(STAGING_PREFIX)
+    )
+
+
+def prune_snapshots(keep=SNAPSHOT_KEEP):
+    """Delete old snapshots, always keeping the current one
+
+    keep must leave room for the snapshot running processes still serve
+    until they swap: a single index, chunk texts and memory-mapped vectors
+    stay readable once unlinked, but shards are opened lazily on first search.
+    """
+    current = current_version()
+    versions = list_versions()
+    for version in versions[:max(0, len(versions) - keep)]:
+        if version != current:
+            shutil.rmtree(SNAPSHOTS_DIR / version, ignore_errors=True)
+
+
+def remove_legacy_files():
+    """Drop the pre-snapshot flat files once a snapshot has been published"""
+    paths = legacy_paths()
+    for key in ["index", "chunks", "chunk_texts", "vectors"]:
+        if paths[key].exists():
+            paths[key].unlink()
+    if paths["shards"].exists():
+        shutil.rmtree(paths["shards"])
+
+
+@contextmanager
+def publish_lock():
+    """Exclusive lock shared by every process (and node) publishing to this vector store"""
+    VECTORSTORE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_FILE, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file closes
+        yield
+
+
+@contextmanager
+def publish(base_on_current=False):
+    """Stage a new snapshot and publish it when the block succeeds
+
+    Yields store_paths() for the staging directory. With base_on_current the
+    published store is copied in first, for edits such as rebuilding one
+    shard or evicting papers. Publishes hold a lock from that copy until
+    CURRENT moves, so two edits never both start from the same snapshot and
+    drop each other's changes; keep slow work (embedding) outside the block.
+    On error the staging directory is discarded and CURRENT is untouched.
+    """
+    with publish_lock():
+        yield from _publish(base_on_current)
+
+
+def _publish(base_on_current):
+    version = new_version()
+    staging = SNAPSHOTS_DIR / f"{STAGING_PREFIX}{version}"
+    SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    source = current_paths()["dir"] if base_on_current else None
+    if source is not None and source != VECTORSTORE_DIR:
+        shutil.copytree(source, staging)
+    else:
+        staging.mkdir()
+        if source == VECTORSTORE_DIR:
+            # Legacy flat store: copy just the vector store files
+            for key, path in legacy_paths().items():
+                if key == "dir" or not path.exists():
+                    continue
+                target = store_paths(staging)[key]
+                if path.is_dir():
+                    shutil.copytree(path, target)
+                else:
+                    shutil.copy2(path, target)
+
+    try:
+        yield store_paths(staging)
+        _fsync_tree(staging)
+        os.rename(staging, SNAPSHOTS_DIR / version)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _point_current_at(version)
+    print(f"   📸 Published vector store snapshot {version}")
+    remove_legacy_files()
+    prune_snapshots()
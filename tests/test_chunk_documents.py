@@ -0,0 +1,80 @@
+"""
+Incremental chunking keeps the duplicate sources of reused chunks
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+import chunk_documents
+
+PARAGRAPHS = [
+    "Osimertinib improved progression free survival in EGFR mutant non small cell lung cancer patients",
+    "Pembrolizumab monotherapy extended overall survival when PD-L1 expression was at least fifty percent",
+    "Low dose computed tomography screening reduced lung cancer mortality among heavy former smokers",
+]
+EXTRA = "Stereotactic body radiotherapy offered local control for early stage tumours in patients unfit for surgery"
+OTHER = "Small cell lung cancer relapses quickly after platinum etoposide despite high initial response rates"
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    texts = {"a.txt": PARAGRAPHS, "b.txt": PARAGRAPHS + [EXTRA], "c.txt": [OTHER]}  # b repeats a
+    timestamps = dict.fromkeys(texts, 0.0)
+
+    def fake_chunk_text_file(text_path, metadata_by_stem=None):
+        return [{"text": text, "source": text_path.name, "chunk_id": i}
+                for i, text in enumerate(texts[text_path.name])]
+
+    chunks_dir = tmp_path / "chunks"
+    monkeypatch.setattr(chunk_documents, "CHUNK_STORE_FILE", chunks_dir / "chunks.frames")
+    monkeypatch.setattr(chunk_documents, "CHUNKING_FILE", chunks_dir / "chunking.json")
+    monkeypatch.setattr(chunk_documents, "LEGACY_CHUNKS_FILE", chunks_dir / "all_chunks.json")
+    monkeypatch.setattr(chunk_documents, "METADATA_DIR", tmp_path / "metadata")
+    monkeypatch.setattr(chunk_documents, "DEDUP_ENABLED", True)
+    monkeypatch.setattr(chunk_documents, "_chunk_store", None)
+    monkeypatch.setattr(chunk_documents, "ensure_directories", lambda: chunks_dir.mkdir(exist_ok=True))
+    monkeypatch.setattr(chunk_documents, "list_text_paths", lambda: [tmp_path / name for name in sorted(texts)])
+    monkeypatch.setattr(chunk_documents, "text_timestamp", lambda path: timestamps[path.name])
+    monkeypatch.setattr(chunk_documents, "chunk_text_file", fake_chunk_text_file)
+    return texts, timestamps
+
+
+def duplicate_sources():
+    """{(source, chunk_id): sorted duplicate references} of the saved chunks"""
+    return {
+        (chunk["source"], chunk["chunk_id"]): sorted(
+            (r["source"], r["chunk_id"]) for r in chunk.get("duplicate_sources", [])
+        )
+        for chunk in chunk_documents.load_saved_chunks()
+    }
+
+
+def test_second_run_keeps_duplicate_sources_of_reused_chunks(corpus):
+    chunk_documents.process_all_texts()
+    first = duplicate_sources()
+    assert first[("a.txt", 0)] == [("b.txt", 0)]
+    assert [key for key in first if key[0] == "b.txt"] == [("b.txt", 3)]
+
+    chunk_documents.process_all_texts()
+    assert duplicate_sources() == first
+
+
+def test_rechunking_a_representative_rechunks_its_copies(corpus):
+    texts, timestamps = corpus
+    chunk_documents.process_all_texts()
+    first = duplicate_sources()
+
+    # a is re-extracted; b's copies of it only existed as references on a's chunks,
+    # so b is re-chunked too even though its own text is unchanged
+    timestamps["a.txt"] = float("inf")
+    chunk_documents.process_all_texts()
+    assert duplicate_sources() == first
+
+
+def test_removed_papers_are_dropped_from_duplicate_sources(corpus):
+    texts, timestamps = corpus
+    chunk_documents.process_all_texts()
+
+    del texts["b.txt"]
+    chunk_documents.process_all_texts()
+    assert all(not references for references in duplicate_sources().values())
@@ -0,0 +1,137 @@
+"""
+Distributed ingest with local worker processes on stubbed extract / chunk / embed steps
+"""
+
+import json
+import multiprocessing
+import sqlite3
+import sys
+import time
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+import distributed_ingest
+import chunk_documents
+import create_vectorstore
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="stubs reach the workers by fork")
+
+PAPERS = ["paper_a", "paper_b", "paper_c", "paper_a_copy", "flaky", "broken", "crashed"]
+
+
+def fake_extract(self, item):
+    if item["paper"] == "broken":
+        raise RuntimeError("unreadable PDF")
+    if item["paper"] == "flaky" and item["attempt"] == 1:
+        raise RuntimeError("transient error")
+    return True
+
+
+def fake_chunk(self, item):
+    topic = item["paper"].replace("_copy", "")
+    chunks = [
+        {"source": f"{item['paper']}.txt", "chunk_id": i,
+         "text": f"{topic} section {i} reports outcomes of the {topic} cohort in detail"}
+        for i in range(3)
+    ]
+    payload = json.dumps(chunks).encode('utf-8')
+    distributed_ingest._write_atomically(
+        distributed_ingest.output_paths(item["paper"], self.queue.queue_dir)["chunks"],
+        lambda f: f.write(payload)
+    )
+    return True
+
+
+def fake_embed(self, item):
+    paths = distributed_ingest.output_paths(item["paper"], self.queue.queue_dir)
+    with open(paths["chunks"], 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+    seed = sum(item["paper"].encode('utf-8'))
+    embeddings = np.random.default_rng(seed).random((len(chunks), 8)).astype('float32')
+    distributed_ingest._write_atomically(paths["embeddings"], lambda f: np.save(f, embeddings))
+    return True
+
+
+def item_row(work_queue, paper, stage):
+    with sqlite3.connect(str(work_queue.db_path)) as conn:
+        return conn.execute(
+            "SELECT state, attempts, lease_owner FROM work_items WHERE paper = ? AND stage = ?",
+            (paper, stage)
+        ).fetchone()
+
+
+@pytest.fixture
+def stubbed(tmp_path, monkeypatch):
+    papers_dir = tmp_path / "papers"
+    papers_dir.mkdir()
+    for paper in PAPERS:
+        (papers_dir / f"{paper}.pdf").write_bytes(b"%PDF-1.4")
+    monkeypatch.setattr(distributed_ingest, "PAPERS_DIR", papers_dir)
+    monkeypatch.setattr(distributed_ingest, "NUM_SHARDS", 1)
+    monkeypatch.setattr(distributed_ingest, "multiprocessing", multiprocessing.get_context("fork"))
+    monkeypatch.setattr(distributed_ingest.Worker, "run_extract", fake_extract)
+    monkeypatch.setattr(distributed_ingest.Worker, "run_chunk", fake_chunk)
+    monkeypatch.setattr(distributed_ingest.Worker, "run_embed", fake_embed)
+
+    merged = []
+    monkeypatch.setattr(chunk_documents, "save_chunks", lambda chunks: None)
+    monkeypatch.setattr(create_vectorstore, "save_vectorstore",
+                        lambda index, chunks, embeddings: merged.append((index.ntotal, chunks, embeddings)))
+    return distributed_ingest.WorkQueue(tmp_path / "queue"), merged
+
+
+def test_expired_lease_is_handed_to_another_worker(tmp_path):
+    work_queue = distributed_ingest.WorkQueue(tmp_path / "queue", lease_s=0.1)
+    work_queue.enqueue(["paper_a"])
+
+    first = work_queue.lease("node-1")
+    assert first["attempt"] == 1
+    assert work_queue.lease("node-2") is None
+    assert not work_queue.renew(first, "node-2")
+
+    time.sleep(0.2)
+    second = work_queue.lease("node-2")
+    assert (second["paper"], second["attempt"]) == ("paper_a", 2)
+    assert not work_queue.renew(first, "node-1")
+
+    # The first node finishing late still completes the item, once
+    work_queue.complete(first, "node-1")
+    work_queue.complete(second, "node-2")
+    assert item_row(work_queue, "paper_a", "extract")[0] == "done"
+    assert work_queue.done_papers("extract") == ["paper_a"]
+
+
+def test_run_local_retries_reclaims_and_merges_deterministically(stubbed):
+    work_queue, merged = stubbed
+
+    # A node that leased an item and died; its lease runs out while the local workers run
+    work_queue.enqueue(["crashed"])
+    crashed_queue = distributed_ingest.WorkQueue(work_queue.queue_dir, lease_s=0.5)
+    assert crashed_queue.lease("dead-node")["paper"] == "crashed"
+    distributed_ingest.enqueue_papers(work_queue)
+
+    assert distributed_ingest.run_local(work_queue, num_workers=3)
+    assert work_queue.is_drained()
+
+    state, attempts, owner = item_row(work_queue, "crashed", "extract")
+    assert (state, attempts) == ("done", 2)
+    assert owner.startswith("local-")
+
+    assert item_row(work_queue, "flaky", "extract")[:2] == ("done", 2)
+    assert item_row(work_queue, "broken", "extract")[:2] == ("failed", work_queue.max_attempts)
+    assert [(paper, stage) for paper, stage, _ in work_queue.failures()] == [("broken", "extract")]
+    assert work_queue.done_papers("embed") == sorted(set(PAPERS) - {"broken"})
+
+    assert distributed_ingest.merge(work_queue)
+    assert distributed_ingest.merge(work_queue)
+    (first_total, first_chunks, first_embeddings), (second_total, second_chunks, second_embeddings) = merged
+
+    assert first_chunks == second_chunks
+    assert np.array_equal(first_embeddings, second_embeddings)
+    assert first_total == second_total == len(first_chunks) == len(first_embeddings)
+    sources = {chunk["source"] for chunk in first_chunks}
+    assert "broken.txt" not in sources
+    if distributed_ingest.DEDUP_ENABLED:
+        # paper_a_copy repeats paper_a, so its chunks collapse into paper_a's
+        assert "paper_a_copy.txt" not in sources
@@ -0,0 +1,131 @@
+"""
+arXiv search and download against a stub client (no network access)
+"""
+
+import itertools
+import json
+import time
+import pytest
+
+pytest.importorskip("arxiv")
+import download_papers_arxiv
+import paper_store
+from download_papers_arxiv import CachedPaper
+
+
+def make_papers(n):
+    return [
+        CachedPaper({
+            "entry_id": f"http://arxiv.org/abs/2401.{i:05d}v1",
+            "title": f"Lung cancer paper {i}",
+            "authors": ["A. Author"],
+            "published": "2024-01-01",
+            "pdf_url": f"http://arxiv.org/pdf/2401.{i:05d}v1",
+        })
+        for i in range(n)
+    ]
+
+
+class StubClient:
+    """arxiv.Client stand-in that records what was fetched"""
+
+    def __init__(self, papers):
+        self.papers = papers
+        self.offsets = []
+        self.fetched = 0
+
+    def results(self, search, offset=0):
+        self.offsets.append(offset)
+        for paper in self.papers[offset:search.max_results]:
+            self.fetched += 1
+            yield paper
+
+
+class OfflineClient:
+    def results(self, search, offset=0):
+        raise AssertionError("arXiv queried although the cache is complete")
+
+
+@pytest.fixture
+def data_dirs(tmp_path, monkeypatch):
+    papers_dir = tmp_path / "research_papers"
+    metadata_dir = tmp_path / "metadata"
+    papers_dir.mkdir()
+    metadata_dir.mkdir()
+    monkeypatch.setattr(download_papers_arxiv, "ARXIV_CACHE_DIR", metadata_dir / "arxiv_cache")
+    monkeypatch.setattr(download_papers_arxiv, "METADATA_DIR", metadata_dir)
+    monkeypatch.setattr(download_papers_arxiv, "PAPERS_DIR", papers_dir)
+    monkeypatch.setattr(paper_store, "PAPERS_DIR", papers_dir)
+    monkeypatch.setattr(paper_store, "MANIFEST_FILE", metadata_dir / "paper_manifest.json")
+    return papers_dir, metadata_dir
+
+
+def titles(papers):
+    return [paper.title for paper in papers]
+
+
+def test_search_stops_early_and_resumes_from_cache(data_dirs):
+    papers = make_papers(10)
+    client = StubClient(papers)
+
+    search = download_papers_arxiv.search_arxiv("egfr", num_results=5, client=client)
+    assert titles(itertools.islice(search, 2)) == titles(papers[:2])
+    search.close()
+    assert client.fetched == 2
+
+    # The two results consumed are cached; the next search continues after them
+    client = StubClient(papers)
+    assert titles(download_papers_arxiv.search_arxiv("egfr", 5, client)) == titles(papers)
+    assert client.offsets == [2]
+    assert client.fetched == 8
+
+    # A complete cache within the TTL is served without querying arXiv
+    assert titles(download_papers_arxiv.search_arxiv("egfr", 5, OfflineClient())) == titles(papers)
+
+
+def test_search_cache_expires_after_ttl(data_dirs):
+    papers = make_papers(10)
+    list(download_papers_arxiv.search_arxiv("egfr", 5, StubClient(papers)))
+
+    (cache_path,) = download_papers_arxiv.ARXIV_CACHE_DIR.glob("search_*.json")
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    cache["created"] = time.time() - download_papers_arxiv.ARXIV_CACHE_TTL_HOURS * 3600 - 60
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+
+    client = StubClient(papers)
+    assert titles(download_papers_arxiv.search_arxiv("egfr", 5, client)) == titles(papers)
+    assert client.offsets == [0]
+    assert client.fetched == 10
+
+
+def test_fetch_papers_skips_papers_already_downloaded(data_dirs, monkeypatch):
+    papers_dir, metadata_dir = data_dirs
+    papers = make_papers(10)
+
+    existing = []
+    for paper in [papers[0], papers[2]]:
+        filename = download_papers_arxiv.make_filename(paper)
+        (papers_dir / filename).write_bytes(paper.entry_id.encode('utf-8'))
+        existing.append(download_papers_arxiv.build_metadata(paper, filename))
+    download_papers_arxiv.save_metadata(existing)
+
+    downloads = []
+
+    def fake_download(paper, filename, paper_num):
+        (papers_dir / filename).write_bytes(paper.entry_id.encode('utf-8'))
+        downloads.append(paper.title)
+        return True
+
+    monkeypatch.setattr(download_papers_arxiv, "download_arxiv_paper", fake_download)
+    monkeypatch.setattr(download_papers_arxiv.time, "sleep", lambda seconds: None)
+
+    client = StubClient(papers)
+    fetched = list(download_papers_arxiv.fetch_papers("egfr", num_papers=3, client=client))
+
+    assert [(metadata["paper_id"], is_new) for metadata, is_new in fetched] == [
+        ("2401.00000", False), ("2401.00001", True), ("2401.00002", False),
+    ]
+    assert downloads == [papers[1].title]
+    assert client.fetched == 3  # Stopped as soon as three papers were available
@@ -0,0 +1,119 @@
+"""
+FAISS index helpers shared by create_vectorstore.py and rag_pipeline.py
+Builds float32 / float16 / 8-bit scalar-quantized indexes and searches them,
+optionally re-ranking candidates with exact float32 vectors from a memory map
+"""
+
+import numpy as np
+import metadata_filter
+from config import *
+
+# Quantizer per storage type, by name so faiss is only imported once an index is built
+STORAGE_TYPES = {
+    "float16": "QT_fp16",
+    "sq8": "QT_8bit",
+}
+
+
+def create_empty_index(dimension, storage=VECTOR_STORAGE):
+    """Create an empty L2 index for the chosen storage type"""
+    import faiss
+    if storage == "float32":
+        return faiss.IndexFlatL2(dimension)
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown VECTOR_STORAGE '{storage}' (use float32, float16 or sq8)")
+    quantizer_type = getattr(faiss.ScalarQuantizer, STORAGE_TYPES[storage])
+    return faiss.IndexScalarQuantizer(dimension, quantizer_type, faiss.METRIC_L2)
+
+
+def build_index(embeddings, storage=VECTOR_STORAGE):
+    """Create, train (if needed) and fill an index from float32 embeddings"""
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    index = create_empty_index(embeddings.shape[1], storage)
+
+    if not index.is_trained:
+        # 8-bit SQ learns per-dimension ranges from the data
+        index.train(embeddings)
+    index.add(embeddings)
+
+    return index
+
+
+def index_memory_bytes(index):
+    """Bytes the index occupies once loaded"""
+    import faiss
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def search_index(index, query_embeddings, top_k, vectors=None, rescore_factor=RESCORE_FACTOR,
+                 mask=None):
+    """Search an index; with exact vectors, over-fetch and re-rank by true L2 distance
+
+    mask is an optional boolean array over index ids; only ids set in it are
+    considered, inside the FAISS search itself, so filtered queries still get top_k.
+    """
+    import faiss
+    query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+
+    params = None
+    if mask is not None:
+        params = faiss.SearchParameters(sel=metadata_filter.mask_to_selector(mask))
+
+    if vectors is None or rescore_factor <= 1:
+        return index.search(query_embeddings, top_k, params=params)
+
+    num_candidates = min(top_k * rescore_factor, index.ntotal)
+    _, candidates = index.search(query_embeddings, num_candidates, params=params)
+
+    distances = np.full((len(query_embeddings), top_k), np.inf, dtype='float32')
+    indices = np.full((len(query_embeddings), top_k), -1, dtype='int64')
+
+    for row, (query, row_candidates) in enumerate(zip(query_embeddings, candidates)):
+        row_candidates = np.sort(row_candidates[row_candidates >= 0])  # sorted ids = sequential reads
+        if not len(row_candidates):
+            continue
+        exact = ((np.asarray(vectors[row_candidates]) - query) ** 2).sum(axis=1)
+        best = np.argsort(exact)[:top_k]
+        distances[row, :len(best)] = exact[best]
+        indices[row, :len(best)] = row_candidates[best]
+
+    return distances, indices
+
+
+def recall_at_k(reference_indices, test_indices):
+    """Fraction of the reference top-k neighbours the test search also returned"""
+    hits = sum(
+        len(set(ref[ref >= 0]) & set(test[test >= 0]))
+        for ref, test in zip(reference_indices, test_indices)
+    )
+    total = sum(int((ref >= 0).sum()) for ref in reference_indices)
+    return hits / total if total else 1.0
+
+
+def compression_report(index, embeddings, top_k=10, num_queries=200, vectors=None):
+    """Memory saved and recall@k lost compared to an exact float32 index"""
+    import faiss
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    exact_index = faiss.IndexFlatL2(embeddings.shape[1])
+    exact_index.add(embeddings)
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False)
+    # Perturb sampled vectors so queries aren't exact copies of stored ones
+    queries = embeddings[sample] + rng.normal(0, 0.01, size=embeddings[sample].shape).astype('float32')
+    top_k = min(top_k, len(embeddings))
+
+    _, reference = exact_index.search(queries, top_k)
+    _, compressed = search_index(index, queries, top_k)
+
+    report = {
+        "float32_bytes": index_memory_bytes(exact_index),
+        "index_bytes": index_memory_bytes(index),
+        "recall_at_k": recall_at_k(reference, compressed),
+        "k": top_k,
+    }
+    if vectors is not None:
+        _, rescored = search_index(index, queries, top_k, vectors=vectors)
+        report["rescored_recall_at_k"] = recall_at_k(reference, rescored)
+
+    return report